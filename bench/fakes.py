@@ -0,0 +1,46 @@
+# Just enough of discord.py's Bot/Guild/Channel/Member surface for core.py and
+# roles.py to play whole games offline. The database side is the real local
+# backend from local_db.py, which counts every operation.
+
+
+class FakeMember:
+    def __init__(self, member_id: int):
+        self.id = member_id
+        self.display_name = f"Player{member_id}"
+        self.name = self.display_name
+        self.mention = f"<@{member_id}>"
+        self.messages = 0
+
+    async def send(self, content=None, **kwargs):
+        self.messages += 1
+
+
+class FakeChannel:
+    def __init__(self, channel_id: int):
+        self.id = channel_id
+        self.messages = 0
+
+    async def send(self, content=None, **kwargs):
+        self.messages += 1
+
+
+class FakeGuild:
+    def __init__(self, guild_id: int):
+        self.id = guild_id
+        self.members = {}
+
+    def get_member(self, member_id: int):
+        return self.members.get(member_id)
+
+
+class FakeBot:
+    """The parts of commands.Bot the game loop uses: channel and guild lookups."""
+    def __init__(self):
+        self.channels = {}
+        self.guilds = {}
+
+    def get_channel(self, channel_id: int):
+        return self.channels.get(channel_id)
+
+    def get_guild(self, guild_id: int):
+        return self.guilds.get(guild_id)
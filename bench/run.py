@@ -0,0 +1,296 @@
+"""
+Plays complete Werewolf games offline and reports how fast the engine runs.
+
+    python -m bench.run --games 2000 --players 12 --concurrency 16
+    python -m bench.run --games 200 --alloc          # also trace allocations (slower)
+    python -m bench.run --games 2000 --json out.json # machine-readable results for CI
+    python -m bench.run --backend sqlite             # against the local SQLite store
+    python -m bench.run --metrics metrics.json       # dump the bot's own metrics afterwards
+
+Games go through the same code the bot runs (distribute_roles, start_night_phase,
+prompt_witch, start_day_phase, the lynch step and check_win_condition) against the
+local database backends from local_db.py and the Discord fakes in bench/fakes.py. Players pick random targets
+for every night action, so each seed plays out a different, reproducible set of games.
+"""
+import argparse
+import asyncio
+import gc
+import json
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+from collections import defaultdict
+
+# The bench plays against its own local database (see run()); keep firebase_config,
+# imported through the store, from trying to reach Firebase
+os.environ.setdefault("WEREWOLF_DB_BACKEND", "memory")
+
+from bench.fakes import FakeBot, FakeGuild, FakeChannel, FakeMember
+from local_db import MemoryDatabase, SQLiteDatabase
+from cogs.werewolf import archive, store
+from cogs.werewolf.core import (
+    GamePhase, Role, GAME_STEPS, distribute_roles, start_night_phase,
+    start_day_phase, check_win_condition
+)
+from cogs.werewolf.engine import cast_vote
+from cogs.werewolf.eventlog import wait_for_archives
+from cogs.werewolf.metrics import dump_metrics
+from cogs.werewolf.roles import prompt_witch
+from cogs.werewolf.scheduler import mark_submitted
+from cogs.werewolf.state import create_game_state
+
+MAX_DAYS = 30 # A game that runs longer than this is reported as a stalemate
+PHASES = ("deal", "night", "witch", "day", "lynch")
+
+
+def alive_ids(state) -> list:
+    return [pid for pid, pstate in state.get("player_states", {}).items() if pstate.get("is_alive")]
+
+def role_of(state, pid) -> str:
+    return state.get(f"player_states/{pid}/role")
+
+
+def play_night(state, rng: random.Random):
+    """Picks a random night action for everyone who was prompted, the way the views record them."""
+    alive = alive_ids(state)
+    night_num = state.get("game_state/night_number")
+    wolves = [pid for pid in alive if role_of(state, pid) == Role.WEREWOLF.value]
+    victims = [pid for pid in alive if pid not in wolves] or alive
+
+    for pid in alive:
+        role = role_of(state, pid)
+        others = [target for target in alive if target != pid] or alive
+        if role == Role.WEREWOLF.value:
+            state.set(f"night_actions/werewolf_vote/{pid}", rng.choice(victims))
+        elif role == Role.SEER.value:
+            state.set(f"night_actions/seer_pick/{pid}", rng.choice(alive))
+        elif role == Role.SORCERER.value:
+            state.set(f"night_actions/sorcerer_pick/{pid}", rng.choice(alive))
+        elif role == Role.DOCTOR.value:
+            state.set(f"night_actions/doctor_save/{pid}", rng.choice(alive))
+        elif role == Role.BODYGUARD.value:
+            state.set(f"night_actions/bodyguard_protect/{pid}", rng.choice(others))
+        elif role == Role.CUPID.value and night_num == 1 and len(alive) >= 2:
+            lover1, lover2 = rng.sample(alive, 2)
+            state.set("lovers", {lover1: lover2, lover2: lover1})
+        elif role == Role.ARSONIST.value:
+            if rng.random() < 0.25:
+                state.set("night_actions/arsonist_ignite", True)
+            else:
+                state.set(f"night_actions/arsonist_douse/{pid}", rng.choice(others))
+        elif role == Role.VETERAN.value and not state.get("game_state/veteran_alerts_used"):
+            if rng.random() < 0.3:
+                state.set("night_actions/veteran_alert", pid)
+                state.set("game_state/veteran_alerts_used", True)
+        else:
+            continue
+        mark_submitted(state, pid)
+
+def play_witch(state, witch_id: str, rng: random.Random):
+    if state.get("game_state/witch_potions/save") and rng.random() < 0.5:
+        state.set("night_actions/witch_save", True)
+        state.set("game_state/witch_potions/save", False)
+    if state.get("game_state/witch_potions/kill") and rng.random() < 0.3:
+        state.set(f"night_actions/witch_kill/{witch_id}", rng.choice(alive_ids(state)))
+    mark_submitted(state, witch_id)
+
+def play_votes(state, rng: random.Random):
+    alive = alive_ids(state)
+    for pid in alive:
+        if role_of(state, pid) == Role.MAYOR.value and not state.get(f"player_states/{pid}/is_mayor_revealed"):
+            if rng.random() < 0.5:
+                state.set(f"player_states/{pid}/is_mayor_revealed", True)
+        others = [target for target in alive if target != pid]
+        if others:
+            cast_vote(state, pid, rng.choice(others), time.time())
+
+
+class Recorder:
+    """Collects per-phase latencies (seconds) and how games ended."""
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.outcomes = defaultdict(int)
+        self.days = []
+
+    def timed(self, phase: str, started: float):
+        self.latencies[phase].append(time.perf_counter() - started)
+
+
+async def play_game(bot: FakeBot, channel_id: int, num_players: int, rng: random.Random, recorder: Recorder):
+    guild = bot.guilds[channel_id] = FakeGuild(channel_id)
+    bot.channels[channel_id] = FakeChannel(channel_id)
+    for offset in range(num_players):
+        member = FakeMember(channel_id * 1000 + offset)
+        guild.members[member.id] = member
+
+    players = {str(member.id): {"name": member.display_name, "mention": member.mention} for member in guild.members.values()}
+    creator_id = next(iter(guild.members))
+    state = await create_game_state(channel_id, {
+        "creator_id": creator_id,
+        "players": players,
+        "phase": GamePhase.WAITING.value,
+        "channel_id": channel_id,
+        "guild_id": guild.id,
+        "settings": {"roles": [role.value for role in Role]},
+    })
+
+    started = time.perf_counter()
+    await distribute_roles(state, players)
+    recorder.timed("deal", started)
+
+    outcome = "stalemate"
+    for day in range(1, MAX_DAYS + 1):
+        started = time.perf_counter()
+        await start_night_phase(bot, state)
+        play_night(state, rng)
+        recorder.timed("night", started)
+
+        started = time.perf_counter()
+        witch_id = await prompt_witch(bot, state)
+        if witch_id:
+            play_witch(state, witch_id, rng)
+        recorder.timed("witch", started)
+
+        started = time.perf_counter()
+        await start_day_phase(bot, state)
+        won = await check_win_condition(bot, state)
+        recorder.timed("day", started)
+        if won:
+            outcome = "night win"
+            break
+
+        play_votes(state, rng)
+        started = time.perf_counter()
+        next_step = await GAME_STEPS["lynch"](bot, state, False)
+        recorder.timed("lynch", started)
+        if next_step is None:
+            outcome = "lynch win"
+            break
+
+    recorder.outcomes[outcome] += 1
+    recorder.days.append(day)
+    del bot.guilds[channel_id], bot.channels[channel_id]
+
+
+def percentile(values: list, q: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not values:
+        return 0.0
+    index = max(0, min(len(values) - 1, round(q / 100 * len(values)) - 1))
+    return values[index]
+
+
+async def run(args) -> dict:
+    random.seed(args.seed) # The engine's own dice (ties, role deal) come from `random`
+    rng = random.Random(args.seed)
+    if args.backend == "sqlite":
+        db_dir = tempfile.TemporaryDirectory()
+        database = SQLiteDatabase(os.path.join(db_dir.name, "bench.db"))
+    else:
+        database = MemoryDatabase()
+    store._store = store.GameStore(database.reference())
+    archive_dir = tempfile.TemporaryDirectory() # Ended games are archived as they would be by the bot
+    archive.ARCHIVE_DIR = archive_dir.name
+    bot = FakeBot()
+    recorder = Recorder()
+
+    if args.alloc:
+        tracemalloc.start(10)
+
+    channel_ids = iter(range(1, args.games + 1))
+    async def worker():
+        for channel_id in channel_ids:
+            await play_game(bot, channel_id, args.players, rng, recorder)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    await wait_for_archives()
+    elapsed = time.perf_counter() - started
+
+    results = {
+        "games": args.games,
+        "players": args.players,
+        "concurrency": args.concurrency,
+        "seed": args.seed,
+        "backend": args.backend,
+        "elapsed_s": elapsed,
+        "games_per_s": args.games / elapsed,
+        "avg_days": sum(recorder.days) / len(recorder.days),
+        "outcomes": dict(recorder.outcomes),
+        "phases_ms": {},
+        "firebase_ops": dict(database.ops),
+        "firebase_ops_per_game": {op: count / args.games for op, count in database.ops.items()},
+        "archive_kib": sum(os.path.getsize(os.path.join(path, name)) for path, _, names in os.walk(archive_dir.name) for name in names) / 1024,
+    }
+    for phase in PHASES:
+        values = sorted(recorder.latencies[phase])
+        results["phases_ms"][phase] = {
+            "count": len(values),
+            **{f"p{q}": percentile(values, q) * 1000 for q in (50, 95, 99)},
+            "max": (values[-1] if values else 0.0) * 1000,
+        }
+
+    if args.alloc:
+        gc.collect() # Views and their items form cycles; only count what is really still alive
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        top = snapshot.filter_traces([tracemalloc.Filter(True, "*cogs*")]).statistics("lineno")[:args.alloc_top]
+        results["alloc"] = {
+            "current_kib": current / 1024,
+            "peak_kib": peak / 1024,
+            "top": [{"site": str(stat.traceback), "kib": stat.size / 1024, "blocks": stat.count} for stat in top],
+        }
+
+    store._store.close()
+    archive_dir.cleanup()
+    if args.backend == "sqlite":
+        database.close()
+        db_dir.cleanup()
+    return results
+
+
+def print_report(results: dict):
+    print(f"{results['games']} games x {results['players']} players, concurrency {results['concurrency']}, seed {results['seed']}, {results['backend']} backend")
+    print(f"  {results['games_per_s']:.1f} games/s ({results['elapsed_s']:.2f}s), {results['avg_days']:.1f} days/game")
+    print(f"  outcomes: {', '.join(f'{name}={count}' for name, count in sorted(results['outcomes'].items()))}")
+    print(f"  archive: {results['archive_kib']:.0f} KiB ({results['archive_kib'] / results['games']:.1f} KiB/game)")
+    print(f"\n  {'phase':<8}{'count':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for phase, stats in results["phases_ms"].items():
+        print(f"  {phase:<8}{stats['count']:>8}{stats['p50']:>10.3f}{stats['p95']:>10.3f}{stats['p99']:>10.3f}{stats['max']:>10.3f}")
+    print("\n  firebase ops (total / per game):")
+    for op, count in sorted(results["firebase_ops"].items()):
+        print(f"    {op:<12}{count:>8}{results['firebase_ops_per_game'][op]:>10.2f}")
+    if "alloc" in results:
+        alloc = results["alloc"]
+        print(f"\n  memory: {alloc['current_kib']:.0f} KiB live at exit, {alloc['peak_kib']:.0f} KiB peak")
+        for stat in alloc["top"]:
+            print(f"    {stat['kib']:>9.1f} KiB {stat['blocks']:>7} blocks  {stat['site']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Play Werewolf games offline and report engine performance.")
+    parser.add_argument("--games", type=int, default=1000)
+    parser.add_argument("--players", type=int, default=12)
+    parser.add_argument("--concurrency", type=int, default=16, help="Games in flight at once")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--backend", choices=("memory", "sqlite"), default="memory", help="Local database backend to play against")
+    parser.add_argument("--alloc", action="store_true", help="Trace allocations with tracemalloc (slower)")
+    parser.add_argument("--alloc-top", type=int, default=10, help="Allocation sites to list with --alloc")
+    parser.add_argument("--json", help="Also write the results to this file")
+    parser.add_argument("--metrics", help="Also dump the bot's metrics (store calls, phases, DMs) to this file")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    print_report(results)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.metrics:
+        dump_metrics(args.metrics)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,34 @@
 import discord
 from discord import app_commands
 from discord.ext import commands
-from .core import GamePhase, get_game_ref, get_game_data
-from .views import VotingView
+from .core import GamePhase, Role, ROLE_COLORS
+from .state import load_game_state, cached_game_state
+from .actor import run_game_command
+from .metrics import observe_ack
+from .stats import cached_guild_stats, guild_stats
+from .views import VotingView, targets_for, respond, reject, DYNAMIC_ITEMS
+
+
+def _win_rate(counts: dict) -> str:
+    games = counts.get("games", 0)
+    return f"{counts.get('wins', 0)}/{games} ({counts.get('wins', 0) / games:.0%})" if games else "0/0"
+
+async def _load_stats(interaction: discord.Interaction, kind: str):
+    """The guild's stats, deferring first if they still have to be read from Firebase."""
+    stats = cached_guild_stats(interaction.guild_id)
+    if stats is None:
+        await interaction.response.defer(thinking=True)
+        observe_ack(interaction, kind)
+        stats = await guild_stats(interaction.guild_id)
+    return stats
+
+async def _send(interaction: discord.Interaction, kind: str, **kwargs):
+    if interaction.response.is_done():
+        await interaction.followup.send(**kwargs)
+    else:
+        await interaction.response.send_message(**kwargs)
+        observe_ack(interaction, kind)
+
 
 class Actions(commands.Cog):
     """Cog for player actions during the Werewolf game."""
@@ -17,60 +43,62 @@ class Actions(commands.Cog):
     @ww_group.command(name="vote", description="🗳️ Vote to lynch a player during the day.")
     async def vote(self, interaction: discord.Interaction):
         """Allows a player to vote to lynch someone."""
-        game_data = get_game_data(interaction.channel_id)
-        game_ref = get_game_ref(interaction.channel_id)
+        state = cached_game_state(interaction.channel_id)
+        if state is None:
+            # Loading from Firebase can outlast the 3 seconds Discord gives us to answer
+            await interaction.response.defer(ephemeral=True, thinking=True)
+            observe_ack(interaction, "vote")
+            state = await load_game_state(interaction.channel_id)
         player_id = str(interaction.user.id)
 
-        if not game_data:
-            await interaction.response.send_message("There's no game happening right now, sweetie.", ephemeral=True)
+        if not state:
+            await respond(interaction, "There's no game happening right now, sweetie.")
             return
 
+        game_data = state.data
         if game_data.get("phase") != GamePhase.DAY.value:
-            await interaction.response.send_message("You can only vote during the day! Patience, my dear.", ephemeral=True)
+            await respond(interaction, "You can only vote during the day! Patience, my dear.")
             return
             
         player_states = game_data.get("player_states", {})
         if not player_states.get(player_id, {}).get("is_alive"):
-            await interaction.response.send_message("Ghosts can't vote, silly! You're dead. 👻", ephemeral=True)
+            await respond(interaction, "Ghosts can't vote, silly! You're dead. 👻")
             return
             
-        all_players = game_data.get("players", {})
-        alive_players_info = [
-            {"id": pid, "name": pdata["name"]}
-            for pid, pdata in all_players.items()
-            if player_states.get(pid, {}).get("is_alive", False) and pid != player_id # Can't vote for yourself
-        ]
-        
-        if not alive_players_info:
-            await interaction.response.send_message("There's no one else to vote for!", ephemeral=True)
+        if not targets_for(state, player_id, 'day_vote'): # Can't vote for yourself
+            await respond(interaction, "There's no one else to vote for!")
             return
             
-        view = VotingView(game_ref, player_id, alive_players_info)
-        await interaction.response.send_message("The time has come to cast your vote. Choose carefully...", view=view, ephemeral=True)
+        view = VotingView(state, player_id)
+        await respond(interaction, "The time has come to cast your vote. Choose carefully...", view=view)
 
     @ww_group.command(name="reveal", description="👑 Reveal yourself as the Mayor (Mayor only).")
     async def reveal(self, interaction: discord.Interaction):
         """Allows the Mayor to reveal themselves, making their vote count as two."""
-        game_data = get_game_data(interaction.channel_id)
-        game_ref = get_game_ref(interaction.channel_id)
         player_id = str(interaction.user.id)
-        player_state = game_data.get("player_states", {}).get(player_id)
+        # The game's actor may be busy; Discord only waits 3 seconds for an answer
+        await interaction.response.defer(thinking=True)
+        observe_ack(interaction, "reveal")
 
-        if not player_state or player_state.get("role") != "Mayor":
-            await interaction.response.send_message("You are not the Mayor! This action is not for you, little one.", ephemeral=True)
-            return
+        async def reveal_mayor(state):
+            player_state = state.get(f"player_states/{player_id}") if state else None
+            if not player_state or player_state.get("role") != "Mayor":
+                return "You are not the Mayor! This action is not for you, little one."
+            if not player_state.get("is_alive"):
+                return "You can't reveal yourself when you're a ghost, silly! 👻"
+            if player_state.get("is_mayor_revealed"):
+                return "You have already revealed yourself as the Mayor!"
 
-        if not player_state.get("is_alive"):
-            await interaction.response.send_message("You can't reveal yourself when you're a ghost, silly! 👻", ephemeral=True)
-            return
+            # Update the game state
+            state.set(f'player_states/{player_id}/is_mayor_revealed', True)
+            state.flush_soon()
+            return None
 
-        if player_state.get("is_mayor_revealed"):
-            await interaction.response.send_message("You have already revealed yourself as the Mayor!", ephemeral=True)
+        error = await run_game_command(interaction.channel_id, reveal_mayor)
+        if error:
+            await reject(interaction, error)
             return
 
-        # Update the database
-        game_ref.child('player_states').child(player_id).child('is_mayor_revealed').set(True)
-
         # Make a grand announcement
         embed = discord.Embed(
             title="👑 A Leader Steps Forward! 👑",
@@ -79,7 +107,56 @@ class Actions(commands.Cog):
         )
         embed.set_thumbnail(url=interaction.user.display_avatar.url)
         embed.set_footer(text="The political landscape has shifted...")
-        await interaction.response.send_message(embed=embed)
+        await interaction.followup.send(embed=embed)
+
+    @ww_group.command(name="stats", description="📊 Show a player's wins by role and team in this server.")
+    @app_commands.guild_only()
+    @app_commands.describe(player="Whose stats to show (you, if left empty)")
+    async def stats(self, interaction: discord.Interaction, player: discord.Member = None):
+        """Shows a player's record in this server."""
+        player = player or interaction.user
+        stats = await _load_stats(interaction, "stats")
+        entry = stats.players.get(str(player.id))
+        if not entry:
+            await _send(interaction, "stats", content=f"{player.display_name} hasn't finished a game here yet. Go play one, darling!", ephemeral=True)
+            return
+
+        embed = discord.Embed(
+            title=f"📊 {player.display_name}'s Record 📊",
+            description=f"**Wins:** {_win_rate(entry)}",
+            color=discord.Color.from_rgb(255, 182, 193)
+        )
+        embed.set_thumbnail(url=player.display_avatar.url)
+        teams = sorted((entry.get("teams") or {}).items(), key=lambda item: -item[1].get("games", 0))
+        embed.add_field(name="By Team", value="\n".join(f"{team.title()}: {_win_rate(counts)}" for team, counts in teams) or "None", inline=False)
+        roles = sorted((entry.get("roles") or {}).items(), key=lambda item: -item[1].get("games", 0))
+        embed.add_field(name="By Role", value="\n".join(f"{role}: {_win_rate(counts)}" for role, counts in roles) or "None", inline=False)
+        await _send(interaction, "stats", embed=embed)
+
+    @ww_group.command(name="leaderboard", description="🏆 Show the players with the most wins in this server.")
+    @app_commands.guild_only()
+    async def leaderboard(self, interaction: discord.Interaction):
+        """Shows this server's best players."""
+        stats = await _load_stats(interaction, "leaderboard")
+        top = stats.leaderboard()
+        if not top:
+            await _send(interaction, "leaderboard", content="No one has finished a game here yet!", ephemeral=True)
+            return
+
+        medals = ["🥇", "🥈", "🥉"]
+        lines = [
+            f"{medals[rank] if rank < len(medals) else f'`#{rank + 1}`'} <@{user_id}> ({entry.get('name', 'Unknown')}): {_win_rate(entry)}"
+            for rank, (user_id, entry) in enumerate(top)
+        ]
+        embed = discord.Embed(
+            title="🏆 Werewolf Leaderboard 🏆",
+            description="\n".join(lines),
+            color=discord.Color.gold()
+        )
+        embed.set_footer(text=f"{stats.totals.get('games', 0)} games played in this server")
+        await _send(interaction, "leaderboard", embed=embed)
 
 async def setup(bot: commands.Bot):
+    # Clicks on any game's prompts, even ones sent before a restart, are routed by their custom_id
+    bot.add_dynamic_items(*DYNAMIC_ITEMS)
     await bot.add_cog(Actions(bot)) 
\ No newline at end of file
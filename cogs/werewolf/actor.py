@@ -0,0 +1,81 @@
+import asyncio
+from .state import load_game_state
+
+# Every game is owned by a single actor: commands that read-modify-write a game
+# (joining, toggling roles, picking night targets, voting...) are queued on the
+# channel's actor and applied one at a time against the in-memory GameState.
+# Different channels never wait on each other; within a channel nothing is lost
+# to two clicks landing in the same second.
+
+ACTOR_IDLE_TIMEOUT = 300 # Seconds without commands before an actor's worker exits
+
+
+class GameActor:
+    """Applies one channel's game commands sequentially, in arrival order."""
+    def __init__(self, channel_id: int):
+        self.channel_id = channel_id
+        self._queue = asyncio.Queue()
+        self._worker = None
+
+    def submit(self, command) -> asyncio.Future:
+        """Queues `command(state)` (a coroutine function) and returns a future for its result."""
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((command, future))
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._work())
+        return future
+
+    async def _work(self):
+        while True:
+            try:
+                command, future = await asyncio.wait_for(self._queue.get(), ACTOR_IDLE_TIMEOUT)
+            except asyncio.TimeoutError:
+                if _actors.get(self.channel_id) is self:
+                    del _actors[self.channel_id]
+                return
+
+            if future.cancelled():
+                continue
+            try:
+                state = await load_game_state(self.channel_id)
+                result = await command(state)
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+            else:
+                if not future.done():
+                    future.set_result(result)
+
+
+_actors = {} # channel_id -> GameActor
+
+def get_actor(channel_id: int) -> GameActor:
+    actor = _actors.get(channel_id)
+    if actor is None:
+        actor = _actors[channel_id] = GameActor(channel_id)
+    return actor
+
+async def run_game_command(channel_id: int, command):
+    """
+    Runs `command(state)` on the channel's actor, after every command queued before it.
+    `state` is the channel's GameState, or None if there is no game.
+    """
+    return await get_actor(channel_id).submit(command)
+
+async def apply_to_game(state, mutate) -> bool:
+    """
+    Queues a synchronous `mutate(state)` for a component bound to one particular game.
+    Returns False without running it if that game has ended or been replaced since.
+    A copy of a game owned by another process has its writes forwarded to the owner.
+    """
+    if state.remote:
+        from .cluster import forward_to_owner # cluster.py queues its own writes on actors
+        return await forward_to_owner(state, mutate)
+
+    async def bound(current):
+        if current is not state or state.ended:
+            return False
+        mutate(state)
+        state.flush_soon() # Saved together with whatever else is clicked in the next moment
+        return True
+    return await run_game_command(state.channel_id, bound)
@@ -1,8 +1,11 @@
 import discord
 from discord import app_commands
 from discord.ext import commands
-from .core import get_game_ref, get_game_data, GamePhase
-from .views import SettingsView
+from .core import GamePhase
+from .state import discard_game_state
+from .actor import run_game_command
+from .scheduler import DEFAULT_PHASE_TIMERS
+from .views import open_settings
 
 class Admin(commands.Cog):
     """Cog for administrative Werewolf commands."""
@@ -14,49 +17,46 @@ class Admin(commands.Cog):
     @ww_group.command(name="settings", description="⚙️ Adjust the settings for the current game.")
     async def settings(self, interaction: discord.Interaction):
         """Allows the game creator to change settings before the game starts."""
-        game_data = get_game_data(interaction.channel_id)
-        game_ref = get_game_ref(interaction.channel_id)
+        await open_settings(interaction)
 
-        if not game_data:
-            await interaction.response.send_message("There's no game to configure, silly!", ephemeral=True)
-            return
-            
-        if game_data["creator_id"] != interaction.user.id:
-            await interaction.response.send_message("Only the person who created the game can change the settings!", ephemeral=True)
-            return
-            
-        if game_data["phase"] != GamePhase.WAITING.value:
-            await interaction.response.send_message("You can't change settings after the game has started!", ephemeral=True)
-            return
+    @ww_group.command(name="timer", description="⏱️ Set the maximum length of a game phase.")
+    @app_commands.describe(phase="The phase to change", seconds="Max seconds; the phase still ends early once everyone has acted")
+    @app_commands.choices(phase=[app_commands.Choice(name=phase, value=phase) for phase in DEFAULT_PHASE_TIMERS])
+    async def timer(self, interaction: discord.Interaction, phase: app_commands.Choice[str], seconds: app_commands.Range[int, 10, 600]):
+        """Allows the game creator to change a phase timer before the game starts."""
+        async def set_timer(state):
+            if not state:
+                return "There's no game to configure, silly!"
+            if state.get("creator_id") != interaction.user.id:
+                return "Only the person who created the game can change the settings!"
+            if state.get("phase") != GamePhase.WAITING.value:
+                return "You can't change settings after the game has started!"
 
-        # Create a beautiful embed to show current settings
-        enabled_roles = game_data.get('settings', {}).get('roles', [])
-        
-        embed = discord.Embed(
-            title="✨ Game Settings ✨",
-            description="Here are the current settings for your game. Use the buttons below to make changes, master!",
-            color=discord.Color.from_rgb(255, 209, 220) # A nice pastel pink
-        )
-        embed.add_field(
-            name="🎭 Enabled Roles",
-            value=" ".join([f"`{role}`" for role in enabled_roles]),
-            inline=False
-        )
-        # TODO: Add fields for timers, etc. in the future
+            state.set(f"settings/timers/{phase.value}", seconds)
+            state.flush_soon() # Saved in the background, so the reply doesn't wait on Firebase
+            return None
+
+        error = await run_game_command(interaction.channel_id, set_timer)
+        if error:
+            await interaction.response.send_message(error, ephemeral=True)
+            return
 
-        view = SettingsView(game_ref, game_data)
-        await interaction.response.send_message(embed=embed, view=view, ephemeral=True)
+        await interaction.response.send_message(f"Okay! The `{phase.value}` phase will now last at most {seconds} seconds. ⏱️", ephemeral=True)
 
     @ww_group.command(name="end", description="💔 Ends the current Werewolf game.")
     @app_commands.checks.has_permissions(manage_channels=True)
     async def end(self, interaction: discord.Interaction):
         """Ends the game in the channel (moderator only)."""
-        game_ref = get_game_ref(interaction.channel_id)
-        if not get_game_data(interaction.channel_id):
+        async def end_game(state):
+            if not state:
+                return False
+            await discard_game_state(interaction.channel_id, "ended_by_moderator")
+            return True
+
+        if not await run_game_command(interaction.channel_id, end_game):
             await interaction.response.send_message("There's no game to end here.", ephemeral=True)
             return
 
-        game_ref.delete()
         embed = discord.Embed(
             title="💔 Game Over 💔",
             description="The game has been ended by a moderator. Thank you for playing!",
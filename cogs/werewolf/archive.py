@@ -0,0 +1,119 @@
+import argparse
+import datetime
+import gzip
+import json
+import os
+import socket
+import sys
+import threading
+
+# Finished games leave the database (see sweeper.py), but not before they are copied
+# here for analytics: one JSON line per game, with its final state and full timeline,
+# in gzip-compressed chunks partitioned by the day the game ended:
+#
+#   <WEREWOLF_ARCHIVE_DIR>/date=2026-10-17/games-<writer>-0001.jsonl.gz
+#
+# Each game is appended to its chunk as one gzip member, which readers see as one
+# continuous stream, so a crash loses at most the game being written. A chunk is
+# closed once it passes ARCHIVE_CHUNK_BYTES. Several processes can share a directory:
+# each writes its own chunks.
+#
+# Reading goes one line at a time, so walking millions of games takes constant memory:
+#
+#   python -m cogs.werewolf.archive --since 2026-10-01 --omit timeline > games.jsonl
+#
+# This module only touches files, so the exporter runs without a database or bot.
+
+ARCHIVE_DIR = os.environ.get('WEREWOLF_ARCHIVE_DIR', 'archive') # Empty turns archiving off
+ARCHIVE_CHUNK_BYTES = 64 * 1024 * 1024 # Compressed size at which a new chunk is started
+# Names this process's chunks; the same as cluster.PROCESS_ID
+ARCHIVE_WRITER = os.environ.get("WEREWOLF_CLUSTER_ID") or f"{socket.gethostname()}-{os.getpid()}"
+
+
+class GameArchive:
+    """Appends archived games to the date-partitioned chunks of one writer."""
+    def __init__(self, root: str, writer: str):
+        self.root = root
+        self.writer = writer
+        self._chunks = {} # day -> path of the chunk being appended to
+        self._lock = threading.Lock() # Writes come from a thread pool
+
+    def _chunk_for(self, day: str) -> str:
+        path = self._chunks.get(day)
+        if path is not None and os.path.getsize(path) < ARCHIVE_CHUNK_BYTES:
+            return path
+        partition = os.path.join(self.root, f"date={day}")
+        os.makedirs(partition, exist_ok=True)
+        prefix = f"games-{self.writer}-"
+        # Carry on after the chunks this writer left before a restart
+        numbers = [int(name[len(prefix):-len(".jsonl.gz")]) for name in os.listdir(partition) if name.startswith(prefix)]
+        number = max(numbers, default=1)
+        path = os.path.join(partition, f"{prefix}{number:04d}.jsonl.gz")
+        if os.path.exists(path) and os.path.getsize(path) >= ARCHIVE_CHUNK_BYTES:
+            path = os.path.join(partition, f"{prefix}{number + 1:04d}.jsonl.gz")
+        self._chunks[day] = path
+        return path
+
+    def write(self, record: dict):
+        """Appends one game. Blocking: call it from a thread."""
+        day = datetime.datetime.fromtimestamp(record["ended_at"], datetime.timezone.utc).strftime("%Y-%m-%d")
+        line = json.dumps(record, separators=(",", ":")) + "\n"
+        with self._lock:
+            with gzip.open(self._chunk_for(day), "at", compresslevel=6, encoding="utf-8") as f:
+                f.write(line)
+
+
+def archive_record(game_id: str, log: dict, final: dict, events: list) -> dict:
+    """An archived game: what the analytics need up front, then its final state and timeline."""
+    player_states = final.get("player_states") or {}
+    return {
+        "game_id": game_id,
+        "channel_id": log.get("channel_id"),
+        "guild_id": final.get("guild_id"),
+        "created_at": log.get("created_at"),
+        "ended_at": log.get("ended_at"),
+        "outcome": log.get("outcome"),
+        "nights": (final.get("game_state") or {}).get("night_number", 0),
+        "roles": {pid: pstate.get("role") for pid, pstate in player_states.items()},
+        "survivors": [pid for pid, pstate in player_states.items() if pstate.get("is_alive")],
+        "final": final,
+        "timeline": [[seq, path, value] for seq, path, value in events],
+    }
+
+
+def iter_archived_games(root: str = ARCHIVE_DIR, since: str = None, until: str = None):
+    """Yields archived games one at a time, oldest day first. `since`/`until` are inclusive YYYY-MM-DD days."""
+    if not os.path.isdir(root):
+        return
+    for partition in sorted(os.listdir(root)):
+        if not partition.startswith("date="):
+            continue
+        day = partition[len("date="):]
+        if (since and day < since) or (until and day > until):
+            continue
+        directory = os.path.join(root, partition)
+        for name in sorted(os.listdir(directory)):
+            if not name.endswith(".jsonl.gz"):
+                continue
+            with gzip.open(os.path.join(directory, name), "rt", encoding="utf-8") as f:
+                for line in f:
+                    yield json.loads(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stream archived Werewolf games out as JSON lines.")
+    parser.add_argument("--root", default=ARCHIVE_DIR or "archive", help="Archive directory")
+    parser.add_argument("--since", help="First day to export (YYYY-MM-DD)")
+    parser.add_argument("--until", help="Last day to export (YYYY-MM-DD)")
+    parser.add_argument("--omit", action="append", default=[], help="Field to leave out, e.g. timeline or final (repeatable)")
+    args = parser.parse_args()
+
+    out = sys.stdout
+    for record in iter_archived_games(args.root, args.since, args.until):
+        for field in args.omit:
+            record.pop(field, None)
+        out.write(json.dumps(record, separators=(",", ":")) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,362 @@
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from .engine import Role, WEREWOLF_FACTION, role_deck
+
+# How many werewolves make a fair game depends on the table size and on which special
+# roles are in play: a quarter of the players is far too few at 18 and too many at 5.
+# The count is picked by simulating thousands of games per candidate, all at once as
+# NumPy arrays with one row per game, following the rules of engine.resolve_night and
+# resolve_lynch with simple policy players:
+#
+#   - wolves attack anyone but a plain Werewolf, the only teammates their prompt hides;
+#     the Seer checks someone she hasn't yet
+#   - Doctor, Bodyguard, Witch, Arsonist and Veteran act at random, as in bench/run.py
+#   - by day, the Mayor reveals themselves with even odds, as in bench/run.py, and only
+#     then votes twice. The pack votes together for anyone but a plain Werewolf, the
+#     village together for a wolf the Seer exposed or else whoever looks most
+#     suspicious (wolves slightly more)
+#
+# A count is fair when the werewolves win about as often as they lose, to the village
+# or to a neutral role. At small tables no count may be: one wolf with the Sorcerer is
+# already two of five players. So every count is also tried without the Sorcerer, who
+# is left out of the deal when that is clearly fairer (by more than LEAVE_OUT_MARGIN).
+# The fairest setup is stored in a balance table, keyed by players and enabled special
+# roles. balance_table.json ships the setups for the default roles (rebuild it with `python -m cogs.werewolf.balance`);
+# other settings are estimated in a process pool the first time they are seen, and
+# use a quarter of the players until then. Tables above MAX_PLAYERS always do: the day
+# vote is simulated as (games, players, players) arrays, which outgrow memory there.
+
+GAMES_PER_ESTIMATE = 4000 # Simulated games per candidate werewolf count
+MAX_DAYS = 30 # A simulated game still running after this many days is a stalemate
+SEER_TRUST = 0.7 # Chance the village goes after a wolf the Seer has exposed
+FOLLOW_THE_CROWD = 0.8 # Chance a player votes with their side rather than for anyone
+WOLF_TELL = 1.5 # How much more suspicious a wolf looks than a villager, by day
+LEAVE_OUT_MARGIN = 0.1 # How much fairer a game must get before the Sorcerer is left out
+MIN_PLAYERS, MAX_PLAYERS = 4, 20 # Table sizes balance_table.json covers
+BALANCE_TABLE_PATH = os.path.join(os.path.dirname(__file__), "balance_table.json")
+
+ROLES = list(Role)
+CODE = {role: code for code, role in enumerate(ROLES)}
+EVIL = np.array([role.value in WEREWOLF_FACTION for role in ROLES])
+OUTCOMES = ("village", "werewolves", "neutral", "stalemate")
+_ONGOING, _VILLAGE, _WEREWOLVES, _NEUTRAL, _STALEMATE = -1, 0, 1, 2, 3
+
+
+# --- Simulation ---
+
+def _pick(rng, allowed):
+    """One random True column per row (-1 where there is none)."""
+    scores = np.where(allowed, rng.random(allowed.shape) + 1, 0)
+    return np.where(allowed.any(-1), scores.argmax(-1), -1)
+
+def _holder(role, alive, code):
+    """The first living holder of a role in each game (-1 where there is none)."""
+    holds = alive & (role == code)
+    return np.where(holds.any(1), holds.argmax(1), -1)
+
+def _at(array, index):
+    """array[g, index[g]] for every game, False where index is -1."""
+    return np.where(index >= 0, array[np.arange(len(array)), np.maximum(index, 0)], False)
+
+def _mark(mask, rows, index):
+    """Sets mask[g, index[g]] for the games in `rows` whose index isn't -1."""
+    hit = rows & (index >= 0)
+    mask[np.nonzero(hit)[0], index[hit]] = True
+
+def _with_lovers(dying, alive, lover):
+    """Adds the lovers who die of heartbreak to `dying`."""
+    games, players = np.nonzero(dying & (lover >= 0))
+    partners = lover[games, players]
+    dying[games[alive[games, partners]], partners[alive[games, partners]]] = True
+    return dying
+
+def _winners(role, alive, lover, outcome):
+    """Records find_winner's verdict for every game still going."""
+    evil = EVIL[role]
+    living = alive.sum(1)
+    wolves = (alive & evil).sum(1)
+    first, last = alive.argmax(1), alive.shape[1] - 1 - alive[:, ::-1].argmax(1)
+    lovers = (living == 2) & (lover[np.arange(len(role)), first] == last)
+    arsonist = (living == 1) & (role[np.arange(len(role)), first] == CODE[Role.ARSONIST])
+    verdict = np.select(
+        [lovers | arsonist, wolves == 0, wolves >= living - wolves],
+        [_NEUTRAL, _VILLAGE, _WEREWOLVES], _ONGOING
+    )
+    ongoing = outcome == _ONGOING
+    outcome[ongoing] = verdict[ongoing]
+
+def _night(rng, night, role, alive, lover, doused, checked, known, potions, vet_used, outcome):
+    games, players = role.shape
+    rows = outcome == _ONGOING
+    everyone = np.arange(players)
+    evil = EVIL[role]
+
+    cupid = _holder(role, alive, CODE[Role.CUPID])
+    if night == 1:
+        pairs = rows & (cupid >= 0) & (alive.sum(1) >= 2)
+        first = _pick(rng, alive)
+        second = _pick(rng, alive & (everyone != first[:, None]))
+        pairs &= second >= 0
+        lover[pairs, first[pairs]] = second[pairs]
+        lover[pairs, second[pairs]] = first[pairs]
+
+    wolves = alive & (role == CODE[Role.WEREWOLF]) # Only plain Werewolves are prompted to hunt
+    target = np.where(rows & wolves.any(1), _pick(rng, alive & ~wolves), -1)
+    doctor = _holder(role, alive, CODE[Role.DOCTOR])
+    save = np.where(doctor >= 0, _pick(rng, alive), -1)
+    bodyguard = _holder(role, alive, CODE[Role.BODYGUARD])
+    protect = np.where(bodyguard >= 0, _pick(rng, alive & (everyone != bodyguard[:, None])), -1)
+    seer = _holder(role, alive, CODE[Role.SEER])
+    seer_pick = np.where(seer >= 0, _pick(rng, alive & ~checked & (everyone != seer[:, None])), -1)
+    witch = _holder(role, alive, CODE[Role.WITCH])
+    # Offered only when the wolves picked someone (see WitchActionView), before the Veteran's shots
+    witch_save = (witch >= 0) & potions[:, 0] & (target >= 0) & (rng.random(games) < 0.5)
+    witch_kill = np.where((witch >= 0) & potions[:, 1] & (rng.random(games) < 0.3), _pick(rng, alive & (everyone != witch[:, None])), -1)
+    potions[witch_save, 0] = False
+    potions[witch_kill >= 0, 1] = False
+    arsonist = _holder(role, alive, CODE[Role.ARSONIST])
+    ignite = (arsonist >= 0) & (rng.random(games) < 0.25)
+    douse = np.where((arsonist >= 0) & ~ignite, _pick(rng, alive & ~doused & (everyone != arsonist[:, None])), -1)
+    veteran = _holder(role, alive, CODE[Role.VETERAN])
+    alert = np.where((veteran >= 0) & ~vet_used & (rng.random(games) < 0.3), veteran, -1)
+    vet_used |= alert >= 0
+
+    dying = np.zeros_like(alive)
+    # The alerted Veteran shoots everyone who visits, and a wolf attack on them fails
+    on_alert = rows & (alert >= 0)
+    shot_wolves = on_alert & (target == alert)
+    dying[shot_wolves] |= wolves[shot_wolves]
+    for visitor, visited in ((doctor, save), (bodyguard, protect), (seer, seer_pick), (witch, witch_kill)):
+        _mark(dying, on_alert & (visited == alert), visitor)
+    target = np.where(shot_wolves, -1, target)
+
+    attacked = rows & (target >= 0) & ~witch_save & (target != save)
+    _mark(dying, attacked & (target == protect), bodyguard)
+    _mark(dying, attacked & (target != protect), target)
+    _with_lovers(dying, alive, lover)
+    _mark(dying, rows & ~_at(dying, witch_kill) & (witch_kill != save), witch_kill)
+    _with_lovers(dying, alive, lover)
+    _mark(doused, rows, douse)
+    dying |= ignite[:, None] & rows[:, None] & doused & alive
+    _with_lovers(dying, alive, lover)
+    alive &= ~dying
+
+    # The Seer's finding is shared with the village, even if she dies later
+    sees = rows & (seer >= 0) & ~_at(dying, seer)
+    _mark(checked, sees, seer_pick)
+    known |= checked & evil
+
+def _day(rng, role, alive, lover, known, exe_target, revealed, outcome):
+    games, players = role.shape
+    rows = outcome == _ONGOING
+    evil = EVIL[role]
+    others = alive[:, None, :] & ~np.eye(players, dtype=bool)
+    mayor = _holder(role, alive, CODE[Role.MAYOR])
+    revealed |= (mayor >= 0) & (rng.random(games) < 0.5)
+    # Each side rallies behind one name: the pack behind anyone it doesn't know as a wolf,
+    # the village behind an exposed wolf if it trusts the Seer, else whoever looks most suspicious
+    pack_pick = _pick(rng, alive & (role != CODE[Role.WEREWOLF]))
+    exposed = alive & known
+    trusting = exposed.any(1) & (rng.random(games) < SEER_TRUST)
+    suspicion = np.where(alive, rng.random((games, players)) * np.where(evil, WOLF_TELL, 1.0), -1)
+    village_pick = np.where(trusting, _pick(rng, exposed), suspicion.argmax(1))
+    rallying = np.where(evil, pack_pick[:, None], village_pick[:, None]) # (games, voters)
+    follows = (rng.random((games, players)) < FOLLOW_THE_CROWD) & (rallying >= 0) & (rallying != np.arange(players))
+    choice = np.where(follows[:, :, None], np.arange(players) == rallying[:, :, None], others)
+    votes = _pick(rng, choice) # (games, voters) -> target
+    voting = rows[:, None] & alive & (votes >= 0)
+
+    weight = np.where((role == CODE[Role.MAYOR]) & revealed[:, None], 2, 1) # See engine.vote_weight
+    tally = np.zeros((games, players), dtype=np.int64)
+    game_of = np.broadcast_to(np.arange(games)[:, None], votes.shape)
+    np.add.at(tally, (game_of[voting], votes[voting]), weight[voting])
+    top = tally.max(1)
+    lynched = np.where((top > 0) & ((tally == top[:, None]).sum(1) == 1), tally.argmax(1), -1)
+    lynching = rows & (lynched >= 0)
+
+    lynched_role = np.where(lynching, role[np.arange(games), np.maximum(lynched, 0)], -1)
+    solo_win = lynching & ((lynched_role == CODE[Role.JESTER]) | ((exe_target >= 0) & (exe_target == lynched)))
+    outcome[solo_win] = _NEUTRAL
+    lynching &= ~solo_win
+
+    # A lynched Alpha Wolf turns one of the players who voted for them
+    alpha = lynching & (lynched_role == CODE[Role.ALPHA_WOLF])
+    convert = _pick(rng, voting & (votes == lynched[:, None]))
+    turned = alpha & (convert >= 0)
+    role[np.nonzero(turned)[0], convert[turned]] = CODE[Role.WEREWOLF]
+
+    dying = np.zeros_like(alive)
+    _mark(dying, lynching, lynched)
+    alive &= ~_with_lovers(dying, alive, lover)
+
+def deal(rng, num_players: int, enabled_roles: list, num_werewolves: int, games: int):
+    """Deals `games` tables as deal_roles would. Returns role codes (games, players) and Executioner targets."""
+    deck_rng = random.Random(int(rng.integers(1 << 62)))
+    role = np.array([[CODE[r] for r in role_deck(num_players, enabled_roles, deck_rng, num_werewolves)] for _ in range(games)])
+    # The Executioner's target is anyone but themselves and the plain Werewolves
+    holds = role == CODE[Role.EXECUTIONER]
+    exe_target = np.where(holds.any(1), _pick(rng, ~holds & (role != CODE[Role.WEREWOLF])), -1)
+    return role, exe_target
+
+def simulate(rng, role, exe_target) -> np.ndarray:
+    """Plays every game to the end. Returns one OUTCOMES index per game."""
+    games, players = role.shape
+    role = role.copy()
+    alive = np.ones((games, players), dtype=bool)
+    lover = np.full((games, players), -1)
+    doused = np.zeros_like(alive)
+    checked = np.zeros_like(alive)
+    known = np.zeros_like(alive)
+    potions = np.ones((games, 2), dtype=bool) # save, kill
+    vet_used = np.zeros(games, dtype=bool)
+    revealed = np.zeros(games, dtype=bool) # Whether the Mayor has revealed themselves
+    outcome = np.full(games, _ONGOING)
+    for day in range(1, MAX_DAYS + 1):
+        _night(rng, day, role, alive, lover, doused, checked, known, potions, vet_used, outcome)
+        _winners(role, alive, lover, outcome)
+        _day(rng, role, alive, lover, known, exe_target, revealed, outcome)
+        _winners(role, alive, lover, outcome)
+        if (outcome != _ONGOING).all():
+            break
+    outcome[outcome == _ONGOING] = _STALEMATE
+    return outcome
+
+def candidate_counts(num_players: int, enabled_roles: list) -> list:
+    """Werewolf counts worth trying: at least one, and fewer wolves than everyone else."""
+    pack_extras = 1 if Role.SORCERER in enabled_roles else 0
+    return [count for count in range(1, num_players) if 2 * (count + pack_extras) < num_players] or [1]
+
+def left_out_choices(enabled_roles: list) -> list:
+    """The roles worth trying to leave out of the deal: none, or the Sorcerer if enabled."""
+    return [()] + ([(Role.SORCERER.value,)] if Role.SORCERER in enabled_roles else [])
+
+def estimate_balance(num_players: int, enabled_roles: list, games: int = GAMES_PER_ESTIMATE, seed: int = None) -> dict:
+    """
+    Win rates for every candidate setup, a tuple of the roles left out and a werewolf count:
+    {(left_out, count): {"village": p, "werewolves": p, "neutral": p, "stalemate": p}}.
+    Takes role values so it can run in another process.
+    """
+    rng = np.random.default_rng(seed)
+    enabled_roles = [Role(value) for value in enabled_roles]
+    rates = {}
+    for left_out in left_out_choices(enabled_roles):
+        roles = [role for role in enabled_roles if role.value not in left_out]
+        for count in candidate_counts(num_players, roles):
+            # One candidate at a time, so only `games` tables are in memory at once
+            outcome = simulate(rng, *deal(rng, num_players, roles, count, games))
+            tallies = np.bincount(outcome, minlength=len(OUTCOMES)) / games
+            rates[left_out, count] = {name: float(rate) for name, rate in zip(OUTCOMES, tallies)}
+    return rates
+
+def fairest_setup(rates: dict) -> dict:
+    """
+    The setup whose werewolves win closest to as often as everyone else (the village and
+    the neutral roles together); the fewer wolves on a tie. Roles are only left out if
+    that beats the fairest setup with every role by more than LEAVE_OUT_MARGIN.
+    Returns a balance table entry: {"werewolves": count, "left_out": [role, ...]}.
+    """
+    def imbalance(setup):
+        rate = rates[setup]
+        return abs(rate["werewolves"] - rate["village"] - rate["neutral"])
+    def fairest(setups):
+        return min(setups, key=lambda setup: (imbalance(setup), setup[1]))
+    best = fairest_with_all = fairest([setup for setup in rates if not setup[0]])
+    others = [setup for setup in rates if setup[0]]
+    if others and imbalance(fairest(others)) < imbalance(fairest_with_all) - LEAVE_OUT_MARGIN:
+        best = fairest(others)
+    return {"werewolves": best[1], "left_out": list(best[0])}
+
+
+# --- The balance table ---
+
+def table_key(num_players: int, enabled_roles: list) -> str:
+    specials = sorted(role.value for role in set(enabled_roles) if role not in (Role.VILLAGER, Role.WEREWOLF))
+    return f"{num_players}:{','.join(specials)}"
+
+def _load_table() -> dict:
+    try:
+        with open(BALANCE_TABLE_PATH) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+_table = _load_table() # table_key -> {"werewolves": count, "left_out": [role, ...]}
+_estimating = {} # table_key -> task estimating it in the pool
+_pool = None
+
+def balanced_setup(num_players: int, enabled_roles: list) -> tuple:
+    """
+    (werewolf count, roles to deal from) for a fair table. The count is None if it isn't
+    known yet, and the roles are then all of `enabled_roles`. A miss starts an estimate
+    in the background, so the next game with these settings gets one.
+    """
+    if num_players > MAX_PLAYERS:
+        return None, enabled_roles # Too large to simulate
+    key = table_key(num_players, enabled_roles)
+    entry = _table.get(key)
+    if entry is None:
+        if key not in _estimating:
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                return None, enabled_roles # Not in the bot: nothing to schedule on
+            _estimating[key] = loop.create_task(_estimate_in_pool(key, num_players, [role.value for role in enabled_roles]))
+        return None, enabled_roles
+    return entry["werewolves"], [role for role in enabled_roles if role.value not in entry["left_out"]]
+
+async def _estimate_in_pool(key: str, num_players: int, enabled_roles: list):
+    global _pool
+    if _pool is None:
+        # Spawned, not forked: the bot's threads (store, archive) must not be copied mid-operation
+        _pool = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn"))
+    try:
+        rates = await asyncio.get_running_loop().run_in_executor(_pool, estimate_balance, num_players, enabled_roles)
+        _table[key] = fairest_setup(rates)
+    except Exception as e:
+        print(f"Could not estimate the balance of {key}: {e}")
+    finally:
+        _estimating.pop(key, None)
+
+def shutdown_balance_pool():
+    """Stops the estimating process, if one was started. Called when the bot shuts down."""
+    global _pool
+    for task in _estimating.values():
+        task.cancel()
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild balance_table.json by simulating games with the default roles.")
+    parser.add_argument("--games", type=int, default=GAMES_PER_ESTIMATE, help="Simulated games per candidate werewolf count")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--processes", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    enabled_roles = [role.value for role in Role]
+    sizes = range(MIN_PLAYERS, MAX_PLAYERS + 1)
+    with ProcessPoolExecutor(max_workers=args.processes) as pool:
+        estimates = pool.map(estimate_balance, sizes, [enabled_roles] * len(sizes), [args.games] * len(sizes), [args.seed + size for size in sizes])
+        table = {}
+        for size, rates in zip(sizes, estimates):
+            entry = table[table_key(size, list(Role))] = fairest_setup(rates)
+            without = f" without the {', '.join(entry['left_out'])}" if entry["left_out"] else ""
+            print(f"{size:>2} players -> {entry['werewolves']} werewolves{without}")
+            for (left_out, wolves), rate in rates.items():
+                label = f"{wolves} wolves" + (f" without the {', '.join(left_out)}" if left_out else "")
+                print(f"    {label}: {rate['werewolves']:.0%} wolves / {rate['village']:.0%} village / {rate['neutral']:.0%} neutral")
+
+    with open(BALANCE_TABLE_PATH, "w") as f:
+        json.dump(table, f, indent=2)
+        f.write("\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+import asyncio
+import os
+import socket
+import time
+from .store import get_store
+from .eventlog import encode_event, decode_event
+from .players import to_json
+from .state import ChangeSet, forget_mirror
+from .actor import run_game_command
+
+# The bot can run as several processes (see launcher.py), each connected to its own
+# shards. Discord sends a guild's commands to the process holding that guild's shard,
+# so that process owns the guild's games: their state, actors and loops live there.
+#
+# A game loop must still run exactly once cluster-wide, including while a process
+# restarts or its shards move, so it is guarded by a lease in the store:
+#
+#   leases/<channel_id> = {"owner": <process id>, "expires": <unix time>}
+#
+# The owner renews its leases every LEASE_RENEW_INTERVAL seconds. If it dies, its
+# leases run out after LEASE_TTL and whichever process sees the channel adopts the game.
+# A process started on its own has no one to share its games with, so it neither takes
+# nor respects leases: its predecessor's are only left over from a crash.
+#
+# Interactions from DMs (night prompts) always arrive on shard 0, which may belong to
+# another process. That process checks the click against its mirror of the game (see
+# mirror_game_state), stages the click's writes and forwards them to the owner through
+# `game_inbox/<channel_id>`. The owner listens to that inbox while its loop runs, so
+# a forwarded pick is applied the moment it is written.
+
+LEASE_TTL = 60.0             # Seconds a lease lasts without being renewed
+LEASE_RENEW_INTERVAL = 20.0  # Seconds between two renewals; a few may fail before the lease runs out
+
+# Set by launcher.py. A process started on its own runs every shard and owns every game.
+CLUSTERED = bool(os.environ.get("WEREWOLF_SHARD_IDS"))
+# Stable across restarts of the same cluster slot, so a restarted process gets its games back at once
+PROCESS_ID = os.environ.get("WEREWOLF_CLUSTER_ID") or f"{socket.gethostname()}-{os.getpid()}"
+
+_held = {} # channel_id -> [expires, on_lost] for every lease this process holds
+_renewer = None # The task renewing them
+
+
+def _lease_ref(channel_id: int):
+    return get_store().reference('leases').child(str(channel_id))
+
+def lease_is_free(lease, now: float = None) -> bool:
+    """True if nobody else holds `lease` (a `leases/<channel_id>` value) right now."""
+    if not CLUSTERED or not lease or lease.get("owner") == PROCESS_ID:
+        return True
+    return lease.get("expires", 0) <= (now or time.time())
+
+def owns_game(channel_id: int) -> bool:
+    return not CLUSTERED or channel_id in _held
+
+async def acquire_lease(channel_id: int, on_lost=None) -> bool:
+    """
+    Claims a game for this process. Returns False if another process holds it.
+    `on_lost()` is called if the lease is later taken over (e.g. after we stalled past LEASE_TTL).
+    """
+    if not get_store() or not CLUSTERED:
+        return True # No other processes to agree with
+    expires = time.time() + LEASE_TTL
+
+    def claim(lease):
+        return {"owner": PROCESS_ID, "expires": expires} if lease_is_free(lease) else lease
+
+    lease = await _lease_ref(channel_id).transaction(claim)
+    if not lease or lease.get("owner") != PROCESS_ID:
+        return False
+    _held[channel_id] = [expires, on_lost]
+    forget_mirror(channel_id) # Ours now: from here on it is read and written locally
+
+    global _renewer
+    if _renewer is None or _renewer.done():
+        _renewer = asyncio.create_task(_renew_leases())
+    return True
+
+async def release_lease(channel_id: int):
+    """Gives a game up, e.g. because it ended, so nobody waits LEASE_TTL to adopt it."""
+    if _held.pop(channel_id, None) is None:
+        return
+    await _lease_ref(channel_id).transaction(lambda lease: None if lease_is_free(lease) else lease)
+
+async def release_all_leases():
+    """Called on a clean shutdown, so a restarted or another process can take our games right away."""
+    await asyncio.gather(*(release_lease(channel_id) for channel_id in list(_held)), return_exceptions=True)
+
+async def _renew_leases():
+    while _held:
+        await asyncio.sleep(LEASE_RENEW_INTERVAL)
+        for channel_id, held in list(_held.items()):
+            expires = time.time() + LEASE_TTL
+
+            def renew(lease):
+                return {"owner": PROCESS_ID, "expires": expires} if lease_is_free(lease) else lease
+
+            try:
+                lease = await _lease_ref(channel_id).transaction(renew)
+                lost = not lease or lease.get("owner") != PROCESS_ID
+            except Exception as e:
+                print(f"Could not renew the lease on game {channel_id}: {e}")
+                lost = held[0] <= time.time() # Someone else may have adopted it by now
+            else:
+                if not lost:
+                    held[0] = expires
+            if lost and _held.get(channel_id) is held:
+                del _held[channel_id]
+                print(f"Lost game {channel_id} to another process.")
+                if held[1]:
+                    held[1]()
+
+
+# --- Forwarding writes to a game's owner ---
+
+def _inbox_ref(channel_id: int):
+    return get_store().reference('game_inbox').child(str(channel_id))
+
+async def forward_to_owner(state, mutate) -> bool:
+    """
+    Runs `mutate` against a ChangeSet over `state` (a copy of a game owned elsewhere)
+    and queues the staged writes for the owner. Returns False if the game has ended.
+    """
+    if state.ended:
+        return False
+    changes = ChangeSet(state)
+    mutate(changes)
+    await _inbox_ref(state.channel_id).child(f"m{time.time_ns()}-{PROCESS_ID}").set({
+        "phase": state.get("phase"),
+        "round": state.get("game_state/night_number", 0),
+        "writes": [encode_event(path, to_json(value)) for path, value in changes.items()],
+    })
+    return True
+
+async def drain_inbox(state):
+    """Applies the writes forwarded to an owned game as they arrive, for as long as it runs."""
+    inbox_ref = _inbox_ref(state.channel_id)
+    arrived = asyncio.Queue()
+
+    def on_event(event):
+        key = event.path.strip('/')
+        messages = {key: event.data} if key else (event.data or {})
+        for key, message in sorted(messages.items()):
+            if isinstance(message, dict): # Not our own deletions
+                arrived.put_nowait((key, message))
+
+    async def apply(current, batch):
+        if current is not state:
+            return
+        for key, message in batch:
+            # Sent from a prompt that was still current; drop it if the game has moved on since
+            if message.get("phase") != state.get("phase") or message.get("round") != state.get("game_state/night_number", 0):
+                continue
+            for raw in message.get("writes") or []:
+                state.set(*decode_event(raw))
+        state.flush_soon()
+
+    subscription = await inbox_ref.listen(on_event)
+    try:
+        while not state.ended:
+            batch = [await arrived.get()]
+            while not arrived.empty():
+                batch.append(arrived.get_nowait())
+            await run_game_command(state.channel_id, lambda current: apply(current, batch))
+            await inbox_ref.update({key: None for key, _ in batch})
+    finally:
+        await subscription.close()
@@ -1,34 +1,16 @@
 import discord
-from enum import Enum
-from firebase_config import get_db
-import random
+from discord.ext import commands
 import asyncio
-from .roles import send_night_action_prompts, send_early_night_prompts, prompt_witch
-from collections import Counter
-
-class GamePhase(Enum):
-    WAITING = "WAITING"
-    NIGHT = "NIGHT"
-    DAY = "DAY"
-    VOTING = "VOTING"
-    ENDED = "ENDED"
-
-class Role(Enum):
-    WEREWOLF = "Werewolf"
-    VILLAGER = "Villager"
-    SEER = "Seer"
-    DOCTOR = "Doctor"
-    WITCH = "Witch"
-    HUNTER = "Hunter"
-    CUPID = "Cupid"
-    BODYGUARD = "Bodyguard"
-    JESTER = "Jester"
-    EXECUTIONER = "Executioner"
-    ARSONIST = "Arsonist"
-    MAYOR = "Mayor"
-    VETERAN = "Veteran"
-    ALPHA_WOLF = "Alpha Wolf"
-    SORCERER = "Sorcerer"
+import functools
+import time
+from .store import get_store
+from .state import GameState, ChangeSet, get_game_ref, load_game_state, cached_game_state, discard_game_state, forget_game_state
+from .metrics import step_seconds, active_games, players_by_phase, add_collector
+from .stats import record_game_result
+from .balance import balanced_setup
+from .cluster import CLUSTERED, LEASE_TTL, acquire_lease, release_lease, lease_is_free, drain_inbox
+from .scheduler import phase_timeout, wait_for_phase, night_actions_done, day_votes_done
+from .engine import GamePhase, Role, deal_roles, resolve_night, count_lynch_votes, resolve_lynch, find_winner
 
 # --- Role Information ---
 ROLE_DESCRIPTIONS = {
@@ -67,289 +49,455 @@ ROLE_COLORS = {
     Role.SORCERER: discord.Color.from_rgb(118, 42, 131), # Dark Magenta
 }
 
-# This file will hold our core game logic, data models, and database interactions.
+# --- Embed Templates ---
+# Embeds that read the same in every game are built once and shared by every send.
+# discord.py only reads an embed when sending it, so never modify one of these;
+# copy() it first if it needs changing.
+
+ROLE_REVEAL_EMBEDS = {
+    role: discord.Embed(
+        title=f"Your secret role is... {role.value}! 🎭",
+        description=f"Shhh... it's a secret!\n\n**Mission:**\n{ROLE_DESCRIPTIONS.get(role)}",
+        color=ROLE_COLORS.get(role, discord.Color.default())
+    )
+    for role in Role
+}
+
+@functools.lru_cache(maxsize=64)
+def night_banner(night_num: int) -> discord.Embed:
+    """The "Night N has fallen" announcement, shared by every game on its Nth night."""
+    embed = discord.Embed(
+        title=f"🌙 Night {night_num} has fallen... 🌙",
+        description="The moon is high in the sky. If you have a night action, I've sent you a DM. Sweet dreams... or nightmares?",
+        color=discord.Color.dark_blue()
+    )
+    embed.set_image(url="https://i.imgur.com/vHj3mGz.gif")
+    return embed
+
+# This file connects the rules in engine.py to Discord and the game state: it runs
+# the game loop and turns the engine's events into embeds and DMs.
 # It's not a cog, but a helper module for the other cogs.
 
-def get_game_ref(channel_id: int):
-    """Gets the Firebase reference for a game in a specific channel."""
-    db = get_db()
-    if not db:
-        return None
-    return db.child('games').child(str(channel_id))
+async def get_game_data(channel_id: int):
+    """Returns the game data, served from memory once the game has been loaded."""
+    state = await load_game_state(channel_id)
+    return state.data if state else None
 
-def get_game_data(channel_id: int):
-    """Retrieves the game data from Firebase."""
-    game_ref = get_game_ref(channel_id)
-    if not game_ref:
-        return None
-    return game_ref.get()
+def check_game_host(user_id, state: GameState):
+    return state is not None and state.get('creator_id') == user_id
 
-def check_game_host(user_id, game_ref):
-    game_data = game_ref.get()
-    return game_data and game_data.get('creator_id') == user_id
+FIELD_VALUE_LIMIT = 1024 # Discord's limit for one embed field
 
-# --- Core Game Logic ---
-async def distribute_roles(game_ref, game_data: dict, players: dict):
-    """Assigns roles to players based on game settings and stores them in Firebase."""
-    player_ids = list(players.keys())
-    random.shuffle(player_ids)
-    num_players = len(player_ids)
-
-    # This is the key change: read roles from settings!
-    enabled_roles_str = game_data.get("settings", {}).get("roles", [r.value for r in Role])
-    enabled_roles = [Role(rs) for rs in enabled_roles_str]
-
-    # Dynamically select special roles from the enabled list
-    special_roles = [r for r in enabled_roles if r not in [Role.VILLAGER, Role.WEREWOLF]]
-    random.shuffle(special_roles)
-    
-    # Simple werewolf count for now, can be a setting later
-    num_werewolves = max(1, num_players // 4)
-    
-    roles_to_assign = []
-
-    # Assign Sorcerer first if enabled
-    if Role.SORCERER in enabled_roles:
-        roles_to_assign.append(Role.SORCERER)
-        # Ensure there's at least one werewolf for the Sorcerer to side with
-        if num_werewolves == 0:
-            num_werewolves = 1
-    
-    roles_to_assign.extend([Role.WEREWOLF] * num_werewolves)
-    
-    # Designate one werewolf as the Alpha Wolf if there's more than one
-    if num_werewolves > 1 and Role.ALPHA_WOLF in enabled_roles:
-        roles_to_assign[0] = Role.ALPHA_WOLF
+def add_chunked_field(embed: discord.Embed, name: str, lines: list, inline: bool = False):
+    """Adds one line per player as a field, split over as many fields as big lobbies need."""
+    chunk = ""
+    for line in lines:
+        if chunk and len(chunk) + 1 + len(line) > FIELD_VALUE_LIMIT:
+            embed.add_field(name=name, value=chunk, inline=inline)
+            name = "\u200b" # Continuation fields read as one long list
+            chunk = ""
+        chunk = f"{chunk}\n{line}" if chunk else line
+    embed.add_field(name=name, value=chunk, inline=inline)
 
-    # Fill with special roles, up to the number of available slots
-    slots_for_specials = num_players - len(roles_to_assign)
-    
-    for i in range(min(len(special_roles), slots_for_specials)):        
-        roles_to_assign.append(special_roles.pop())
-    
-    # Fill the rest with Villagers
-    roles_to_assign += [Role.VILLAGER] * (num_players - len(roles_to_assign))
-    random.shuffle(roles_to_assign)
 
-    player_roles = {player_id: role.value for player_id, role in zip(player_ids, roles_to_assign)}
-    
-    # Set initial player state
-    player_states = {}
-    for p_id in player_ids:
-        player_states[p_id] = {
-            "role": player_roles[p_id],
-            "is_alive": True,
-            "is_protected": False,
-            "is_healed_by_witch": False,
-            "lover_id": None,
-            "is_doused": False,
-            "is_mayor_revealed": False,
-            "veteran_alerts": 1, # Starting alerts
-            "is_on_alert": False,
-        }
-    
-    # Assign Executioner's target
-    executioner_id = None
-    for p_id, role_str in player_roles.items():
-        if role_str == Role.EXECUTIONER.value:
-            executioner_id = p_id
-            break
-    
-    if executioner_id:
-        potential_targets = [
-            p_id for p_id, role_str in player_roles.items() 
-            if role_str != Role.EXECUTIONER.value and role_str != Role.WEREWOLF.value
-        ]
-        if potential_targets:
-            target_id = random.choice(potential_targets)
-            player_states[executioner_id]['target_id'] = target_id
-
-    game_ref.child("roles").set(player_roles)
-    game_ref.child("player_states").set(player_states)
-    game_ref.child("game_state").set({
-        "night_number": 0,
-        "phase": GamePhase.NIGHT.value,
-        "witch_potions": { "kill": True, "save": True },
-        "veteran_alerts_used": False, # To track if the single alert is used
-    })
-
-
-async def start_game_loop(bot: commands.Bot, channel_id: int):
-    """The main game loop that transitions between night and day."""
-    await asyncio.sleep(5) # Give a moment for DMs to be sent
-    
-    # --- Handle First Night Lover DMs ---
-    game_data = get_game_data(channel_id)
-    if game_data.get("game_state", {}).get("night_number") == 1:
-        await asyncio.sleep(60) # Wait for cupid to choose
-        game_data = get_game_data(channel_id)
-        await dm_lovers(bot, game_data)
+# --- Core Game Logic ---
+async def distribute_roles(state: GameState, players: dict):
+    """Assigns roles to players based on game settings and stores them with a single update."""
+    changes = ChangeSet(state)
+    enabled_roles = [Role(value) for value in state.get("settings/roles", [role.value for role in Role])]
+    # The setup balance.py found fairest for these settings; a quarter of the players until it is known
+    num_werewolves, enabled_roles = balanced_setup(len(players), enabled_roles)
+    deal_roles(changes, players, num_werewolves=num_werewolves, enabled_roles=enabled_roles)
+    await state.commit(changes)
+
+
+# --- Game Loop ---
+# A game day is a fixed sequence of steps. The current step and, for steps that wait
+# on players, its deadline are persisted together with that step's own changes, so
+# after a restart every game can be resumed at the right step with the time it had left.
+
+RESUME_BATCH_SIZE = 10   # Games restored at once on startup
+RESUME_BATCH_DELAY = 2.0 # Seconds between batches, so a restart doesn't stampede Firebase
+ADOPT_INTERVAL = LEASE_TTL # Seconds between two looks for games whose owner died (see cluster.py)
+
+_game_loops = {} # channel_id -> asyncio.Task running that game's loop
+
+def is_game_running(channel_id: int) -> bool:
+    task = _game_loops.get(channel_id)
+    return task is not None and not task.done()
+
+def running_games() -> list:
+    """The channel ids of the games whose loop runs in this process."""
+    return [channel_id for channel_id, task in _game_loops.items() if not task.done()]
+
+def launch_game_loop(bot: commands.Bot, channel_id: int, resume: bool = False):
+    """Starts a game's loop in the background, unless one is already running."""
+    task = _game_loops.get(channel_id)
+    if task and not task.done():
+        return task
+    task = asyncio.create_task(start_game_loop(bot, channel_id, resume))
+    _game_loops[channel_id] = task
+    task.add_done_callback(lambda t: _game_loops.pop(channel_id, None) if _game_loops.get(channel_id) is t else None)
+    return task
+
+async def resume_games(bot: commands.Bot):
+    """
+    Picks up every in-flight game in our guilds that no live process is running, a few
+    games at a time: after a restart, and then every ADOPT_INTERVAL when clustered.
+    """
+    global _adopter
+    await _resume_orphaned_games(bot)
+    if CLUSTERED and (_adopter is None or _adopter.done()):
+        _adopter = asyncio.create_task(_adopt_games(bot))
 
+_adopter = None # The task adopting the games of processes that died
+
+async def _adopt_games(bot: commands.Bot):
     while True:
-        game_ref = get_game_ref(channel_id)
-        game_data = game_ref.get()
-        if not game_data or game_data.get("phase") == GamePhase.ENDED.value:
-            break
-        
-        # --- NIGHT PHASE ---
-        await start_night_phase(bot, channel_id, game_data)
-        await asyncio.sleep(30) # 30 seconds for initial actions
-
-        # --- WITCH PHASE ---
-        game_data = get_game_data(channel_id) # Refetch data to get wolf votes
-        if not game_data: break
-        await prompt_witch(bot, game_data) # A new function to prompt the witch
-        await asyncio.sleep(30) # 30 seconds for the witch to act
-
-        # --- DAY PHASE ---
-        game_data = get_game_data(channel_id) # Refetch data for all actions
-        if not game_data: break
-        await start_day_phase(bot, channel_id, game_data)
-        
-        # We check win condition after day announcement because of Hunter/Lover deaths
-        # This is tricky, a better way might be to re-check win condition inside start_day_phase after deaths.
-        new_game_data = get_game_data(channel_id)
-        if not new_game_data: break
-        if await check_win_condition(bot, channel_id, new_game_data):
-            break
-
-        # --- VOTING PHASE ---
-        day_discussion_duration = 120 # 2 minutes for discussion
-        channel = bot.get_channel(channel_id)
-        await channel.send(f"You have {day_discussion_duration} seconds to discuss and cast your votes using `/ww vote`!")
-        await asyncio.sleep(day_discussion_duration)
-
-        # Refetch data to get all the new day_votes
-        game_data = get_game_data(channel_id)
-        if not game_data: break
-
-        lynch_story, lynched_id = await process_lynch_votes(game_data)
-        
-        # --- JESTER/EXECUTIONER WIN CONDITION CHECK ---
-        if lynched_id:
-            # Check for Jester Win
-            lynched_role = game_data.get("player_states", {}).get(lynched_id, {}).get("role")
-            if lynched_role == Role.JESTER.value:
-                jester_name = game_data.get("players", {}).get(lynched_id, {}).get("name", "The Jester")
-                jester_win_embed = discord.Embed(
-                    title="😂 The Jester Wins! 😂",
-                    description=f"The village has been played for fools! You have lynched **{jester_name}**, the Jester, which was their goal all along! The Jester wins the game, laughing all the way from the grave.",
-                    color=ROLE_COLORS[Role.JESTER]
-                )
-                jester_win_embed.set_image(url="https://i.imgur.com/gB41pPE.gif") # Jester gif
-                jester_win_embed.set_footer(text="The game is over!")
-                await channel.send(embed=jester_win_embed)
-                get_game_ref(channel_id).delete()
-                break # End the game loop
-
-            # Check for Executioner Win
-            player_states = game_data.get("player_states", {})
-            for pid, state in player_states.items():
-                if state.get("role") == Role.EXECUTIONER.value and state.get("target_id") == lynched_id:
-                    exe_name = game_data.get("players", {}).get(pid, {}).get("name", "The Executioner")
-                    target_name = game_data.get("players", {}).get(lynched_id, {}).get("name", "their target")
-                    exe_win_embed = discord.Embed(
-                        title="🔪 The Executioner Wins! 🔪",
-                        description=f"The village has been manipulated! **{exe_name}** has successfully convinced you to lynch their target, **{target_name}**. The Executioner's personal vendetta is complete, and they win the game!",
-                        color=ROLE_COLORS[Role.EXECUTIONER]
-                    )
-                    exe_win_embed.set_image(url="https://i.imgur.com/kSdv2a2.gif") # Executioner gif
-                    exe_win_embed.set_footer(text="The game is over!")
-                    await channel.send(embed=exe_win_embed)
-                    get_game_ref(channel_id).delete()
-                    return # Use return to exit the function and thus the loop
-
-        # --- ALPHA WOLF CONVERSION CHECK ---
-        if lynched_id:
-            lynched_role = game_data.get("player_states", {}).get(lynched_id, {}).get("role")
-            if lynched_role == Role.ALPHA_WOLF.value:
-                day_votes = game_data.get("day_votes", {})
-                # Find the last person who voted for the Alpha Wolf
-                last_voter_id = None
-                for voter, target in reversed(list(day_votes.items())):
-                    if target == lynched_id:
-                        last_voter_id = voter
-                        break
-                
-                if last_voter_id:
-                    # Convert the voter
-                    game_ref = get_game_ref(channel_id)
-                    game_ref.child('player_states').child(last_voter_id).child('role').set(Role.WEREWOLF.value)
-                    
-                    voter_name = game_data.get('players', {}).get(last_voter_id, {}).get('name', 'Someone')
-                    lynch_embed.description += f"\nAs the Alpha Wolf is dragged away, they let out a final, terrifying howl. **{voter_name}** feels a dark change within them... they have become a Werewolf!"
-
-                    # DM the newly converted player
-                    new_wolf_member = bot.get_guild(game_data['guild_id']).get_member(int(last_voter_id))
-                    if new_wolf_member:
-                        try:
-                            await new_wolf_member.send("🐺 The Alpha Wolf's curse has fallen upon you. You are now a Werewolf! Serve the pack.")
-                        except discord.Forbidden:
-                            pass
-
-        lynch_embed = discord.Embed(title="⚖️ The Verdict is In! ⚖️", description=lynch_story, color=discord.Color.from_rgb(128, 128, 128))
-
-        if lynched_id:
-            # Refetch data to get the new role if conversion happened
-            game_data = get_game_data(channel_id)
-            if not game_data: break
-            
-            dead_ids, lover_story = await process_death(game_ref, lynched_id, game_data)
-            if lover_story:
-                lynch_embed.description += lover_story
-        
-        await channel.send(embed=lynch_embed)
-
-        if lynched_id:
-            # Refetch data after the death
-            new_game_data = get_game_data(channel_id)
-            if not new_game_data: break
-            if await check_win_condition(bot, channel_id, new_game_data):
-                break
-        
-        # --- Clear votes for next day ---
-        get_game_ref(channel_id).child('day_votes').delete()
+        await asyncio.sleep(ADOPT_INTERVAL)
+        try:
+            await _resume_orphaned_games(bot)
+        except Exception as e:
+            print(f"Could not look for orphaned games: {e}")
+
+async def _resume_orphaned_games(bot: commands.Bot):
+    store = get_store()
+    if not store:
+        return
+    channel_ids, leases = await asyncio.gather(store.get('games', shallow=True), store.get('leases'))
+    leases = leases or {}
+    pending = [
+        int(cid) for cid in channel_ids or {}
+        if int(cid) not in _game_loops and bot.get_channel(int(cid)) and lease_is_free(leases.get(cid))
+    ]
+    if not pending:
+        return
+
+    resumed = 0
+    for i in range(0, len(pending), RESUME_BATCH_SIZE):
+        states = await asyncio.gather(*(load_game_state(cid) for cid in pending[i:i + RESUME_BATCH_SIZE]))
+        for state in states:
+            if not state or state.get("phase") == GamePhase.WAITING.value:
+                continue # Lobbies have no loop to resume
+            if not bot.get_channel(state.channel_id):
+                continue # Not a channel this bot can see
+            launch_game_loop(bot, state.channel_id, resume=True)
+            resumed += 1
+        await asyncio.sleep(RESUME_BATCH_DELAY)
+    print(f"Resumed {resumed} game(s).")
+
+
+def _enter_step(changes: ChangeSet, step: str, timeout: float = None):
+    """Stages the loop's position: the step to (re)run and, if it waits on players, its deadline."""
+    changes.set("game_state/step", step)
+    changes.set("game_state/step_deadline", time.time() + timeout if timeout is not None else None)
+
+def _time_left(state: GameState) -> float:
+    deadline = state.get("game_state/step_deadline")
+    return max(0.0, deadline - time.time()) if deadline else 0.0
+
+def _step_in_progress(state: GameState, resumed: bool) -> bool:
+    """True if we restarted while the saved step was already waiting on players."""
+    return resumed and state.get("game_state/step_deadline") is not None
+
+
+async def start_game_loop(bot: commands.Bot, channel_id: int, resume: bool = False):
+    """The main game loop that transitions between night and day."""
+    # Exactly one process may run a game; if another one adopted it first, it is theirs
+    if not await acquire_lease(channel_id, on_lost=lambda: _abandon_game(channel_id)):
+        return
+    try:
+        if not resume:
+            await asyncio.sleep(5) # Give a moment for DMs to be sent
+
+        # The in-memory state is the source of truth from here on; it is only
+        # written back to Firebase (never re-read) at the end of each phase.
+        state = await load_game_state(channel_id)
+        if not state:
+            return
+
+        inbox = asyncio.create_task(drain_inbox(state)) if CLUSTERED else None
+        try:
+            step = state.get("game_state/step", "night")
+            while step and not state.ended:
+                with step_seconds.time(step=step):
+                    step = await GAME_STEPS[step](bot, state, resume)
+                resume = False
+        finally:
+            if inbox:
+                inbox.cancel()
+    finally:
+        await release_lease(channel_id)
+
+def _collect_game_metrics():
+    active_games.set(sum(1 for task in _game_loops.values() if not task.done()))
+    players_by_phase.clear()
+    counts = {}
+    for channel_id in _game_loops:
+        state = cached_game_state(channel_id)
+        if state is not None:
+            phase = state.get("phase")
+            counts[phase] = counts.get(phase, 0) + len(state.index.alive)
+    for phase, count in counts.items():
+        players_by_phase.set(count, phase=phase)
+
+add_collector(_collect_game_metrics)
+
+def _abandon_game(channel_id: int):
+    """Stops running a game another process has taken over. Its copy of the game is the one that counts now."""
+    task = _game_loops.get(channel_id)
+    if task:
+        task.cancel()
+    forget_game_state(channel_id)
+
+async def end_game(state: GameState, outcome: str):
+    """Ends a won game: counts it towards its players' stats, then discards it."""
+    try:
+        await record_game_result(state, outcome)
+    except Exception as e:
+        print(f"Could not record the result of game {state.channel_id}: {e}")
+    await discard_game_state(state.channel_id, outcome)
+
+
+async def _night_step(bot: commands.Bot, state: GameState, resumed: bool):
+    from .roles import send_early_night_prompts # Imported here to avoid a circular import with roles.py
+    if not _step_in_progress(state, resumed):
+        prompted = await start_night_phase(bot, state)
+    elif _time_left(state) > 0:
+        # Prompt whoever missed out before the restart; the others' buttons still work
+        prompted = await send_early_night_prompts(bot, state)
+    else:
+        prompted = []
 
-        if game_data.get("phase") == GamePhase.ENDED.value:
-            break
+    # The night ends as soon as everyone prompted has acted, or when the timer runs out
+    await wait_for_phase(state, _time_left(state), lambda: night_actions_done(state, prompted), watch="night_actions")
+    if state.ended: return None
 
+    # --- Handle First Night Lover DMs ---
+    if state.get("game_state/night_number") == 1 and state.get("lovers"):
+        await dm_lovers(bot, state.data)
+    return "witch"
+
+
+async def _witch_step(bot: commands.Bot, state: GameState, resumed: bool):
+    from .roles import prompt_witch # Imported here to avoid a circular import with roles.py
+    in_progress = _step_in_progress(state, resumed)
+    if in_progress and _time_left(state) <= 0:
+        return None if state.ended else "day" # The Witch's window closed while we were down; don't send a dead prompt
+    witch_id = await prompt_witch(bot, state) # A new function to prompt the witch
+    if witch_id:
+        if not in_progress:
+            changes = ChangeSet(state)
+            _enter_step(changes, "witch", phase_timeout(state, "witch"))
+            await state.commit(changes)
+        await wait_for_phase(state, _time_left(state), lambda: night_actions_done(state, [witch_id]), watch="night_actions")
+    return None if state.ended else "day"
+
+
+async def _day_step(bot: commands.Bot, state: GameState, resumed: bool):
+    await start_day_phase(bot, state)
+
+    # We check win condition after day announcement because of Hunter/Lover deaths
+    if await check_win_condition(bot, state):
+        return None
 
-async def start_night_phase(bot: commands.Bot, channel_id: int, game_data: dict):
-    """Initiates the night phase and sends action prompts to roles."""
-    channel = bot.get_channel(channel_id)
-    game_ref = get_game_ref(channel_id)
+    channel = bot.get_channel(state.channel_id)
+    await channel.send(f"You have {phase_timeout(state, 'discussion')} seconds to discuss and cast your votes using `/ww vote`!")
+    return "discussion"
 
-    # Clear out actions from the previous night
-    game_ref.child("night_actions").delete()
 
-    night_num = game_data.get("game_state", {}).get("night_number", 0) + 1
-    game_ref.child("game_state/night_number").set(night_num)
+TALLY_EDIT_INTERVAL = 5.0 # Min seconds between two edits of the live tally, to stay clear of rate limits
 
+def tally_embed(state: GameState) -> discord.Embed:
+    """The votes cast so far, most voted first."""
+    players_info = state.get("players", {})
+    votes = state.index.votes
     embed = discord.Embed(
-        title=f"🌙 Night {night_num} has fallen... 🌙",
-        description="The moon is high in the sky. If you have a night action, I've sent you a DM. Sweet dreams... or nightmares?",
-        color=discord.Color.dark_blue()
+        title="🗳️ The Village is Voting...",
+        description=f"{len(votes.votes)} of {len(state.index.alive)} villagers have cast their vote.",
+        color=discord.Color.from_rgb(128, 128, 128)
     )
-    embed.set_image(url="https://i.imgur.com/vHj3mGz.gif")
-    await channel.send(embed=embed)
+    lines = [
+        f"**{players_info.get(target_id, {}).get('name', 'Someone')}**: {count} vote{'s' if count != 1 else ''}"
+        for target_id, count in votes.tally()
+    ]
+    if lines:
+        add_chunked_field(embed, "Votes So Far", lines)
+    return embed
+
+class LiveTally:
+    """
+    A channel message showing the day's tally, kept current while votes come in.
+    However fast they arrive, the message is edited at most every TALLY_EDIT_INTERVAL seconds.
+    """
+    def __init__(self, state: GameState, message: discord.Message):
+        self.state = state
+        self.message = message
+        self._changed = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+        state.add_listener(self._on_write)
+
+    @classmethod
+    async def post(cls, channel, state: GameState) -> "LiveTally":
+        return cls(state, await channel.send(embed=tally_embed(state)))
+
+    def _on_write(self, path: str):
+        if path.startswith("day_votes") or path.endswith("/is_mayor_revealed"):
+            self._changed.set()
+
+    async def _run(self):
+        while True:
+            await self._changed.wait()
+            await self._refresh()
+            await asyncio.sleep(TALLY_EDIT_INTERVAL) # Votes arriving meanwhile go in the next edit
+
+    async def _refresh(self):
+        self._changed.clear()
+        try:
+            await self.message.edit(embed=tally_embed(self.state))
+        except discord.HTTPException:
+            pass # The tally is a courtesy; the verdict doesn't depend on it
+
+    async def close(self):
+        """Stops following the votes, with a last edit if the message is behind."""
+        self.state.remove_listener(self._on_write)
+        self._task.cancel()
+        if self._changed.is_set() and not self.state.ended:
+            await self._refresh()
+
+
+async def _discussion_step(bot: commands.Bot, state: GameState, resumed: bool):
+    time_left = _time_left(state)
+    channel = bot.get_channel(state.channel_id)
+    if resumed and time_left > 0:
+        await channel.send(f"Sorry for dozing off! You have {max(1, int(time_left))} seconds left to cast your votes using `/ww vote`!")
+
+    tally = None
+    if state.get("settings/live_tally", True) and time_left > 0:
+        tally = await LiveTally.post(channel, state)
+    try:
+        # The day ends early once every living player has voted
+        await wait_for_phase(state, time_left, lambda: day_votes_done(state), watch="day_votes")
+    finally:
+        if tally:
+            await tally.close()
+    return None if state.ended else "lynch"
+
+
+async def _lynch_step(bot: commands.Bot, state: GameState, resumed: bool):
+    channel = bot.get_channel(state.channel_id)
+    game_data = state.data
+    players_info = game_data.get("players", {})
+    lynch_story, lynched_id = await process_lynch_votes(state)
+    lynch_embed = discord.Embed(title="⚖️ The Verdict is In! ⚖️", description=lynch_story, color=discord.Color.from_rgb(128, 128, 128))
+
+    # Everything the lynch changes is staged here and committed as one update
+    changes = ChangeSet(state)
+    if lynched_id:
+        events = resolve_lynch(changes, lynched_id)
+    else:
+        events = []
+        changes.delete('day_votes') # Clear votes for next day
+
+    for event in events:
+        if event.kind == "jester_win":
+            jester_name = players_info.get(event.player_id, {}).get("name", "The Jester")
+            jester_win_embed = discord.Embed(
+                title="😂 The Jester Wins! 😂",
+                description=f"The village has been played for fools! You have lynched **{jester_name}**, the Jester, which was their goal all along! The Jester wins the game, laughing all the way from the grave.",
+                color=ROLE_COLORS[Role.JESTER]
+            )
+            jester_win_embed.set_image(url="https://i.imgur.com/gB41pPE.gif") # Jester gif
+            jester_win_embed.set_footer(text="The game is over!")
+            await channel.send(embed=jester_win_embed)
+            await end_game(state, "jester")
+            return None # End the game loop
+
+        if event.kind == "executioner_win":
+            exe_name = players_info.get(event.executioner_id, {}).get("name", "The Executioner")
+            target_name = players_info.get(event.target_id, {}).get("name", "their target")
+            exe_win_embed = discord.Embed(
+                title="🔪 The Executioner Wins! 🔪",
+                description=f"The village has been manipulated! **{exe_name}** has successfully convinced you to lynch their target, **{target_name}**. The Executioner's personal vendetta is complete, and they win the game!",
+                color=ROLE_COLORS[Role.EXECUTIONER]
+            )
+            exe_win_embed.set_image(url="https://i.imgur.com/kSdv2a2.gif") # Executioner gif
+            exe_win_embed.set_footer(text="The game is over!")
+            await channel.send(embed=exe_win_embed)
+            await end_game(state, "executioner")
+            return None # End the game loop
+
+        if event.kind == "alpha_conversion":
+            voter_name = players_info.get(event.player_id, {}).get('name', 'Someone')
+            lynch_embed.description += f"\nAs the Alpha Wolf is dragged away, they let out a final, terrifying howl. **{voter_name}** feels a dark change within them... they have become a Werewolf!"
+
+            # DM the newly converted player
+            new_wolf_member = bot.get_guild(game_data['guild_id']).get_member(int(event.player_id))
+            if new_wolf_member:
+                try:
+                    await new_wolf_member.send("🐺 The Alpha Wolf's curse has fallen upon you. You are now a Werewolf! Serve the pack.")
+                except discord.Forbidden:
+                    pass
+
+        elif event.kind == "heartbreak":
+            lynch_embed.description += _heartbreak_story(players_info, event.player_id)
+
+    await channel.send(embed=lynch_embed)
+
+    _enter_step(changes, "night")
+    await state.commit(changes)
+
+    if lynched_id and await check_win_condition(bot, state):
+        return None
+    return "night"
+
+
+GAME_STEPS = {
+    "night": _night_step,
+    "witch": _witch_step,
+    "day": _day_step,
+    "discussion": _discussion_step,
+    "lynch": _lynch_step,
+}
+
+
+async def start_night_phase(bot: commands.Bot, state: GameState) -> list:
+    """Initiates the night phase and sends action prompts to roles. Returns the prompted player ids."""
+    channel = bot.get_channel(state.channel_id)
+
+    # Clear out actions from the previous night and advance the night counter in one update
+    changes = ChangeSet(state)
+    changes.delete("night_actions")
+    night_num = state.get("game_state/night_number", 0) + 1
+    changes.set("game_state/night_number", night_num)
+    changes.set("phase", GamePhase.NIGHT.value)
+
+    night_timeout = phase_timeout(state, "night")
+    if night_num == 1 and state.index.with_role(Role.CUPID.value, alive=True):
+        night_timeout = max(night_timeout, phase_timeout(state, "cupid")) # Wait for cupid to choose
+    _enter_step(changes, "night", night_timeout)
+    await state.commit(changes)
+
+    await channel.send(embed=night_banner(night_num))
 
     # This will now only send prompts for non-witch roles
-    await send_early_night_prompts(bot, game_data)
+    from .roles import send_early_night_prompts # Imported here to avoid a circular import with roles.py
+    return await send_early_night_prompts(bot, state)
 
 
-async def start_day_phase(bot: commands.Bot, channel_id: int, game_data: dict):
+async def start_day_phase(bot: commands.Bot, state: GameState):
     """Initiates the day phase, processes night actions, and announces events."""
-    channel = bot.get_channel(channel_id)
-    game_ref = get_game_ref(channel_id)
-    night_num = game_data.get("game_state", {}).get("night_number", 0)
+    channel = bot.get_channel(state.channel_id)
+    night_num = state.get("game_state/night_number", 0)
     
-    # This is the new key part: processing the actions!
-    story, deaths = await process_night_actions(bot, game_data)
-
-    # Update the database for any players who died
-    if deaths:
-        for death in deaths:
-            game_ref.child('player_states').child(death['id']).child('is_alive').set(False)
+    # This is the new key part: processing the actions! Every death, potion and douse
+    # is staged and lands in a single multi-path update together with the phase change.
+    changes = ChangeSet(state)
+    story, deaths = await process_night_actions(bot, changes)
+    changes.set("phase", GamePhase.DAY.value)
+    changes.delete("night_actions") # Resolved; no need to carry them through the day
+    _enter_step(changes, "discussion", phase_timeout(state, "discussion"))
+    await state.commit(changes)
 
     embed = discord.Embed(
         title=f"☀️ Day {night_num} begins! ☀️",
@@ -359,66 +507,35 @@ async def start_day_phase(bot: commands.Bot, channel_id: int, game_data: dict):
     embed.set_image(url="https://i.imgur.com/w9emP2g.gif")
     
     # Add a list of who is still alive
-    player_states = game_data.get("player_states", {})
-    all_players = game_data.get("players", {})
-    alive_player_mentions = [
-        all_players[pid]['mention'] for pid, state in player_states.items() 
-        if state['is_alive'] and pid not in [d['id'] for d in deaths]
-    ]
+    all_players = state.get("players", {})
+    alive_player_mentions = [all_players[pid]['mention'] for pid in state.index.alive]
     
     if alive_player_mentions:
-        embed.add_field(name="Remaining Players", value="\n".join(alive_player_mentions), inline=False)
+        add_chunked_field(embed, "Remaining Players", alive_player_mentions)
     else:
         embed.add_field(name="Remaining Players", value="No one is left...", inline=False)
 
     await channel.send(embed=embed)
 
 
-async def check_win_condition(bot: commands.Bot, channel_id: int, game_data: dict) -> bool:
+# How each winner returned by engine.find_winner is announced: (name, description, color)
+WIN_ANNOUNCEMENTS = {
+    "lovers": ("💘 The Lovers", "Against all odds, the two lovers are the last ones standing. A tragic but beautiful victory!", discord.Color.from_rgb(255, 182, 193)), # Pink!
+    "arsonist": ("🔥 The Arsonist", "The village is reduced to ash. The Arsonist stands alone, watching the world burn. A solitary, fiery victory.", ROLE_COLORS[Role.ARSONIST]),
+    "village": ("💖 The Village", "All werewolves have been eliminated! The village is safe once more, thanks to your efforts!", discord.Color.from_rgb(137, 207, 240)), # Villager Blue
+    "werewolves": ("🐺 The Werewolves", "The werewolves have taken over the village! Darkness falls, and the howling begins...", discord.Color.from_rgb(255, 87, 87)), # Werewolf Red
+}
+
+async def check_win_condition(bot: commands.Bot, state: GameState) -> bool:
     """Checks if a win condition has been met and ends the game if so."""
+    game_data = state.data
     player_states = game_data.get("player_states", {})
     all_players_info = game_data.get("players", {})
-    
-    alive_werewolves = []
-    alive_villagers = [] # Includes all non-werewolf roles
-    alive_players = []
-
-    for pid, state in player_states.items():
-        if state.get("is_alive"):
-            alive_players.append(pid)
-            role_val = state.get("role")
-            # Alpha Wolf is part of the werewolf faction
-            if role_val in [Role.WEREWOLF.value, Role.ALPHA_WOLF.value, Role.SORCERER.value]:
-                alive_werewolves.append(pid)
-            else:
-                alive_villagers.append(pid)
-
-    winner = None
-    win_description = ""
-    win_color = discord.Color.gold()
-    lovers = game_data.get("lovers", {})
-    
-    # --- Lovers Win Condition ---
-    if len(alive_players) == 2 and alive_players[0] in lovers and lovers[alive_players[0]] == alive_players[1]:
-        winner = "💘 The Lovers"
-        win_description = "Against all odds, the two lovers are the last ones standing. A tragic but beautiful victory!"
-        win_color = discord.Color.from_rgb(255, 182, 193) # Pink!
-    # --- Arsonist Win Condition ---
-    elif len(alive_players) == 1 and player_states[alive_players[0]]["role"] == Role.ARSONIST.value:
-        winner = "🔥 The Arsonist"
-        win_description = "The village is reduced to ash. The Arsonist stands alone, watching the world burn. A solitary, fiery victory."
-        win_color = ROLE_COLORS[Role.ARSONIST]
-    elif len(alive_werewolves) == 0:
-        winner = "💖 The Village"
-        win_description = "All werewolves have been eliminated! The village is safe once more, thanks to your efforts!"
-        win_color = discord.Color.from_rgb(137, 207, 240) # Villager Blue
-    elif len(alive_werewolves) >= len(alive_villagers):
-        winner = "🐺 The Werewolves"
-        win_description = "The werewolves have taken over the village! Darkness falls, and the howling begins..."
-        win_color = discord.Color.from_rgb(255, 87, 87) # Werewolf Red
-    
-    if winner:
-        channel = bot.get_channel(channel_id)
+
+    outcome = find_winner(state)
+    if outcome:
+        winner, win_description, win_color = WIN_ANNOUNCEMENTS[outcome]
+        channel = bot.get_channel(state.channel_id)
         embed = discord.Embed(
             title=f"🎉 Game Over! {winner} Won! 🎉",
             description=win_description,
@@ -426,19 +543,19 @@ async def check_win_condition(bot: commands.Bot, channel_id: int, game_data: dic
         )
         
         # Reveal all roles at the end
-        roles_reveal_text = ""
+        roles_reveal_lines = []
         for pid, pdata in all_players_info.items():
             role = player_states.get(pid, {}).get("role", "Unknown")
             status = "💀" if not player_states.get(pid, {}).get("is_alive") else "😊"
-            roles_reveal_text += f"{status} {pdata['mention']} was a **{role}**\n"
+            roles_reveal_lines.append(f"{status} {pdata['mention']} was a **{role}**")
         
-        embed.add_field(name="Final Roles", value=roles_reveal_text, inline=False)
+        add_chunked_field(embed, "Final Roles", roles_reveal_lines)
         embed.set_footer(text="Thank you for playing, my dear! I hope you had fun!")
         
         await channel.send(embed=embed)
         
         # Clean up the game from the database
-        get_game_ref(channel_id).delete()
+        await end_game(state, outcome)
         return True
 
     return False
@@ -498,222 +615,71 @@ async def dm_lovers(bot: commands.Bot, game_data: dict):
         await p2_member.send(embed=embed)
 
 
-async def process_death(game_ref, player_id: str, game_data: dict):
-    """
-    Processes a single player death, updates DB, and checks for lover chain-reactions.
-    Returns a list of all players who died (original + lover) and a potential story part for the lover's death.
-    """
-    game_ref.child('player_states').child(player_id).child('is_alive').set(False)
-    
-    all_deaths = [player_id]
-    lover_death_story = ""
-
-    lovers = game_data.get("lovers", {})
-    if player_id in lovers:
-        lover_id = lovers[player_id]
-        lover_state = game_data.get("player_states", {}).get(lover_id, {})
-        if lover_state.get("is_alive"):
-            game_ref.child('player_states').child(lover_id).child('is_alive').set(False)
-            all_deaths.append(lover_id)
-            lover_name = game_data["players"][lover_id]["name"]
-            lover_death_story = f"\nUpon seeing their beloved's fate, **{lover_name}** also died of a broken heart! 💔"
-
-    return all_deaths, lover_death_story
-
-
-async def process_night_actions(bot: commands.Bot, game_data: dict):
-    """Processes all actions from the night and returns a story and list of dead players."""
-    game_ref = get_game_ref(game_data['channel_id'])
-    night_actions = game_data.get('night_actions', {})
-    player_states = game_data.get('player_states', {})
+def _heartbreak_story(players_info: dict, lover_id: str) -> str:
+    lover_name = players_info.get(lover_id, {}).get("name")
+    return f"\nUpon seeing their beloved's fate, **{lover_name}** also died of a broken heart! 💔"
+
+
+async def process_night_actions(bot: commands.Bot, changes: ChangeSet):
+    """Stages all actions from the night into `changes` and returns a story and list of dead players."""
+    game_data = changes.state.data
     players_info = game_data.get('players', {})
+    events, deaths = resolve_night(changes)
 
-    werewolf_target_id = None
-    doctor_save_id = None
-    bodyguard_protector_id = None
-    bodyguard_protected_id = None
-    witch_saved = False
-    witch_kill_id = None
-    deaths = []
-    story_parts = []
-    visits = {} # Target_id -> [visitor_id_1, visitor_id_2]
+    def name(pid):
+        return players_info[pid]['name']
 
-    # --- Step 1: Compile all visits and immediate actions ---
-    # We need to know who is visiting who before resolving anything.
-    
-    # Werewolf visit
-    wolf_votes = night_actions.get('werewolf_vote', {})
-    if wolf_votes:
-        vote_counts = Counter(wolf_votes.values())
-        max_votes = vote_counts.most_common(1)[0][1]
-        tied_targets = [p_id for p_id, count in vote_counts.items() if count == max_votes]
-        werewolf_target_id = random.choice(tied_targets)
-        # All wolves are considered visitors to their target
-        visits.setdefault(werewolf_target_id, []).extend(list(wolf_votes.keys()))
-
-    # Doctor visit
-    doctor_actions = night_actions.get('doctor_save', {})
-    if doctor_actions:
-        doctor_id = list(doctor_actions.keys())[0]
-        doctor_save_id = list(doctor_actions.values())[0]
-        visits.setdefault(doctor_save_id, []).append(doctor_id)
-
-    # Bodyguard visit
-    bodyguard_actions = night_actions.get('bodyguard_protect', {})
-    if bodyguard_actions:
-        bodyguard_protector_id = list(bodyguard_actions.keys())[0]
-        bodyguard_protected_id = list(bodyguard_actions.values())[0]
-        visits.setdefault(bodyguard_protected_id, []).append(bodyguard_protector_id)
-        
-    # Seer visit
-    seer_picks = night_actions.get('seer_pick', {})
-    for seer_id, target_id in seer_picks.items():
-        visits.setdefault(target_id, []).append(seer_id)
-
-    # Witch kill is also a visit
-    witch_kill_action = night_actions.get('witch_kill')
-    if witch_kill_action:
-        witch_id = list(witch_kill_action.keys())[0]
-        witch_kill_id = list(witch_kill_action.values())[0]
-        visits.setdefault(witch_kill_id, []).append(witch_id)
-
-    # Check for witch save
-    if night_actions.get('witch_save') and werewolf_target_id:
-        witch_saved = True
-
-
-    # --- Step 2: Check for Veteran on Alert ---
-    # This is high priority. If veteran shoots you, you're dead.
-    alerting_vet_id = night_actions.get('veteran_alert')
-    if alerting_vet_id:
-        story_parts.append(f"**A paranoid Veteran, {players_info[alerting_vet_id]['name']}, was on alert tonight!**")
-        visitors = visits.get(alerting_vet_id, [])
-        if not visitors:
-            story_parts.append("They nervously watched the door all night, but no one came.")
-        else:
-            for visitor_id in visitors:
-                if visitor_id not in deaths:
-                    story_parts.append(f"**{players_info[visitor_id]['name']}** was shot by the Veteran!")
-                    newly_dead, lover_story = await process_death(game_ref, visitor_id, game_data)
-                    deaths.extend(newly_dead)
-                    if lover_story: story_parts.append(lover_story)
-        
-        # If a werewolf visited the vet, their main attack is cancelled
-        if werewolf_target_id == alerting_vet_id:
-            werewolf_target_id = None # Attack is nullified
-
-
-    # --- Step 3: Resolve all other actions ---
-    # Werewolf attack resolution
-    if werewolf_target_id:
-        target_name = players_info[werewolf_target_id]['name']
-        if witch_saved:
-            story_parts.append(f"The werewolves targeted **{target_name}**, but a powerful witch brewed a potion of life, saving them from the brink!")
-        elif werewolf_target_id == doctor_save_id:
-            story_parts.append(f"A terrible howl was heard near **{target_name}**'s house, but a skilled doctor intervened, miraculously saving them!")
-        elif werewolf_target_id == bodyguard_protected_id:
-            protector_name = players_info[bodyguard_protector_id]['name']
-            story_parts.append(f"The werewolves descended upon **{target_name}**, but a brave bodyguard, **{protector_name}**, sacrificed themselves to save them! A true hero has fallen.")
-            newly_dead, lover_story = await process_death(game_ref, bodyguard_protector_id, game_data)
-            deaths.extend(newly_dead)
-            if lover_story: story_parts.append(lover_story)
-        else:
-            story_parts.append(f"A blood-curdling scream pierced the night. The village awakens to find that **{target_name}** has been tragically killed by werewolves.")
-            newly_dead, lover_story = await process_death(game_ref, werewolf_target_id, game_data)
-            deaths.extend(newly_dead)
-            if lover_story: story_parts.append(lover_story)
-
-    # 5. Resolve Witch's kill potion
-    if witch_kill_id and witch_kill_id not in deaths:
-        killed_name = players_info[witch_kill_id]['name']
-        # Mark potion as used
-        game_ref.child('game_state/witch_potions/kill').set(False)
-        if witch_kill_id == doctor_save_id:
-            story_parts.append(f"The witch threw a deadly potion at **{killed_name}**, but the doctor was one step ahead, providing a miraculous antidote just in time!")
-        else:
-            story_parts.append(f"In the dead of night, the witch brewed a deadly concoction, and poor **{killed_name}** was found lifeless at dawn.")
-            newly_dead, lover_story = await process_death(game_ref, witch_kill_id, game_data)
-            deaths.extend(newly_dead)
-            if lover_story: story_parts.append(lover_story)
-
-    # 6. Douse targets
-    arsonist_douse_action = night_actions.get('arsonist_douse')
-    if arsonist_douse_action:
-        doused_id = list(arsonist_douse_action.values())[0]
-        game_ref.child('player_states').child(doused_id).child('is_doused').set(True)
-
-    # 7. Ignite! This happens last and is the grand finale.
-    if night_actions.get('arsonist_ignite'):
-        doused_players = []
-        player_states = get_game_data(channel_id).get('player_states', {}) # Refetch to include newly doused
-        for pid, state in player_states.items():
-            if state.get('is_doused') and state.get('is_alive') and pid not in deaths:
-                doused_players.append(pid)
-        
-        if doused_players:
+    story_parts = []
+    for event in events:
+        kind = event.kind
+        if kind == "veteran_alert":
+            story_parts.append(f"**A paranoid Veteran, {name(event.veteran_id)}, was on alert tonight!**")
+            if not event.visited:
+                story_parts.append("They nervously watched the door all night, but no one came.")
+        elif kind == "veteran_shot":
+            story_parts.append(f"**{name(event.player_id)}** was shot by the Veteran!")
+        elif kind == "heartbreak":
+            story_parts.append(_heartbreak_story(players_info, event.player_id))
+        elif kind == "wolf_attack_saved" and event.saved_by == "witch":
+            story_parts.append(f"The werewolves targeted **{name(event.target_id)}**, but a powerful witch brewed a potion of life, saving them from the brink!")
+        elif kind == "wolf_attack_saved":
+            story_parts.append(f"A terrible howl was heard near **{name(event.target_id)}**'s house, but a skilled doctor intervened, miraculously saving them!")
+        elif kind == "bodyguard_sacrifice":
+            story_parts.append(f"The werewolves descended upon **{name(event.target_id)}**, but a brave bodyguard, **{name(event.bodyguard_id)}**, sacrificed themselves to save them! A true hero has fallen.")
+        elif kind == "wolf_kill":
+            story_parts.append(f"A blood-curdling scream pierced the night. The village awakens to find that **{name(event.target_id)}** has been tragically killed by werewolves.")
+        elif kind == "witch_kill_saved":
+            story_parts.append(f"The witch threw a deadly potion at **{name(event.target_id)}**, but the doctor was one step ahead, providing a miraculous antidote just in time!")
+        elif kind == "witch_kill":
+            story_parts.append(f"In the dead of night, the witch brewed a deadly concoction, and poor **{name(event.target_id)}** was found lifeless at dawn.")
+        elif kind == "ignite":
             story_parts.append("\n**A brilliant inferno engulfs the village! The Arsonist has revealed their fiery plot!**")
-            for pid in doused_players:
-                story_parts.append(f"**{players_info[pid]['name']}** was consumed by the flames!")
-                newly_dead, lover_story = await process_death(game_ref, pid, game_data)
-                deaths.extend(newly_dead)
-                if lover_story: story_parts.append(lover_story)
-
-    # 8. Process Seer visions (and send DMs)
-    seer_picks = night_actions.get('seer_pick', {})
-    for seer_id, target_id in seer_picks.items():
-        # A dead seer gets no vision
-        if seer_id in deaths: continue
-        target_state = player_states.get(target_id, {})
-        target_role = target_state.get('role', 'Unknown')
-        target_name = players_info.get(target_id, {}).get('name', 'An unknown player')
-        asyncio.create_task(_dm_seer_vision(bot, seer_id, target_name, target_role, game_data))
-
-    # 9. Process Sorcerer scrying
-    sorcerer_picks = night_actions.get('sorcerer_pick', {})
-    for sorcerer_id, target_id in sorcerer_picks.items():
-        if sorcerer_id in deaths: continue
-        target_role = player_states.get(target_id, {}).get('role')
-        is_seer = (target_role == Role.SEER.value)
-        target_name = players_info.get(target_id, {}).get('name', 'An unknown player')
-        asyncio.create_task(_dm_sorcerer_vision(bot, sorcerer_id, target_name, is_seer, game_data))
-
-    # 10. Finalize story
+        elif kind == "burned":
+            story_parts.append(f"**{name(event.player_id)}** was consumed by the flames!")
+        elif kind == "seer_vision":
+            target_name = players_info.get(event.target_id, {}).get('name', 'An unknown player')
+            asyncio.create_task(_dm_seer_vision(bot, event.seer_id, target_name, event.role, game_data))
+        elif kind == "sorcerer_vision":
+            target_name = players_info.get(event.target_id, {}).get('name', 'An unknown player')
+            asyncio.create_task(_dm_sorcerer_vision(bot, event.sorcerer_id, target_name, event.is_seer, game_data))
+
     story = "\n".join(story_parts) if story_parts else "A new day dawns on the village... and to everyone's surprise, the night was peacefully quiet. No one died!"
-        
     return story, deaths
 
-async def process_lynch_votes(game_data: dict):
+async def process_lynch_votes(state: GameState):
     """Tallies day votes and determines who is lynched."""
-    day_votes = game_data.get('day_votes', {})
-    players_info = game_data.get('players', {})
-    player_states = game_data.get('player_states', {})
-    
-    if not day_votes:
-        return "The day ends quietly. The village couldn't decide on a verdict, and no one is lynched.", None
+    players_info = state.get('players', {})
+    outcome, targets = count_lynch_votes(state)
 
-    # Use a list to handle Mayor's double vote
-    vote_list = []
-    for voter_id, target_id in day_votes.items():
-        vote_list.append(target_id)
-        # If the voter is a revealed Mayor, add their vote again
-        if player_states.get(voter_id, {}).get('is_mayor_revealed'):
-            vote_list.append(target_id)
-
-    vote_counts = Counter(vote_list)
-    if not vote_counts: # handle case where vote_list might be empty
-        return "Despite the discussion, no votes were cast. The day ends in a tense silence.", None
+    if outcome == "no_votes":
+        return "The day ends quietly. The village couldn't decide on a verdict, and no one is lynched.", None
 
-    max_votes = vote_counts.most_common(1)[0][1]
-    
-    # Check for a tie
-    tied_targets = [p_id for p_id, count in vote_counts.items() if count == max_votes]
-    
-    if len(tied_targets) > 1:
-        tied_names = [players_info[p_id]['name'] for p_id in tied_targets]
+    if outcome == "tie":
+        tied_names = [players_info[p_id]['name'] for p_id in targets]
         return f"The vote is a tie between **{', '.join(tied_names)}**! The village is in chaos, and no one is lynched today.", None
-    
-    lynched_id = tied_targets[0]
+
+    lynched_id = targets[0]
     lynched_name = players_info[lynched_id]['name']
-    
+
     story = f"The villagers have spoken! With a heavy heart, they lead **{lynched_name}** to the gallows. They have been lynched."
-    return story, lynched_id
\ No newline at end of file
+    return story, lynched_id
@@ -0,0 +1,75 @@
+import asyncio
+import time
+import discord
+from .metrics import dm_sends, dm_seconds
+
+# Role reveals and night prompts go out to many players at once. Sending them one
+# after another means a 20-player game waits on 20+ sequential round-trips, and a
+# single slow DM eats into everyone's night timer. The dispatcher sends to all
+# recipients concurrently while keeping each recipient's own messages in order.
+#
+# discord.py's HTTP client already honours the X-RateLimit-* headers of every
+# route bucket (each DM channel is its own bucket), so we only bound how many
+# recipients are in flight and back off if a 429 still reaches us.
+
+DM_MAX_CONCURRENCY = 8 # Recipients being messaged at the same time
+DM_MAX_RETRIES = 2     # Extra attempts after a surfaced 429
+
+
+class DMFailure:
+    """A recipient we could not reach, and why."""
+    def __init__(self, member: discord.abc.User, error: Exception):
+        self.member = member
+        self.error = error
+
+    @property
+    def dms_closed(self) -> bool:
+        return isinstance(self.error, discord.Forbidden)
+
+
+class DMDispatcher:
+    """Fans DMs out concurrently and reports per-recipient failures instead of raising."""
+    def __init__(self, max_concurrency: int = DM_MAX_CONCURRENCY):
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def _send_one(self, member, message: dict):
+        started = time.perf_counter()
+        for attempt in range(DM_MAX_RETRIES + 1):
+            try:
+                sent = await member.send(**message)
+                dm_seconds.observe(time.perf_counter() - started)
+                dm_sends.inc(outcome="ok")
+                return sent
+            except discord.HTTPException as e:
+                if e.status != 429 or attempt == DM_MAX_RETRIES:
+                    dm_sends.inc(outcome="dms_closed" if isinstance(e, discord.Forbidden) else "rate_limited" if e.status == 429 else "error")
+                    raise
+                retry_after = float(e.response.headers.get("Retry-After", 1))
+                await asyncio.sleep(retry_after)
+
+    async def _send_to(self, member, messages: list):
+        async with self._semaphore:
+            # A recipient's messages are one bucket: send them in order, stop at the first failure
+            for message in messages:
+                try:
+                    await self._send_one(member, message)
+                except discord.HTTPException as e:
+                    return DMFailure(member, e)
+        return None
+
+    async def send(self, member, **message) -> bool:
+        """Sends a single DM, returning False instead of raising if it could not be delivered."""
+        return await self._send_to(member, [message]) is None
+
+    async def send_many(self, outbox: dict) -> list:
+        """
+        Sends `{member: [message_kwargs, ...]}` concurrently across members.
+        Returns a list of DMFailure for the recipients that could not be reached.
+        """
+        results = await asyncio.gather(*(
+            self._send_to(member, messages) for member, messages in outbox.items() if messages
+        ))
+        return [failure for failure in results if failure is not None]
+
+
+dispatcher = DMDispatcher()
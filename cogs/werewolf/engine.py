@@ -0,0 +1,599 @@
+import random
+from collections import Counter
+from enum import Enum
+
+# The rules of the game, with no Discord or Firebase in sight. Every function here
+# reads the game through anything with `get(path, default)` (a GameState or a
+# ChangeSet), stages its mutations with `set`/`delete`, and reports what happened as
+# a list of Events. core.py turns those events into embeds and DMs. Nothing here
+# awaits, and all randomness comes from the `rng` passed in, so a seeded game always
+# plays out the same way.
+
+class GamePhase(Enum):
+    WAITING = "WAITING"
+    NIGHT = "NIGHT"
+    DAY = "DAY"
+    VOTING = "VOTING"
+    ENDED = "ENDED"
+
+class Role(Enum):
+    WEREWOLF = "Werewolf"
+    VILLAGER = "Villager"
+    SEER = "Seer"
+    DOCTOR = "Doctor"
+    WITCH = "Witch"
+    HUNTER = "Hunter"
+    CUPID = "Cupid"
+    BODYGUARD = "Bodyguard"
+    JESTER = "Jester"
+    EXECUTIONER = "Executioner"
+    ARSONIST = "Arsonist"
+    MAYOR = "Mayor"
+    VETERAN = "Veteran"
+    ALPHA_WOLF = "Alpha Wolf"
+    SORCERER = "Sorcerer"
+
+# Alpha Wolf and Sorcerer side with the pack
+WEREWOLF_FACTION = (Role.WEREWOLF.value, Role.ALPHA_WOLF.value, Role.SORCERER.value)
+
+def faction_of(role: str) -> str:
+    return "werewolves" if role in WEREWOLF_FACTION else "village" # The village includes all non-werewolf roles
+
+
+class Event:
+    """Something that happened while resolving a step, e.g. Event("wolf_kill", target_id="123")."""
+    def __init__(self, kind: str, **details):
+        self.kind = kind
+        self.details = details
+
+    def __getattr__(self, name):
+        try:
+            return self.__dict__["details"][name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def __repr__(self):
+        return f"Event({self.kind!r}, {self.details!r})"
+
+
+# --- Indexes ---
+
+# Player state fields the index tracks; writes to any other field leave it alone
+INDEXED_FIELDS = ("role", "is_alive", "is_doused")
+
+class GameIndex:
+    """
+    Who is what in one game, kept up to date on every write rather than re-scanned
+    from player_states: role -> players, living players per faction, the doused and
+    the lovers. Win checks are counter comparisons and role lookups only touch the
+    players they are about. The "sets" are dicts, so iteration follows the order
+    players were indexed in and a seeded game always plays out the same way.
+    """
+    def __init__(self):
+        self.roles = {} # Role value -> {player_id: None}, dead or alive
+        self.alive = {} # {player_id: None}
+        self.alive_by_faction = Counter() # "werewolves" / "village" -> living players
+        self.doused = {} # {player_id: None}, dead or alive
+        self.lovers = {} # player_id -> lover_id, both ways
+        self.alive_version = 0 # Bumped whenever someone dies (or is revived), for caches of the living
+        self.votes = VoteLedger() # The day's votes and their live tally
+        self._entries = {} # player_id -> (role, is_alive, is_doused) as currently indexed
+
+    @classmethod
+    def build(cls, game) -> "GameIndex":
+        """Indexes a whole game read through `get` (a GameState, a ChangeSet or a plain dict)."""
+        index = cls()
+        for pid, pstate in (game.get("player_states") or {}).items():
+            index.set_player(pid, pstate.get("role"), pstate.get("is_alive"), pstate.get("is_doused"))
+        index.lovers = dict(game.get("lovers") or {})
+        index.votes = VoteLedger.build(game)
+        return index
+
+    def copy(self) -> "GameIndex":
+        index = GameIndex()
+        index.roles = {role: dict(pids) for role, pids in self.roles.items()}
+        index.alive = dict(self.alive)
+        index.alive_by_faction = Counter(self.alive_by_faction)
+        index.doused = dict(self.doused)
+        index.lovers = dict(self.lovers)
+        index.alive_version = self.alive_version
+        index.votes = self.votes.copy()
+        index._entries = dict(self._entries)
+        return index
+
+    def set_player(self, player_id: str, role: str, is_alive: bool, is_doused: bool):
+        is_alive, is_doused = bool(is_alive), bool(is_doused)
+        if is_alive != (player_id in self.alive):
+            self.alive_version += 1
+        self._unindex(player_id)
+        self._entries[player_id] = (role, is_alive, is_doused)
+        self.roles.setdefault(role, {})[player_id] = None
+        if is_alive:
+            self.alive[player_id] = None
+            self.alive_by_faction[faction_of(role)] += 1
+        if is_doused:
+            self.doused[player_id] = None
+
+    def remove_player(self, player_id: str):
+        if player_id in self.alive:
+            self.alive_version += 1
+        self._unindex(player_id)
+
+    def _unindex(self, player_id: str):
+        entry = self._entries.pop(player_id, None)
+        if entry is None:
+            return
+        role, is_alive, is_doused = entry
+        self.roles[role].pop(player_id, None)
+        if is_alive:
+            self.alive.pop(player_id, None)
+            self.alive_by_faction[faction_of(role)] -= 1
+        if is_doused:
+            self.doused.pop(player_id, None)
+
+    def on_write(self, game, path: str):
+        """Brings the index up to date after `path` was written in `game`."""
+        key, _, rest = path.partition('/')
+        if key == "player_states":
+            player_id, _, field = rest.partition('/')
+            if not player_id:
+                # The whole player_states was replaced (e.g. roles were just dealt)
+                for stale_id in list(self._entries):
+                    self.remove_player(stale_id)
+                for pid, pstate in (game.get("player_states") or {}).items():
+                    self.set_player(pid, pstate.get("role"), pstate.get("is_alive"), pstate.get("is_doused"))
+            elif not field or field.partition('/')[0] in INDEXED_FIELDS:
+                self._reindex_player(game, player_id)
+            if not player_id:
+                self.votes = VoteLedger.build(game)
+            elif not field or field == "is_mayor_revealed":
+                self.votes.reweigh(player_id, vote_weight(game, player_id))
+        elif key == "lovers":
+            self.lovers = dict(game.get("lovers") or {})
+        elif key == "day_votes":
+            voter_id = rest.partition('/')[0]
+            if not voter_id:
+                self.votes = VoteLedger.build(game) # All votes replaced, or cleared for the next day
+                return
+            vote = game.get(f"day_votes/{voter_id}")
+            if vote is None:
+                self.votes.retract(voter_id)
+            else:
+                self.votes.cast(voter_id, vote_target(vote), vote_weight(game, voter_id), vote_time(vote))
+
+    def _reindex_player(self, game, player_id: str):
+        prefix = f"player_states/{player_id}"
+        if game.get(prefix) is None:
+            self.remove_player(player_id)
+        else:
+            self.set_player(
+                player_id, game.get(f"{prefix}/role"), game.get(f"{prefix}/is_alive"), game.get(f"{prefix}/is_doused")
+            )
+
+    def with_role(self, role: str, alive: bool = False) -> list:
+        """Ids of the players holding `role` (a Role value), optionally only the living ones."""
+        pids = self.roles.get(role, {})
+        return [pid for pid in pids if pid in self.alive] if alive else list(pids)
+
+    def role_of(self, player_id: str):
+        entry = self._entries.get(player_id)
+        return entry[0] if entry else None
+
+
+class VoteLedger:
+    """
+    The day's votes, tallied as they come in: voter -> (target, weight, time), the
+    weighted count per target, and each target's voters in the order they last voted.
+    A vote, a change of mind or a Mayor reveal only touches the counts it affects, so
+    the live tally is always ready and the last voter for someone is one lookup.
+    """
+    def __init__(self):
+        self.votes = {} # voter_id -> (target_id, weight, time cast or None)
+        self.counts = Counter() # target_id -> weighted votes, without zeros
+        self.voters = {} # target_id -> {voter_id: None}, in the order they voted
+
+    @classmethod
+    def build(cls, game) -> "VoteLedger":
+        ledger = cls()
+        player_states = game.get("player_states") or {}
+        votes = list((game.get("day_votes") or {}).items())
+        # Firebase hands the votes back sorted by voter; their times put them back in order
+        votes.sort(key=lambda vote: vote_time(vote[1]) or 0)
+        for voter_id, vote in votes:
+            # A revealed Mayor's vote counts twice
+            weight = 2 if (player_states.get(voter_id) or {}).get("is_mayor_revealed") else 1
+            ledger.cast(voter_id, vote_target(vote), weight, vote_time(vote))
+        return ledger
+
+    def copy(self) -> "VoteLedger":
+        ledger = VoteLedger()
+        ledger.votes = dict(self.votes)
+        ledger.counts = Counter(self.counts)
+        ledger.voters = {target: dict(voters) for target, voters in self.voters.items()}
+        return ledger
+
+    def cast(self, voter_id: str, target_id: str, weight: int = 1, at: float = None):
+        """Records (or changes) a vote. Votes must be cast in the order they were made."""
+        self.retract(voter_id)
+        self.votes[voter_id] = (target_id, weight, at)
+        self.counts[target_id] += weight
+        self.voters.setdefault(target_id, {})[voter_id] = None
+
+    def retract(self, voter_id: str):
+        vote = self.votes.pop(voter_id, None)
+        if vote is None:
+            return
+        target_id, weight, _ = vote
+        self.counts[target_id] -= weight
+        if self.counts[target_id] <= 0:
+            del self.counts[target_id]
+        del self.voters[target_id][voter_id]
+
+    def reweigh(self, voter_id: str, weight: int):
+        """Changes how much a vote already cast counts (a Mayor revealing after voting)."""
+        vote = self.votes.get(voter_id)
+        if vote is not None and vote[1] != weight:
+            target_id, old_weight, at = vote
+            self.votes[voter_id] = (target_id, weight, at)
+            self.counts[target_id] += weight - old_weight
+
+    def clear(self):
+        self.votes.clear()
+        self.counts.clear()
+        self.voters.clear()
+
+    def tally(self) -> list:
+        """(target_id, votes) pairs, most votes first."""
+        return self.counts.most_common()
+
+    def last_voter_for(self, target_id: str):
+        """Whoever voted for `target_id` most recently, or None."""
+        voters = self.voters.get(target_id)
+        return next(reversed(voters), None) if voters else None
+
+
+def vote_target(vote):
+    """The target of a `day_votes` entry: {"target": id, "at": time}, or just the id in older games."""
+    return vote.get("target") if isinstance(vote, dict) else vote
+
+def vote_time(vote):
+    return vote.get("at") if isinstance(vote, dict) else None
+
+def vote_weight(game, voter_id: str) -> int:
+    # A revealed Mayor's vote counts twice
+    return 2 if game.get(f"player_states/{voter_id}/is_mayor_revealed") else 1
+
+def cast_vote(changes, voter_id: str, target_id: str, at: float):
+    """Stages a day vote (replacing the voter's previous one), stamped with when it was cast."""
+    changes.set(f"day_votes/{voter_id}", {"target": target_id, "at": at})
+
+
+def index_of(game) -> GameIndex:
+    """The game's index: a GameState or ChangeSet keeps one up to date, a plain dict is indexed on the spot."""
+    index = getattr(game, "index", None)
+    return index if isinstance(index, GameIndex) else GameIndex.build(game)
+
+
+# --- Setup ---
+
+def role_deck(num_players: int, enabled_roles: list, rng=random, num_werewolves: int = None) -> list:
+    """
+    The roles dealt to `num_players` players, in the order they are handed out.
+    `num_werewolves` defaults to a quarter of the players (see balance.py for better counts).
+    """
+    # Dynamically select special roles from the enabled list
+    special_roles = [r for r in enabled_roles if r not in [Role.VILLAGER, Role.WEREWOLF]]
+    rng.shuffle(special_roles)
+
+    if num_werewolves is None:
+        num_werewolves = max(1, num_players // 4)
+
+    roles_to_assign = []
+
+    # Assign Sorcerer first if enabled
+    if Role.SORCERER in enabled_roles:
+        roles_to_assign.append(Role.SORCERER)
+        # Ensure there's at least one werewolf for the Sorcerer to side with
+        if num_werewolves == 0:
+            num_werewolves = 1
+
+    roles_to_assign.extend([Role.WEREWOLF] * num_werewolves)
+
+    # Designate one werewolf as the Alpha Wolf if there's more than one
+    if num_werewolves > 1 and Role.ALPHA_WOLF in enabled_roles:
+        roles_to_assign[0] = Role.ALPHA_WOLF
+
+    # Fill with special roles, up to the number of available slots
+    slots_for_specials = num_players - len(roles_to_assign)
+
+    for i in range(min(len(special_roles), slots_for_specials)):
+        roles_to_assign.append(special_roles.pop())
+
+    # Fill the rest with Villagers
+    roles_to_assign += [Role.VILLAGER] * (num_players - len(roles_to_assign))
+    rng.shuffle(roles_to_assign)
+    return roles_to_assign
+
+def deal_roles(changes, players: dict, rng=random, num_werewolves: int = None, enabled_roles: list = None) -> dict:
+    """
+    Stages roles, initial player states and the night-0 game state. Returns player_id -> role.
+    `enabled_roles` defaults to the game's settings.
+    """
+    player_ids = list(players.keys())
+    rng.shuffle(player_ids)
+    num_players = len(player_ids)
+
+    # This is the key change: read roles from settings!
+    if enabled_roles is None:
+        enabled_roles_str = changes.get("settings/roles", [r.value for r in Role])
+        enabled_roles = [Role(rs) for rs in enabled_roles_str]
+    roles_to_assign = role_deck(num_players, enabled_roles, rng, num_werewolves)
+
+    player_roles = {player_id: role.value for player_id, role in zip(player_ids, roles_to_assign)}
+
+    # Set initial player state
+    player_states = {}
+    for p_id in player_ids:
+        player_states[p_id] = {
+            "role": player_roles[p_id],
+            "is_alive": True,
+            "is_protected": False,
+            "is_healed_by_witch": False,
+            "lover_id": None,
+            "is_doused": False,
+            "is_mayor_revealed": False,
+            "veteran_alerts": 1, # Starting alerts
+            "is_on_alert": False,
+        }
+
+    # Assign Executioner's target
+    executioner_id = None
+    for p_id, role_str in player_roles.items():
+        if role_str == Role.EXECUTIONER.value:
+            executioner_id = p_id
+            break
+
+    if executioner_id:
+        potential_targets = [
+            p_id for p_id, role_str in player_roles.items()
+            if role_str != Role.EXECUTIONER.value and role_str != Role.WEREWOLF.value
+        ]
+        if potential_targets:
+            target_id = rng.choice(potential_targets)
+            player_states[executioner_id]['target_id'] = target_id
+
+    changes.set("roles", player_roles)
+    changes.set("player_states", player_states)
+    changes.set("game_state", {
+        "night_number": 0,
+        "phase": GamePhase.NIGHT.value,
+        "witch_potions": { "kill": True, "save": True },
+        "veteran_alerts_used": False, # To track if the single alert is used
+    })
+    changes.set("phase", GamePhase.NIGHT.value)
+    return player_roles
+
+
+# --- Deaths ---
+
+def kill(changes, player_id: str, events: list) -> list:
+    """
+    Stages a single death and its lover chain-reaction (reported as a "heartbreak" event).
+    Returns every player who died: the original and, possibly, their lover.
+    """
+    changes.set(f'player_states/{player_id}/is_alive', False)
+    all_deaths = [player_id]
+
+    lovers = changes.get("lovers", {})
+    if player_id in lovers:
+        lover_id = lovers[player_id]
+        if changes.get(f"player_states/{lover_id}/is_alive"):
+            changes.set(f'player_states/{lover_id}/is_alive', False)
+            all_deaths.append(lover_id)
+            events.append(Event("heartbreak", player_id=lover_id))
+
+    return all_deaths
+
+
+# --- Night ---
+
+def resolve_night(changes, rng=random):
+    """Stages every action from the night. Returns the events, in story order, and the dead."""
+    night_actions = changes.get('night_actions', {})
+    player_states = changes.get('player_states', {})
+
+    werewolf_target_id = None
+    doctor_save_id = None
+    bodyguard_protector_id = None
+    bodyguard_protected_id = None
+    witch_saved = False
+    witch_kill_id = None
+    deaths = []
+    events = []
+    visits = {} # Target_id -> [visitor_id_1, visitor_id_2]
+
+    # --- Step 1: Compile all visits and immediate actions ---
+    # We need to know who is visiting who before resolving anything.
+
+    # Werewolf visit
+    wolf_votes = night_actions.get('werewolf_vote', {})
+    if wolf_votes:
+        vote_counts = Counter(wolf_votes.values())
+        max_votes = vote_counts.most_common(1)[0][1]
+        tied_targets = [p_id for p_id, count in vote_counts.items() if count == max_votes]
+        werewolf_target_id = rng.choice(tied_targets)
+        # All wolves are considered visitors to their target
+        visits.setdefault(werewolf_target_id, []).extend(list(wolf_votes.keys()))
+
+    # Doctor visit
+    doctor_actions = night_actions.get('doctor_save', {})
+    if doctor_actions:
+        doctor_id = list(doctor_actions.keys())[0]
+        doctor_save_id = list(doctor_actions.values())[0]
+        visits.setdefault(doctor_save_id, []).append(doctor_id)
+
+    # Bodyguard visit
+    bodyguard_actions = night_actions.get('bodyguard_protect', {})
+    if bodyguard_actions:
+        bodyguard_protector_id = list(bodyguard_actions.keys())[0]
+        bodyguard_protected_id = list(bodyguard_actions.values())[0]
+        visits.setdefault(bodyguard_protected_id, []).append(bodyguard_protector_id)
+
+    # Seer visit
+    seer_picks = night_actions.get('seer_pick', {})
+    for seer_id, target_id in seer_picks.items():
+        visits.setdefault(target_id, []).append(seer_id)
+
+    # Witch kill is also a visit
+    witch_kill_action = night_actions.get('witch_kill')
+    if witch_kill_action:
+        witch_id = list(witch_kill_action.keys())[0]
+        witch_kill_id = list(witch_kill_action.values())[0]
+        visits.setdefault(witch_kill_id, []).append(witch_id)
+
+    # Check for witch save
+    if night_actions.get('witch_save') and werewolf_target_id:
+        witch_saved = True
+
+
+    # --- Step 2: Check for Veteran on Alert ---
+    # This is high priority. If veteran shoots you, you're dead.
+    alerting_vet_id = night_actions.get('veteran_alert')
+    if alerting_vet_id:
+        visitors = visits.get(alerting_vet_id, [])
+        events.append(Event("veteran_alert", veteran_id=alerting_vet_id, visited=bool(visitors)))
+        for visitor_id in visitors:
+            if visitor_id not in deaths:
+                events.append(Event("veteran_shot", player_id=visitor_id))
+                deaths.extend(kill(changes, visitor_id, events))
+
+        # If a werewolf visited the vet, their main attack is cancelled
+        if werewolf_target_id == alerting_vet_id:
+            werewolf_target_id = None # Attack is nullified
+
+
+    # --- Step 3: Resolve all other actions ---
+    # Werewolf attack resolution
+    if werewolf_target_id:
+        if witch_saved:
+            events.append(Event("wolf_attack_saved", target_id=werewolf_target_id, saved_by="witch"))
+        elif werewolf_target_id == doctor_save_id:
+            events.append(Event("wolf_attack_saved", target_id=werewolf_target_id, saved_by="doctor"))
+        elif werewolf_target_id == bodyguard_protected_id:
+            events.append(Event("bodyguard_sacrifice", target_id=werewolf_target_id, bodyguard_id=bodyguard_protector_id))
+            deaths.extend(kill(changes, bodyguard_protector_id, events))
+        else:
+            events.append(Event("wolf_kill", target_id=werewolf_target_id))
+            deaths.extend(kill(changes, werewolf_target_id, events))
+
+    # 5. Resolve Witch's kill potion
+    if witch_kill_id and witch_kill_id not in deaths:
+        # Mark potion as used
+        changes.set('game_state/witch_potions/kill', False)
+        if witch_kill_id == doctor_save_id:
+            events.append(Event("witch_kill_saved", target_id=witch_kill_id))
+        else:
+            events.append(Event("witch_kill", target_id=witch_kill_id))
+            deaths.extend(kill(changes, witch_kill_id, events))
+
+    # 6. Douse targets
+    arsonist_douse_action = night_actions.get('arsonist_douse')
+    if arsonist_douse_action:
+        doused_id = list(arsonist_douse_action.values())[0]
+        changes.set(f'player_states/{doused_id}/is_doused', True)
+        events.append(Event("douse", target_id=doused_id))
+
+    # 7. Ignite! This happens last and is the grand finale.
+    if night_actions.get('arsonist_ignite'):
+        # The staged index already includes tonight's douse and deaths
+        index = index_of(changes)
+        doused_players = [pid for pid in index.doused if pid in index.alive and pid not in deaths]
+        if doused_players:
+            events.append(Event("ignite"))
+            for pid in doused_players:
+                events.append(Event("burned", player_id=pid))
+                deaths.extend(kill(changes, pid, events))
+
+    # 8. Seer visions
+    for seer_id, target_id in seer_picks.items():
+        # A dead seer gets no vision
+        if seer_id in deaths: continue
+        target_role = player_states.get(target_id, {}).get('role', 'Unknown')
+        events.append(Event("seer_vision", seer_id=seer_id, target_id=target_id, role=target_role))
+
+    # 9. Sorcerer scrying
+    sorcerer_picks = night_actions.get('sorcerer_pick', {})
+    for sorcerer_id, target_id in sorcerer_picks.items():
+        if sorcerer_id in deaths: continue
+        is_seer = player_states.get(target_id, {}).get('role') == Role.SEER.value
+        events.append(Event("sorcerer_vision", sorcerer_id=sorcerer_id, target_id=target_id, is_seer=is_seer))
+
+    return events, deaths
+
+
+# --- Day ---
+
+def count_lynch_votes(game):
+    """
+    Tallies the day votes, counting a revealed Mayor twice.
+    Returns ("no_votes", []), ("tie", tied_ids) or ("lynched", [lynched_id]).
+    """
+    tally = index_of(game).votes.tally()
+    if not tally:
+        return "no_votes", []
+
+    max_votes = tally[0][1]
+    tied_targets = [p_id for p_id, count in tally if count == max_votes]
+    if len(tied_targets) > 1:
+        return "tie", tied_targets
+    return "lynched", tied_targets
+
+
+def resolve_lynch(changes, lynched_id: str) -> list:
+    """
+    Stages a lynch and clears the day's votes. A "jester_win" or "executioner_win"
+    event ends the game on the spot; nothing else is staged in that case.
+    """
+    events = []
+    player_states = changes.get("player_states", {})
+    lynched_role = player_states.get(lynched_id, {}).get("role")
+
+    # --- JESTER/EXECUTIONER WIN CONDITION CHECK ---
+    if lynched_role == Role.JESTER.value:
+        return [Event("jester_win", player_id=lynched_id)]
+
+    for pid in index_of(changes).with_role(Role.EXECUTIONER.value):
+        if changes.get(f"player_states/{pid}/target_id") == lynched_id:
+            return [Event("executioner_win", executioner_id=pid, target_id=lynched_id)]
+
+    # --- ALPHA WOLF CONVERSION CHECK ---
+    if lynched_role == Role.ALPHA_WOLF.value:
+        # Find the last person who voted for the Alpha Wolf
+        last_voter_id = index_of(changes).votes.last_voter_for(lynched_id)
+        if last_voter_id:
+            changes.set(f'player_states/{last_voter_id}/role', Role.WEREWOLF.value)
+            events.append(Event("alpha_conversion", player_id=last_voter_id))
+
+    kill(changes, lynched_id, events)
+    # --- Clear votes for next day ---
+    changes.delete('day_votes')
+    return events
+
+
+def find_winner(game):
+    """Returns who has won ("lovers", "arsonist", "village" or "werewolves"), or None."""
+    index = index_of(game)
+    alive_werewolves = index.alive_by_faction["werewolves"]
+    alive_villagers = index.alive_by_faction["village"]
+
+    if len(index.alive) == 2:
+        first, second = index.alive
+        if index.lovers.get(first) == second:
+            return "lovers"
+    if len(index.alive) == 1 and index.role_of(next(iter(index.alive))) == Role.ARSONIST.value:
+        return "arsonist"
+    if not alive_werewolves:
+        return "village"
+    if alive_werewolves >= alive_villagers:
+        return "werewolves"
+    return None
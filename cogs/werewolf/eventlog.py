@@ -0,0 +1,148 @@
+import asyncio
+import copy
+import time
+from concurrent.futures import ThreadPoolExecutor
+from .store import get_store
+from .players import PlayerState
+from . import archive
+
+# Every write to a game (night picks, votes, deaths, conversions, potions...) is
+# appended to that game's log instead of rewriting its `games/<channel_id>` tree.
+# Appending is a handful of new keys per flush, whatever the size of the game;
+# the tree itself is only brought up to date every SNAPSHOT_EVERY events.
+#
+#   game_logs/<game_id>/base                  the lobby as it was created
+#   game_logs/<game_id>/head                  {"segment": s, "seq": next event number}
+#   game_logs/<game_id>/segments/s<s>/e<seq>  [path] or [path, value]
+#
+# Segment s holds the events written since snapshot s, so a restart loads the
+# snapshot (the game's tree) and replays only the current segment. Replaying the
+# base and every segment in order rebuilds the game as it was at any event, which
+# is what we use to audit disputes. Logs outlive their games, and once a game ends
+# its log is copied to the archive (see archive.py), which keeps it for good.
+
+SNAPSHOT_EVERY = 200 # Events between two snapshots of the game tree
+
+
+def get_log_ref(game_id: str):
+    store = get_store()
+    if not store:
+        return None
+    return store.reference('game_logs').child(game_id)
+
+# Keys are prefixed so Firebase never turns a node into an array, and padded so they sort in order
+def segment_key(segment: int) -> str:
+    return f"s{segment}"
+
+def event_key(seq: int) -> str:
+    return f"e{seq:08d}"
+
+def encode_event(path: str, value) -> list:
+    return [path] if value is None else [path, value]
+
+def decode_event(raw) -> tuple:
+    """Returns (path, value). Firebase may hand a two-item list back as a dict."""
+    if isinstance(raw, dict):
+        raw = [raw.get("0"), raw.get("1")]
+    return raw[0], raw[1] if len(raw) > 1 else None
+
+
+def apply_event(data: dict, path: str, value):
+    """Writes `value` at a slash-separated path of a game tree; None deletes it."""
+    *parents, leaf = path.split('/')
+    node = data
+    for key in parents:
+        child = node.get(key)
+        if not isinstance(child, (dict, PlayerState)):
+            if value is None:
+                return # Deleting under a missing parent is a no-op
+            child = node[key] = {}
+        node = child
+    if value is None:
+        node.pop(leaf, None)
+    else:
+        node[leaf] = value
+
+def replay(base: dict, events: list, until_seq: int = None) -> dict:
+    """Rebuilds a game tree from its base and (seq, path, value) events, optionally stopping after `until_seq`."""
+    data = copy.deepcopy(base)
+    for seq, path, value in events:
+        if until_seq is not None and seq > until_seq:
+            break
+        apply_event(data, path, copy.deepcopy(value))
+    return data
+
+def segment_events(segment: dict) -> list:
+    """Decodes one segment into (seq, path, value) tuples, in order."""
+    return [(int(key[1:]), *decode_event(raw)) for key, raw in sorted((segment or {}).items())]
+
+
+def log_events(log: dict) -> list:
+    """Every event of a downloaded log, as (seq, path, value) tuples, in order."""
+    events = []
+    for key, segment in sorted((log.get("segments") or {}).items(), key=lambda item: int(item[0][1:])):
+        events.extend(segment_events(segment))
+    return events
+
+async def load_game_history(game_id: str):
+    """Downloads a whole game log. Returns (base, [(seq, path, value), ...]), or (None, []) if unknown."""
+    log_ref = get_log_ref(game_id)
+    log = await log_ref.get() if log_ref else None
+    if not log:
+        return None, []
+    return log.get("base", {}), log_events(log)
+
+async def rebuild_game(game_id: str, until_seq: int = None):
+    """The game tree as it was right after event `until_seq` (or at the end), straight from its log."""
+    base, events = await load_game_history(game_id)
+    if base is None:
+        return None
+    return replay(base, events, until_seq)
+
+
+# --- Archiving ended games ---
+
+_archive = None
+_archive_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="archive") # Chunks are appended one game at a time
+_archiving = set() # Archive tasks still running, so shutdown can wait for them
+
+async def archive_game_log(game_id: str, final: dict = None) -> bool:
+    """
+    Copies an ended game's log to the archive, with its `final` state (replayed from
+    the log if not given), and marks it `archived_at`. Returns False if the log is
+    gone or archiving is off.
+    """
+    global _archive
+    log_ref = get_log_ref(game_id)
+    if not archive.ARCHIVE_DIR or log_ref is None:
+        return False
+    log = await log_ref.get()
+    if not log or "base" not in log:
+        return False
+    if log.get("archived_at"):
+        return True
+    if _archive is None:
+        _archive = archive.GameArchive(archive.ARCHIVE_DIR, archive.ARCHIVE_WRITER)
+    events = log_events(log)
+    log.setdefault("ended_at", time.time())
+    record = archive.archive_record(game_id, log, final if final is not None else replay(log["base"], events), events)
+    await asyncio.get_running_loop().run_in_executor(_archive_executor, _archive.write, record)
+    await log_ref.update({"archived_at": time.time()})
+    return True
+
+def archive_soon(game_id: str, final: dict = None):
+    """Archives a game's log in the background. If it fails, the sweeper tries again before deleting the log."""
+    async def run():
+        try:
+            await archive_game_log(game_id, final)
+        except Exception as e:
+            print(f"Could not archive game {game_id}: {e}")
+
+    task = asyncio.create_task(run())
+    _archiving.add(task)
+    task.add_done_callback(_archiving.discard)
+
+async def wait_for_archives():
+    """Waits for the games being archived, e.g. before shutting down."""
+    while _archiving:
+        await asyncio.gather(*list(_archiving), return_exceptions=True)
@@ -3,9 +3,14 @@ from discord import app_commands
 from discord.ext import commands
 import asyncio
 from .core import (
-    GamePhase, Role, get_game_ref, get_game_data, distribute_roles,
-    start_game_loop, ROLE_DESCRIPTIONS, ROLE_COLORS
+    GamePhase, Role, get_game_ref, distribute_roles,
+    launch_game_loop, ROLE_REVEAL_EMBEDS
 )
+from .state import create_game_state
+from .actor import run_game_command
+from .dm import dispatcher
+from .metrics import observe_ack
+from .views import reject
 
 class Game(commands.Cog):
     """Cog for creating and managing Werewolf games."""
@@ -22,10 +27,6 @@ class Game(commands.Cog):
             await interaction.response.send_message("The database is not connected, master! Please check the configuration.", ephemeral=True)
             return
 
-        if get_game_data(interaction.channel_id):
-            await interaction.response.send_message("A game is already in progress in this channel, baka!", ephemeral=True)
-            return
-
         creator = interaction.user
         
         # Default roles for a new game. All special roles are enabled by default.
@@ -41,7 +42,17 @@ class Game(commands.Cog):
                 "roles": default_roles
             }
         }
-        game_ref.set(game_data)
+
+        async def create_lobby(state):
+            if state:
+                return False
+            await create_game_state(interaction.channel_id, game_data)
+            return True
+
+        # Two /ww create in the same second must not both see an empty channel
+        if not await run_game_command(interaction.channel_id, create_lobby):
+            await interaction.response.send_message("A game is already in progress in this channel, baka!", ephemeral=True)
+            return
 
         embed = discord.Embed(
             title="🌸 A New Werewolf Game is Starting! 🌸",
@@ -56,29 +67,31 @@ class Game(commands.Cog):
     @ww_group.command(name="join", description="🎀 Joins an existing Werewolf game lobby.")
     async def join(self, interaction: discord.Interaction):
         """Joins the Werewolf game lobby in the channel."""
-        game_data = get_game_data(interaction.channel_id)
         game_ref = get_game_ref(interaction.channel_id)
-
         if not game_ref:
             await interaction.response.send_message("The database is not connected, master! Please check the configuration.", ephemeral=True)
             return
-
-        if not game_data:
-            await interaction.response.send_message("There's no game to join here, silly! Use `/ww create` to start one.", ephemeral=True)
-            return
-
-        if game_data["phase"] != GamePhase.WAITING.value:
-            await interaction.response.send_message("The game has already started! Maybe next time, okay?", ephemeral=True)
-            return
-
-        players = game_data.get("players", {})
-        if str(interaction.user.id) in players:
-            await interaction.response.send_message("You're already in the game, you dork! ❤️", ephemeral=True)
+        # The lobby's actor may be busy; Discord only waits 3 seconds for an answer
+        await interaction.response.defer(thinking=True)
+        observe_ack(interaction, "join")
+
+        async def add_player(state):
+            if not state:
+                return "There's no game to join here, silly! Use `/ww create` to start one.", None
+            if state.get("phase") != GamePhase.WAITING.value:
+                return "The game has already started! Maybe next time, okay?", None
+            if str(interaction.user.id) in state.get("players", {}):
+                return "You're already in the game, you dork! ❤️", None
+
+            state.set(f"players/{interaction.user.id}", {"name": interaction.user.display_name, "mention": interaction.user.mention})
+            await state.flush()
+            return None, dict(state.get("players", {}))
+
+        error, players = await run_game_command(interaction.channel_id, add_player)
+        if error:
+            await reject(interaction, error)
             return
 
-        players[str(interaction.user.id)] = {"name": interaction.user.display_name, "mention": interaction.user.mention}
-        game_ref.child("players").set(players)
-
         player_list = "\n".join([f"✨ {p['mention']}" for p in players.values()])
         embed = discord.Embed(
             title="🎀 A New Challenger Appears! 🎀",
@@ -86,82 +99,80 @@ class Game(commands.Cog):
             color=discord.Color.from_rgb(173, 216, 230) # Light Blue
         )
         embed.add_field(name=f"Players ({len(players)})", value=player_list, inline=False)
-        await interaction.response.send_message(embed=embed)
+        await interaction.followup.send(embed=embed)
     
     @ww_group.command(name="start", description="💖 Starts the Werewolf game.")
     async def start(self, interaction: discord.Interaction):
         """Starts the game, assigns roles, and begins the first night."""
-        game_ref = get_game_ref(interaction.channel_id)
-        game_data = get_game_data(interaction.channel_id)
-
-        if not game_data:
-            await interaction.response.send_message("There's no game to start, sweetie!", ephemeral=True)
-            return
-        
-        if game_data["creator_id"] != interaction.user.id:
-            await interaction.response.send_message("Only the one who created the game can start it, okay?", ephemeral=True)
-            return
-
-        if game_data["phase"] != GamePhase.WAITING.value:
-            await interaction.response.send_message("The game has already started!", ephemeral=True)
+        # Dealing waits on the actor and a Firebase commit; Discord only waits 3 seconds for an answer
+        await interaction.response.defer(thinking=True)
+        observe_ack(interaction, "start")
+
+        async def deal_roles(state):
+            if not state:
+                return "There's no game to start, sweetie!", None
+            if state.get("creator_id") != interaction.user.id:
+                return "Only the one who created the game can start it, okay?", None
+            if state.get("phase") != GamePhase.WAITING.value:
+                return "The game has already started!", None
+
+            players = state.get("players", {})
+            if len(players) < 4:
+                return f"You can't play with only {len(players)} person! You need at least 4 players for a proper game!", None
+
+            # Dealt on the actor so nobody can slip into the lobby while roles are handed out
+            await distribute_roles(state, players)
+            return None, state
+
+        error, state = await run_game_command(interaction.channel_id, deal_roles)
+        if error:
+            await reject(interaction, error)
             return
-        
-        players = game_data.get("players", {})
-        if len(players) < 4:
-             await interaction.response.send_message(f"You can't play with only {len(players)} person! You need at least 4 players for a proper game!", ephemeral=True)
-             return
 
-        await interaction.response.send_message("The game is starting... I'm sending everyone their secret roles now! Don't peek, okay? 😉")
-        
-        await distribute_roles(game_ref, game_data, players)
+        await interaction.followup.send("The game is starting... I'm sending everyone their secret roles now! Don't peek, okay? 😉")
         
-        # We need to refetch the data after roles are distributed
-        new_game_data = get_game_data(interaction.channel_id)
+        # Roles are now in the in-memory state, no need to refetch them
+        players = state.get("players", {})
+        new_game_data = state.data
         player_roles = new_game_data.get("roles", {})
         player_states = new_game_data.get("player_states", {})
         
+        # Build every recipient's messages first, then send them all concurrently
+        outbox = {}
         for player_id_str, role_str in player_roles.items():
             player_id = int(player_id_str)
             member = interaction.guild.get_member(player_id)
             if not member: continue
 
-            role_enum = Role(role_str)
-            embed = discord.Embed(
-                title=f"Your secret role is... {role_enum.value}! 🎭",
-                description=f"Shhh... it's a secret!\n\n**Mission:**\n{ROLE_DESCRIPTIONS.get(role_enum)}",
-                color=ROLE_COLORS.get(role_enum, discord.Color.default())
-            )
-            try:
-                await member.send(embed=embed)
-            except discord.Forbidden:
-                await interaction.followup.send(f"I couldn't DM {member.mention}, the poor thing! Please make sure your DMs are open so I can tell you your role!", ephemeral=True)
+            outbox[member] = [{"embed": ROLE_REVEAL_EMBEDS[Role(role_str)]}]
         
             # --- Inform Executioner of their Target ---
             if role_str == Role.EXECUTIONER.value:
                 target_id = player_states.get(player_id_str, {}).get('target_id')
-                if target_id and member:
+                if target_id:
                     target_name = new_game_data.get('players', {}).get(target_id, {}).get('name', 'Unknown')
-                    try:
-                        await member.send(f"🔪 Your secret target is **{target_name}**. Your mission is to convince the village to lynch them. Good luck.")
-                    except discord.Forbidden:
-                        pass # They were already warned about DMs being closed
+                    outbox[member].append({"content": f"🔪 Your secret target is **{target_name}**. Your mission is to convince the village to lynch them. Good luck."})
 
         # Announce werewolves to each other
         werewolves = {pid: pdata for pid, pdata in players.items() if player_roles.get(pid) == Role.WEREWOLF.value}
-        wolf_mentions = [p['mention'] for p in werewolves.values()]
         
         for wolf_id in werewolves.keys():
             other_wolves = [p['name'] for pid, p in werewolves.items() if pid != wolf_id]
             wolf_member = interaction.guild.get_member(int(wolf_id))
-            if not wolf_member: continue
+            if wolf_member not in outbox: continue
 
             if other_wolves:
-                await wolf_member.send(f"Your fellow werewolves are: **{', '.join(other_wolves)}**. Work together to bring down the village!")
+                outbox[wolf_member].append({"content": f"Your fellow werewolves are: **{', '.join(other_wolves)}**. Work together to bring down the village!"})
             else:
-                await wolf_member.send("You are the lone wolf. Be careful out there!")
+                outbox[wolf_member].append({"content": "You are the lone wolf. Be careful out there!"})
+
+        failures = await dispatcher.send_many(outbox)
+        if failures:
+            mentions = ", ".join(failure.member.mention for failure in failures)
+            await interaction.followup.send(f"I couldn't DM {mentions}, the poor thing! Please make sure your DMs are open so I can tell you your role!", ephemeral=True)
 
         # Start the game loop in the background
-        asyncio.create_task(start_game_loop(self.bot, interaction.channel_id))
+        launch_game_loop(self.bot, interaction.channel_id)
 
 
 async def setup(bot: commands.Bot):
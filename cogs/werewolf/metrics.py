@@ -0,0 +1,233 @@
+import asyncio
+import bisect
+import json
+import os
+import time
+from contextlib import contextmanager
+
+# What the bot is doing, as counters, gauges and histograms kept in memory and
+# served in Prometheus' text format on a local HTTP endpoint:
+#
+#   http://127.0.0.1:9108/metrics       for Prometheus to scrape
+#   http://127.0.0.1:9108/metrics.json  the same, as JSON, for offline analysis
+#
+# dump_metrics() writes the JSON form to a file (bench.run --metrics does this).
+# Recording is a dict lookup and an addition, cheap enough for the hot paths.
+# Values that are costly to keep current (active games, players per phase) are
+# computed by collectors only when the metrics are read.
+
+METRICS_HOST = os.environ.get('WEREWOLF_METRICS_HOST', '127.0.0.1')
+METRICS_PORT = int(os.environ.get('WEREWOLF_METRICS_PORT', '9108')) # 0 turns the endpoint off
+LOOP_LAG_INTERVAL = 0.5 # Seconds between two event-loop lag probes
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+PHASE_BUCKETS = (1, 5, 10, 30, 60, 120, 300, 600)
+
+_registry = [] # Every metric, in the order they were defined
+_collectors = [] # Callables run before the metrics are read
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values = {} # label values -> value
+        _registry.append(self)
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels[label]) for label in self.labels)
+
+    def samples(self):
+        """(suffix, label values, value) for every series."""
+        for key, value in self._values.items():
+            yield "", key, value
+
+
+class CounterMetric(Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+
+class GaugeMetric(Metric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        self._values[self._key(labels)] = value
+
+    def clear(self):
+        self._values.clear()
+
+
+class HistogramMetric(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = buckets
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        series = self._values.get(key)
+        if series is None:
+            series = self._values[key] = [[0] * len(self.buckets), 0, 0.0] # Per-bucket counts, count, sum
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            series[0][index] += 1
+        series[1] += 1
+        series[2] += value
+
+    def samples(self):
+        for key, (counts, count, total) in self._values.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                yield "_bucket", key + (("le", _number(bound)),), cumulative
+            yield "_bucket", key + (("le", "+Inf"),), count
+            yield "_count", key, count
+            yield "_sum", key, total
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+# --- The metrics ---
+
+active_games = GaugeMetric("werewolf_active_games", "Games with a running loop in this process")
+players_by_phase = GaugeMetric("werewolf_players", "Living players in this process's games, by phase", ("phase",))
+step_seconds = HistogramMetric("werewolf_step_seconds", "Time spent in each step of the game loop", ("step",), PHASE_BUCKETS)
+game_writes = CounterMetric("werewolf_game_writes_total", "Writes to in-memory game state, by top-level field", ("field",))
+store_calls = CounterMetric("werewolf_store_calls_total", "Database calls, by operation and path", ("op", "path", "outcome"))
+store_seconds = HistogramMetric("werewolf_store_seconds", "Database call latency, by operation and path", ("op", "path"))
+dm_sends = CounterMetric("werewolf_dm_sends_total", "Direct messages sent, by outcome", ("outcome",))
+dm_seconds = HistogramMetric("werewolf_dm_seconds", "Time to deliver a direct message, retries included")
+ack_seconds = HistogramMetric("werewolf_interaction_ack_seconds", "Time from an interaction's creation to our first answer", ("kind",))
+loop_lag_seconds = HistogramMetric("werewolf_event_loop_lag_seconds", "How late the event loop runs a scheduled callback")
+
+
+def add_collector(collect):
+    """Registers `collect()`, called to bring gauges up to date right before the metrics are read."""
+    _collectors.append(collect)
+
+def _collect():
+    for collect in _collectors:
+        try:
+            collect()
+        except Exception as e:
+            print(f"Metrics collector {collect.__name__} failed: {e}")
+
+
+def path_family(path: str, keys=()) -> str:
+    """
+    What a database path is about, as a low-cardinality label: the game field for
+    paths inside a game (`night_actions`, `player_states`, `day_votes`...), else its root.
+    """
+    parts = path.strip('/').split('/')
+    if parts[0] == 'games' and len(parts) > 2:
+        return parts[2]
+    if parts[0] == 'games' and len(parts) == 2 and keys:
+        # A multi-path update of one game: label it by its field if they all share one
+        fields = {key.split('/', 1)[0] for key in keys}
+        return fields.pop() if len(fields) == 1 else 'games'
+    return parts[0] or 'root'
+
+def observe_ack(interaction, kind: str):
+    """Records how long an interaction waited for our first answer. Call right after answering."""
+    created_at = getattr(interaction, "created_at", None)
+    if created_at is not None:
+        ack_seconds.observe(max(0.0, time.time() - created_at.timestamp()), kind=kind)
+
+
+# --- Reading the metrics ---
+
+def render() -> str:
+    """All metrics in Prometheus' text exposition format."""
+    _collect()
+    lines = []
+    for metric in _registry:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for suffix, key, value in metric.samples():
+            pairs = list(zip(metric.labels, key[:len(metric.labels)])) + list(key[len(metric.labels):])
+            label_text = ",".join(f'{label}="{_escape(label_value)}"' for label, label_value in pairs)
+            lines.append(f"{metric.name}{suffix}{{{label_text}}} {_number(value)}" if label_text else f"{metric.name}{suffix} {_number(value)}")
+    return "\n".join(lines) + "\n"
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def snapshot() -> dict:
+    """All metrics as plain data: {name: {"type", "help", "series": [{"labels", "value"}]}}."""
+    _collect()
+    data = {}
+    for metric in _registry:
+        series = []
+        for key, value in metric._values.items():
+            labels = dict(zip(metric.labels, key))
+            if isinstance(metric, HistogramMetric):
+                counts, count, total = value
+                value = {"buckets": dict(zip(map(_number, metric.buckets), counts)), "count": count, "sum": total}
+            series.append({"labels": labels, "value": value})
+        data[metric.name] = {"type": metric.kind, "help": metric.help, "series": series}
+    return data
+
+def dump_metrics(path: str):
+    """Writes snapshot() as JSON, for offline analysis."""
+    with open(path, "w") as f:
+        json.dump({"taken_at": time.time(), "metrics": snapshot()}, f, indent=2)
+
+
+# --- Serving them ---
+
+_server = None
+_lag_probe = None
+
+async def start_metrics(host: str = METRICS_HOST, port: int = METRICS_PORT):
+    """Starts the HTTP endpoint and the event-loop lag probe, once per process."""
+    global _server, _lag_probe
+    if _lag_probe is None or _lag_probe.done():
+        _lag_probe = asyncio.create_task(_probe_loop_lag())
+    if _server is not None or not port:
+        return
+    from aiohttp import web # Installed with discord.py
+
+    async def metrics(request):
+        return web.Response(body=render().encode(), headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"})
+
+    async def metrics_json(request):
+        return web.json_response(snapshot())
+
+    app = web.Application()
+    app.router.add_get("/metrics", metrics)
+    app.router.add_get("/metrics.json", metrics_json)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    try:
+        await web.TCPSite(runner, host, port).start()
+    except OSError as e:
+        print(f"Could not serve metrics on {host}:{port}: {e}")
+        await runner.cleanup()
+        return
+    _server = runner
+    print(f"Serving metrics on http://{host}:{port}/metrics")
+
+async def _probe_loop_lag():
+    loop = asyncio.get_running_loop()
+    while True:
+        scheduled = loop.time() + LOOP_LAG_INTERVAL
+        await asyncio.sleep(LOOP_LAG_INTERVAL)
+        loop_lag_seconds.observe(max(0.0, loop.time() - scheduled))
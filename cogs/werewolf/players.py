@@ -0,0 +1,127 @@
+from .engine import Role
+
+# Each player's state used to be a ten-key dict, with the role kept as a string and
+# re-parsed with Role(...) wherever it was needed. In memory it is now a PlayerState:
+# one slotted object per player, with the role held as a Role. It still behaves like
+# the dict it replaces (pstate.get("is_alive"), pstate["role"] == "Seer", path writes
+# such as `player_states/<id>/is_alive`), so Firebase, the event log and the engine
+# all see the same JSON shape. Hot paths can use attributes instead: pstate.is_alive,
+# pstate.role is Role.SEER.
+
+
+class PlayerState:
+    """A player's in-game state. Fields that are None are absent, as in Firebase."""
+    FIELDS = (
+        "role", "is_alive", "is_protected", "is_healed_by_witch", "lover_id", "is_doused",
+        "is_mayor_revealed", "veteran_alerts", "is_on_alert", "target_id",
+    )
+    __slots__ = FIELDS + ("extra",)
+    _FIELD_SET = frozenset(FIELDS)
+
+    def __init__(self, **fields):
+        for name in self.FIELDS:
+            setattr(self, name, None)
+        self.extra = None # Any keys we don't know about, kept so nothing is lost on a round-trip
+        for key, value in fields.items():
+            self[key] = value
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "PlayerState":
+        return cls(**data)
+
+    def to_dict(self) -> dict:
+        """The Firebase JSON shape of this player."""
+        data = {}
+        for name in self.FIELDS:
+            value = getattr(self, name)
+            if value is not None:
+                data[name] = value._value_ if name == "role" else value
+        if self.extra:
+            data.update(to_json(self.extra))
+        return data
+
+    # --- Mapping interface, so existing dict-style reads and path writes keep working ---
+
+    def __getitem__(self, key: str):
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key: str, value):
+        if key in self._FIELD_SET:
+            setattr(self, key, Role(value) if key == "role" and value is not None else value)
+        elif value is not None:
+            if self.extra is None:
+                self.extra = {}
+            self.extra[key] = value
+        else:
+            self.pop(key, None)
+
+    def __contains__(self, key: str) -> bool:
+        return self.get(key) is not None
+
+    def get(self, key: str, default=None):
+        if key in self._FIELD_SET:
+            value = getattr(self, key)
+            if value is None:
+                return default
+            return value._value_ if key == "role" else value # _value_ skips Enum's slow .value property
+        if self.extra:
+            return self.extra.get(key, default)
+        return default
+
+    def pop(self, key: str, default=None):
+        value = self.get(key, default)
+        if key in self._FIELD_SET:
+            setattr(self, key, None)
+        elif self.extra:
+            self.extra.pop(key, None)
+        return value
+
+    def keys(self):
+        present = [name for name in self.FIELDS if getattr(self, name) is not None]
+        return present + list(self.extra or ())
+
+    def items(self):
+        return [(key, self[key]) for key in self.keys()]
+
+    def values(self):
+        return [self[key] for key in self.keys()]
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def __eq__(self, other):
+        if isinstance(other, PlayerState):
+            other = other.to_dict()
+        return isinstance(other, dict) and self.to_dict() == other
+
+    def __deepcopy__(self, memo):
+        return PlayerState.from_dict(self.to_dict())
+
+    def __repr__(self):
+        return f"PlayerState({self.to_dict()!r})"
+
+
+def type_player_states(player_states: dict):
+    """Replaces plain player dicts with PlayerStates, in place."""
+    for pid, pstate in player_states.items():
+        if isinstance(pstate, dict):
+            player_states[pid] = PlayerState.from_dict(pstate)
+
+def to_json(value):
+    """
+    A deep copy of a game (sub)tree in Firebase's JSON shape: every PlayerState turned
+    back into a plain dict, and None values dropped since Firebase never stores them.
+    """
+    if isinstance(value, PlayerState):
+        return value.to_dict()
+    if isinstance(value, dict):
+        return {key: to_json(child) for key, child in value.items() if child is not None}
+    if isinstance(value, list):
+        return [to_json(child) for child in value]
+    return value
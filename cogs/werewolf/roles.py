@@ -1,60 +1,67 @@
 import discord
-from .core import Role, get_game_ref
+from discord.ext import commands
+from .core import Role
+from .state import GameState, ChangeSet
 from .views import (
     NightActionView, WitchActionView, CupidSelectionView, ArsonistActionView,
     VeteranAlertView
 )
+from .dm import dispatcher
 from collections import Counter
 import random
 
-async def send_early_night_prompts(bot: commands.Bot, game_data: dict):
-    """Sends DMs with interactive views to players with non-witch night roles."""
-    game_ref = get_game_ref(game_data['channel_id'])
+async def send_early_night_prompts(bot: commands.Bot, state: GameState) -> list:
+    """
+    Sends DMs with interactive views to players with non-witch night roles.
+    Returns the ids of every player reached, so the night can end once they have all acted.
+    Players prompted before a restart still have working buttons and are not prompted again.
+    """
+    game_data = state.data
     player_states = game_data.get('player_states', {})
-    all_players = game_data.get('players', {})
-    
-    alive_players_info = [
-        {"id": pid, "name": pdata["name"]}
-        for pid, pdata in all_players.items()
-        if player_states.get(pid, {}).get("is_alive", False)
-    ]
     
+    alive = state.index.alive
     werewolves = []
+    outbox = {} # member -> [message]
+    already_prompted = []
     night_num = game_data.get("game_state", {}).get("night_number", 0)
 
-    for player_id, state in player_states.items():
-        if not state.get('is_alive'):
+    for player_id in alive:
+        pstate = player_states[player_id]
+        if state.get(f'night_actions/submitted/{player_id}'):
+            continue # Already acted tonight (we are re-prompting after a restart)
+        if state.get(f'night_actions/prompted/{player_id}'):
+            already_prompted.append(player_id) # Their buttons survived the restart; still wait for them
             continue
         
         member = bot.get_guild(game_data['guild_id']).get_member(int(player_id))
         if not member:
             continue
 
-        role = Role(state['role'])
+        role = pstate.role
         
         if role == Role.WITCH:
             continue
 
         if role == Role.CUPID and night_num == 1:
-            view = CupidSelectionView(game_ref, player_id, alive_players_info)
-            await member.send("Choose two players to strike with your arrow of love, Cupid. Their fates will be forever intertwined.", view=view)
+            view = CupidSelectionView(state, player_id)
+            outbox[member] = [{"content": "Choose two players to strike with your arrow of love, Cupid. Their fates will be forever intertwined.", "view": view}]
             continue
 
         if role == Role.ARSONIST:
-            view = ArsonistActionView(game_ref, player_id, alive_players_info)
-            await member.send("It's time to play with fire, my dear. Will you douse a new target in gasoline, or ignite the world?", view=view)
+            view = ArsonistActionView(state, player_id)
+            outbox[member] = [{"content": "It's time to play with fire, my dear. Will you douse a new target in gasoline, or ignite the world?", "view": view}]
             continue
 
         # --- Veteran Action ---
         if role == Role.VETERAN and not game_data.get("game_state", {}).get("veteran_alerts_used", True):
-            view = VeteranAlertView(game_ref, player_id)
-            await member.send("The night is unsettling. You can choose to go on alert, but you only have one chance.", view=view)
+            view = VeteranAlertView(state, player_id)
+            outbox[member] = [{"content": "The night is unsettling. You can choose to go on alert, but you only have one chance.", "view": view}]
             continue
 
         # --- Sorcerer Action ---
         if role == Role.SORCERER:
-            view = NightActionView(game_ref, player_id, 'sorcerer_pick', alive_players_info)
-            await member.send("The werewolves trust in your dark magic. Who do you suspect is the Seer?", view=view)
+            view = NightActionView(state, player_id, 'sorcerer_pick')
+            outbox[member] = [{"content": "The werewolves trust in your dark magic. Who do you suspect is the Seer?", "view": view}]
             continue
 
         # --- Werewolf Action ---
@@ -62,37 +69,49 @@ async def send_early_night_prompts(bot: commands.Bot, game_data: dict):
             werewolves.append({"id": player_id, "member": member})
             
         elif role == Role.SEER:
-            view = NightActionView(game_ref, player_id, 'seer_pick', alive_players_info)
-            await member.send("Seer, who do you want to peek at tonight? Choose wisely...", view=view)
+            view = NightActionView(state, player_id, 'seer_pick')
+            outbox[member] = [{"content": "Seer, who do you want to peek at tonight? Choose wisely...", "view": view}]
 
         elif role == Role.DOCTOR:
-            view = NightActionView(game_ref, player_id, 'doctor_save', alive_players_info)
-            await member.send("Doctor, who will you protect with your life-saving medicine tonight?", view=view)
+            view = NightActionView(state, player_id, 'doctor_save')
+            outbox[member] = [{"content": "Doctor, who will you protect with your life-saving medicine tonight?", "view": view}]
             
         elif role == Role.BODYGUARD:
-            view = NightActionView(game_ref, player_id, 'bodyguard_protect', alive_players_info)
-            await member.send("Bodyguard, whose life is more important than yours tonight?", view=view)
+            view = NightActionView(state, player_id, 'bodyguard_protect')
+            outbox[member] = [{"content": "Bodyguard, whose life is more important than yours tonight?", "view": view}]
     
     if werewolves:
-        potential_victims = [p for p in alive_players_info if p["id"] not in [w["id"] for w in werewolves]]
         for wolf in werewolves:
-            view = NightActionView(game_ref, wolf["id"], 'werewolf_vote', potential_victims)
-            await wolf["member"].send("My dear wolf, who shall we feast on tonight? 🐺", view=view)
-
-
-async def prompt_witch(bot: commands.Bot, game_data: dict):
-    """Calculates werewolf target and sends the special prompt to the Witch."""
-    witch_id = None
-    player_states = game_data.get('player_states', {})
-    for pid, state in player_states.items():
-        if state.get('is_alive') and state.get('role') == Role.WITCH.value:
-            witch_id = pid
-            break
+            view = NightActionView(state, wolf["id"], 'werewolf_vote')
+            outbox[wolf["member"]] = [{"content": "My dear wolf, who shall we feast on tonight? 🐺", "view": view}]
+
+    # Send every prompt at once so one slow DM doesn't eat into everyone else's night
+    failures = await dispatcher.send_many(outbox)
+    unreachable = {failure.member for failure in failures}
+    reached = [str(member.id) for member in outbox if member not in unreachable]
+    await _mark_prompted(state, reached)
+    return already_prompted + reached
+
+async def _mark_prompted(state: GameState, player_ids: list):
+    """Records tonight's prompts, so a restart doesn't send them twice."""
+    if player_ids:
+        changes = ChangeSet(state)
+        for player_id in player_ids:
+            changes.set(f'night_actions/prompted/{player_id}', True)
+        await state.commit(changes)
+
+
+async def prompt_witch(bot: commands.Bot, state: GameState):
+    """Calculates werewolf target and sends the special prompt to the Witch. Returns the witch's id if prompted."""
+    game_data = state.data
+    living_witches = state.index.with_role(Role.WITCH.value, alive=True)
+    witch_id = living_witches[0] if living_witches else None
             
-    if not witch_id:
+    if not witch_id or state.get(f'night_actions/submitted/{witch_id}'):
         return
+    if state.get(f'night_actions/prompted/{witch_id}'):
+        return witch_id # Prompted before a restart; that prompt still works
 
-    game_ref = get_game_ref(game_data['channel_id'])
     potions = game_data.get('game_state', {}).get('witch_potions', {})
     
     if not potions.get('kill') and not potions.get('save'):
@@ -119,16 +138,8 @@ async def prompt_witch(bot: commands.Bot, game_data: dict):
     else:
         prompt_text += f"\nThe werewolves were indecisive tonight, and no one was targeted."
 
-    all_players = game_data.get('players', {})
-    alive_players_info = [
-        {"id": pid, "name": pdata["name"]}
-        for pid, pdata in all_players.items()
-        if player_states.get(pid, {}).get("is_alive", False)
-    ]
-
-    view = WitchActionView(game_ref, witch_id, potions, werewolf_target_info, alive_players_info)
-    await witch_member.send(prompt_text, view=view)
-
-
-async def setup(bot: commands.Bot):
-    await bot.add_cog(Roles(bot)) 
\ No newline at end of file
+    view = WitchActionView(state, witch_id, potions, werewolf_target_info)
+    if await dispatcher.send(witch_member, content=prompt_text, view=view):
+        await _mark_prompted(state, [witch_id])
+        return witch_id
+ 
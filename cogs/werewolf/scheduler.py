@@ -0,0 +1,58 @@
+import asyncio
+from .state import GameState
+
+# Phases no longer sleep for a fixed time: each one ends as soon as every player
+# who has to act has done so, or when its (configurable) deadline runs out.
+
+DEFAULT_PHASE_TIMERS = {
+    "night": 30,       # Seconds for the early night actions
+    "cupid": 60,       # Cupid gets a little more time on the first night
+    "witch": 30,       # Seconds for the witch to act
+    "discussion": 120, # Seconds to discuss and vote during the day
+}
+
+def phase_timeout(state: GameState, phase: str) -> int:
+    """Max length of a phase: the game's `settings/timers/<phase>` or the default."""
+    return int(state.get(f"settings/timers/{phase}", DEFAULT_PHASE_TIMERS[phase]))
+
+
+def mark_submitted(state: GameState, actor_id: str):
+    """Records that a player is done with their night action (or chose to skip it)."""
+    state.set(f"night_actions/submitted/{actor_id}", True)
+
+def night_actions_done(state: GameState, actor_ids) -> bool:
+    return all(state.get(f"night_actions/submitted/{actor_id}") for actor_id in actor_ids)
+
+def day_votes_done(state: GameState) -> bool:
+    """True once every living player has cast a vote."""
+    day_votes = state.index.votes.votes
+    return all(pid in day_votes for pid in state.index.alive)
+
+
+async def wait_for_phase(state: GameState, timeout: float, is_complete=None, watch: str = "") -> bool:
+    """
+    Waits up to `timeout` seconds, returning early once `is_complete()` holds.
+    The check is re-run on every write under `watch` (e.g. `night_actions`).
+    Returns True if the phase ended early.
+    """
+    if is_complete is None:
+        await asyncio.sleep(timeout)
+        return False
+
+    done = asyncio.Event()
+
+    def on_change(path: str):
+        if state.ended or ((path == watch or path.startswith(watch)) and is_complete()):
+            done.set()
+
+    if state.ended or is_complete():
+        return True
+
+    state.add_listener(on_change)
+    try:
+        await asyncio.wait_for(done.wait(), timeout)
+        return True
+    except asyncio.TimeoutError:
+        return False
+    finally:
+        state.remove_listener(on_change)
@@ -0,0 +1,411 @@
+import asyncio
+import copy
+import time
+from .store import get_store
+from .eventlog import (
+    SNAPSHOT_EVERY, get_log_ref, segment_key, event_key, encode_event, decode_event, apply_event, segment_events, archive_soon
+)
+from .players import PlayerState, type_player_states, to_json
+from .engine import GameIndex
+from .metrics import game_writes
+
+# While a game is running, its GameState is the source of truth: commands, views
+# and the game loop read and write this in-memory tree, and the changes are
+# written behind to Firebase when a phase ends: appended to the game's event log
+# (see eventlog.py), with the tree itself updated every SNAPSHOT_EVERY events.
+# Player input between phase ends (votes, night picks) is saved with flush_soon,
+# so a burst of clicks lands in a single update a moment later.
+
+FLUSH_DELAY = 2.0 # Seconds a flush_soon waits for more writes before saving them together
+ACTIVITY_RESOLUTION = 300.0 # Seconds between two updates of a game's entry in the activity index (see sweeper.py)
+
+
+class GameState:
+    """In-memory copy of one `games/<channel_id>` tree, with its unsaved writes."""
+    def __init__(self, channel_id: int, data: dict, game_ref, log_ref=None, log_head: dict = None):
+        self.channel_id = channel_id
+        self.data = data if data is not None else {}
+        self.game_ref = game_ref
+        self.log_ref = log_ref # game_logs/<game_id>; None for games started before the log existed
+        self.log_segment = (log_head or {}).get("segment", 0)
+        self.log_seq = (log_head or {}).get("seq", 0) # Number of the next event
+        self.ended = False # Set once the game is deleted; loops and views should stop
+        self.remote = False # A read-only copy of a game another process owns (see cluster.py)
+        self._subscription = None # A remote copy's stream of the game's log
+        self._pending = {} # seq -> (path, value) streamed ahead of an earlier entry
+        self._dirty = set() # Paths (relative to the game) changed since the tree was last written
+        self._log = [] # (path, value) of every write not yet appended to the log, in order
+        self._since_snapshot = 0 # Events in the current log segment
+        type_player_states(self.data.get("player_states") or {})
+        self.index = GameIndex.build(self) # Roles, factions, the living and the doused; updated on every write
+        self._listeners = [] # Callables invoked with the path of every write
+        self._flush_lock = asyncio.Lock() # Keeps updates reaching Firebase in the order they were made
+        self._flush_task = None # The pending flush_soon, if any
+        self._last_touched = time.time() # When game_activity/<channel_id> was last brought up to date
+
+    def add_listener(self, listener):
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener):
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def _notify(self, path: str):
+        for listener in list(self._listeners):
+            listener(path)
+
+    def get(self, path: str, default=None):
+        """Reads a slash-separated path, e.g. `game_state/night_number`."""
+        node = self.data
+        for key in path.split('/'):
+            if not isinstance(node, (dict, PlayerState)) or key not in node:
+                return default
+            node = node[key]
+        return node
+
+    def set(self, path: str, value):
+        """Writes a path in memory and queues it for the log. A value of None deletes it."""
+        game_writes.inc(field=path.partition('/')[0])
+        if self.log_ref is not None:
+            self._log.append((path, to_json(value)))
+        self._write(path, value)
+        self._notify(path)
+
+    def _write(self, path: str, value):
+        apply_event(self.data, path, value)
+        self._dirty.add(path)
+        # Whole players written as dicts are stored as PlayerStates
+        if path == "player_states":
+            type_player_states(self.data.get("player_states") or {})
+        elif path.startswith("player_states/") and path.count('/') == 1 and isinstance(value, dict):
+            self.data["player_states"][path[len("player_states/"):]] = PlayerState.from_dict(value)
+        self.index.on_write(self, path)
+
+    def delete(self, path: str):
+        self.set(path, None)
+
+    def apply_remote(self, path: str, value):
+        """Applies a write the owning process made: nothing is queued, it is saved already."""
+        self._write(path, value)
+        self._dirty.discard(path)
+        self._notify(path)
+
+    def replay(self, events: list):
+        """Re-applies logged (seq, path, value) events on top of the snapshot we loaded."""
+        for seq, path, value in events:
+            self._write(path, value) # Marked dirty: the tree doesn't have them yet
+        self._since_snapshot = len(events)
+        if events:
+            self.log_seq = max(self.log_seq, events[-1][0] + 1)
+
+    @property
+    def is_dirty(self) -> bool:
+        """True if some writes have not been saved yet."""
+        return bool(self._log) if self.log_ref is not None else bool(self._dirty)
+
+    def pending_changes(self) -> dict:
+        """Builds the multi-path update for everything changed since the tree was last written."""
+        changes = {}
+        # A dirty ancestor already carries its children, and Firebase rejects overlapping paths.
+        for path in sorted(self._dirty, key=len):
+            if any(path.startswith(parent + '/') for parent in changes):
+                continue
+            changes[path] = to_json(self.get(path))
+        return changes
+
+    async def flush(self):
+        """Appends every write since the last flush to the log in a single update() round-trip."""
+        async with self._flush_lock:
+            if self.ended or self.remote:
+                return
+            if self.log_ref is None:
+                # No log for this game: write the dirty paths of the tree directly
+                if self._dirty:
+                    changes = self.pending_changes()
+                    self._dirty.clear()
+                    try:
+                        await self.game_ref.update(changes)
+                    except Exception:
+                        self._dirty.update(changes) # Try again on the next flush
+                        raise
+                    await self._touch()
+                return
+            if not self._log:
+                return
+
+            events, self._log = self._log, []
+            segment = segment_key(self.log_segment)
+            appended = {
+                f"segments/{segment}/{event_key(self.log_seq + i)}": encode_event(path, value)
+                for i, (path, value) in enumerate(events)
+            }
+            appended["head/seq"] = self.log_seq + len(events)
+            # Labelled by the game fields written (e.g. "day_votes"), not by game_logs/<game_id>
+            family = "+".join(sorted({path.partition('/')[0] for path, _ in events}))
+            try:
+                await self.log_ref.update(appended, family)
+            except Exception:
+                self._log = events + self._log # Try again on the next flush, under the same numbers
+                raise
+            self.log_seq += len(events)
+
+            self._since_snapshot += len(events)
+            if self._since_snapshot >= SNAPSHOT_EVERY:
+                await self._snapshot()
+            await self._touch()
+
+    async def _touch(self):
+        """Tells the sweeper the game is alive, at most every ACTIVITY_RESOLUTION seconds."""
+        now = time.time()
+        if now - self._last_touched >= ACTIVITY_RESOLUTION:
+            self._last_touched = now
+            await get_store().reference('game_activity').update({str(self.channel_id): now})
+
+    def flush_soon(self, delay: float = FLUSH_DELAY):
+        """
+        Saves the game in `delay` seconds unless a save is already pending, so every write
+        made until then (e.g. the votes cast in the last seconds of the day) goes in one update.
+        """
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.get_running_loop().create_task(self._flush_later(delay))
+
+    async def _flush_later(self, delay: float):
+        await asyncio.sleep(delay)
+        try:
+            await self.flush()
+        except Exception as e:
+            # The writes stay queued in memory; the next flush will retry them
+            print(f"Could not save game {self.channel_id}: {e}")
+
+    async def _snapshot(self):
+        """Brings the game tree up to date and starts a new log segment. Needs the flush lock."""
+        changes = self.pending_changes()
+        self._dirty.clear()
+        try:
+            await self.game_ref.update(changes)
+            # Only now that the tree has them can restarts stop replaying the old segment
+            await self.log_ref.update({"head/segment": self.log_segment + 1})
+        except Exception:
+            self._dirty.update(changes) # Written again by the next snapshot, before it moves on
+            raise
+        self.log_segment += 1
+        self._since_snapshot = 0
+
+    def apply(self, changes: "ChangeSet"):
+        """Applies every staged mutation of a ChangeSet at once."""
+        for path, value in changes.items():
+            self.set(path, value)
+
+    async def commit(self, changes: "ChangeSet"):
+        """Applies a ChangeSet and persists it (with any other dirty paths) in one update()."""
+        self.apply(changes)
+        await self.flush()
+
+
+class ChangeSet:
+    """
+    Stages all mutations of one resolution step (a night, a lynch, a role deal).
+    Reads see the staged values layered over the game state, but nothing touches
+    the state until it is applied, so half-resolved steps are never observable.
+    """
+    def __init__(self, state: GameState):
+        self.state = state
+        self._changes = {} # path -> value (None deletes), in write order
+        self._index = None
+
+    @property
+    def index(self) -> GameIndex:
+        """The game's index with the staged writes applied, copied from the state's on first use."""
+        if self._index is None:
+            self._index = self.state.index.copy()
+            for path in self._changes:
+                self._index.on_write(self, path)
+        return self._index
+
+    def set(self, path: str, value):
+        self._changes.pop(path, None) # Re-insert so the latest write is last
+        self._changes[path] = value
+        if self._index is not None:
+            self._index.on_write(self, path)
+
+    def delete(self, path: str):
+        self.set(path, None)
+
+    def get(self, path: str, default=None):
+        """Reads a single path, preferring the most recent staged write that covers it."""
+        for staged in reversed(self._changes):
+            if staged == path:
+                value = self._changes[staged]
+                return default if value is None else value
+            if path.startswith(staged + '/'):
+                node = self._changes[staged]
+                for key in path[len(staged) + 1:].split('/'):
+                    if not isinstance(node, dict) or key not in node:
+                        return default
+                    node = node[key]
+                return node
+        return self.state.get(path, default)
+
+    def items(self):
+        return self._changes.items()
+
+    def __len__(self):
+        return len(self._changes)
+
+
+_states = {} # channel_id -> GameState for every game this process has touched
+_mirrors = {} # channel_id -> remote GameState mirroring a game another process owns
+
+def get_game_ref(channel_id: int):
+    """Gets the async store reference for a game in a specific channel."""
+    store = get_store()
+    if not store:
+        return None
+    return store.reference('games').child(str(channel_id))
+
+def cached_game_state(channel_id: int):
+    """Returns the GameState for a channel if it is already in memory, without touching Firebase."""
+    return _states.get(channel_id)
+
+async def load_game_state(channel_id: int):
+    """Returns the cached GameState for a channel, downloading it once if needed."""
+    state = _states.get(channel_id)
+    if state is not None:
+        return state
+
+    state = await _download_game_state(channel_id)
+    # Another command may have loaded it while we were waiting on Firebase
+    if channel_id in _states:
+        return _states[channel_id]
+    if state is not None:
+        _states[channel_id] = state
+    return state
+
+async def mirror_game_state(channel_id: int):
+    """
+    A read-only copy of a game another process owns (see cluster.py). It is downloaded
+    once, then kept current by streaming the game's log, so every later read is local.
+    Its writes must go to the owner.
+    """
+    state = _mirrors.get(channel_id)
+    if state is not None:
+        return state
+    state = await _download_game_state(channel_id)
+    if state is None:
+        return None
+    state.remote = True
+    if state.log_ref is None:
+        return state # Nothing to stream for games without a log: a fresh copy every time
+    if channel_id in _mirrors:
+        return _mirrors[channel_id]
+    _mirrors[channel_id] = state
+    # The first event is the whole log, so whatever was appended since the download is caught up
+    state._subscription = await state.log_ref.listen(lambda event: _on_log_event(state, event))
+    return state
+
+def forget_mirror(channel_id: int):
+    """Stops mirroring a game, e.g. because it ended or this process took it over."""
+    state = _mirrors.pop(channel_id, None)
+    if state is not None:
+        state.ended = True
+        if state._subscription is not None:
+            asyncio.create_task(state._subscription.close())
+
+def _on_log_event(state: GameState, event):
+    """Applies the log entries a streamed event carries to a mirror, in log order."""
+    items = event.data.items() if event.event_type == "patch" else [("", event.data)]
+    for key, data in items:
+        for keys, value in _log_nodes(f"{event.path}/{key}", data):
+            if keys[0] == "segments" and len(keys) == 3 and value is not None:
+                state._pending[int(keys[2][1:])] = decode_event(value)
+            elif keys[0] == "ended_at" and value:
+                forget_mirror(state.channel_id)
+                state._notify('')
+                return
+    while state.log_seq in state._pending:
+        state.apply_remote(*state._pending.pop(state.log_seq))
+        state.log_seq += 1
+    for seq in [seq for seq in state._pending if seq < state.log_seq]:
+        del state._pending[seq] # Already in the snapshot we downloaded
+
+def _log_nodes(path: str, data):
+    """(keys, value) for each top-level log node and single log entry in a streamed event."""
+    keys = [key for key in path.split('/') if key]
+    if not keys or (keys[0] == "segments" and len(keys) < 3):
+        if isinstance(data, dict):
+            for key, child in data.items():
+                yield from _log_nodes('/'.join(keys + [key]), child)
+        return
+    yield keys, data
+
+async def _download_game_state(channel_id: int):
+    game_ref = get_game_ref(channel_id)
+    if not game_ref:
+        return None
+    data = await game_ref.get()
+
+    log_ref, head, tail = None, None, None
+    if data and data.get("game_id"):
+        # The tree is the latest snapshot; the current log segment has everything since
+        log_ref = get_log_ref(data["game_id"])
+        head = await log_ref.child("head").get() or {}
+        tail = await log_ref.child(f"segments/{segment_key(head.get('segment', 0))}").get()
+
+    if not data:
+        return None
+    state = GameState(channel_id, data, game_ref, log_ref, head)
+    state.replay(segment_events(tail))
+    return state
+
+async def create_game_state(channel_id: int, data: dict):
+    """Creates and persists the state for a brand-new game."""
+    game_ref = get_game_ref(channel_id)
+    if not game_ref:
+        return None
+    created_at = time.time()
+    data["game_id"] = f"{channel_id}-{int(created_at * 1000)}"
+    log_ref = get_log_ref(data["game_id"])
+    state = _states[channel_id] = GameState(channel_id, data, game_ref, log_ref)
+    await asyncio.gather(
+        game_ref.set(copy.deepcopy(data)),
+        get_store().reference('game_activity').child(str(channel_id)).set(created_at),
+        log_ref.set({
+            "channel_id": channel_id,
+            "created_at": created_at,
+            "base": copy.deepcopy(data),
+            "head": {"segment": 0, "seq": 0},
+        }),
+    )
+    return state
+
+def forget_game_state(channel_id: int):
+    """Drops a game from memory without saving or deleting anything, once another process owns it."""
+    state = _states.pop(channel_id, None)
+    if state is not None:
+        state.ended = True
+        state._notify('') # Wake anything waiting on this game so it can stop
+
+async def discard_game_state(channel_id: int, outcome: str = "ended"):
+    """
+    Ends a game: drops it from memory and deletes its tree from Firebase. Its log is
+    kept, marked with `outcome` (the winner, or why the game stopped), and archived.
+    """
+    state = _states.pop(channel_id, None)
+    if state is not None:
+        await state.flush() # The log keeps the game's final moments
+        state.ended = True
+        state._notify('') # Wake anything waiting on this game so it can stop
+    store = get_store()
+    if not store:
+        return
+    # The game, its index entry and (see cluster.py) lease and inbox go; its log is kept until LOG_TTL
+    ended_at = time.time()
+    deletes = {f"games/{channel_id}": None, f"game_activity/{channel_id}": None, f"leases/{channel_id}": None, f"game_inbox/{channel_id}": None}
+    if state is not None and state.log_ref is not None:
+        game_id = state.get("game_id")
+        deletes[f"game_logs/{game_id}/ended_at"] = ended_at
+        deletes[f"game_logs/{game_id}/outcome"] = outcome
+        deletes[f"ended_logs/{game_id}"] = ended_at
+    await store.update("", deletes)
+    if state is not None and state.log_ref is not None:
+        archive_soon(game_id, to_json(state.data))
@@ -0,0 +1,123 @@
+import asyncio
+import bisect
+import copy
+from .store import get_store
+from .engine import Role, faction_of
+
+# Who won what, per player and per guild, kept up to date as each game ends so that
+# `/ww stats` and `/ww leaderboard` never go through past games:
+#
+#   player_stats/<guild_id>/<user_id>  {"name", "games", "wins", "roles": {role: {"games", "wins"}}, "teams": {...}}
+#   guild_stats/<guild_id>             {"games", "outcomes": {outcome: games}}
+#
+# A guild's aggregates are read once per process and then kept in memory, along with
+# its players' ranking. A guild's games and commands all go through the
+# process holding its shard (see cluster.py), so that copy stays current, and each
+# game end writes back only the entries of the players who were in it.
+
+LEADERBOARD_SIZE = 10
+
+# Play for themselves: they neither win nor lose with the village
+NEUTRAL_ROLES = (Role.JESTER.value, Role.EXECUTIONER.value, Role.ARSONIST.value)
+# Outcomes (see discard_game_state) won by whoever held one role
+SOLO_WINS = {"arsonist": Role.ARSONIST.value, "jester": Role.JESTER.value, "executioner": Role.EXECUTIONER.value}
+
+
+def team_of(role: str) -> str:
+    return "neutral" if role in NEUTRAL_ROLES else faction_of(role)
+
+def winners_of(game, outcome: str) -> set:
+    """The players who won a game that ended with `outcome` (a winner from find_winner, "jester" or "executioner")."""
+    player_states = game.get("player_states", {})
+    if outcome == "lovers":
+        return {pid for pid, pstate in player_states.items() if pstate.get("is_alive")} # Only the two of them are left
+    if outcome in SOLO_WINS:
+        return {pid for pid, pstate in player_states.items() if pstate.get("role") == SOLO_WINS[outcome]}
+    return {pid for pid, pstate in player_states.items() if team_of(pstate.get("role")) == outcome}
+
+
+class GuildStats:
+    """One guild's aggregates, and its players ranked by wins, then fewest games played."""
+    def __init__(self, players: dict, totals: dict):
+        self.players = players # user_id -> player_stats entry; replaced, never modified, once written
+        self.totals = totals
+        # (-wins, games, user_id) of every player, best first. A loss moves a player down,
+        # so anyone may pass anyone: the whole guild is kept in order, not just its top.
+        self.ranking = sorted(self._rank_key(user_id) for user_id in players)
+        self.lock = asyncio.Lock() # One game end at a time, so none works from a stale copy
+
+    def _rank_key(self, user_id: str) -> tuple:
+        entry = self.players[user_id]
+        return (-entry.get("wins", 0), entry.get("games", 0), user_id)
+
+    def recorded(self, user_id: str, name: str, role: str, won: bool) -> dict:
+        """A copy of a player's entry with one more game added to it."""
+        entry = copy.deepcopy(self.players.get(user_id)) or {"games": 0, "wins": 0}
+        entry["name"] = name
+        by_role = entry.setdefault("roles", {}).setdefault(role, {"games": 0, "wins": 0})
+        by_team = entry.setdefault("teams", {}).setdefault(team_of(role), {"games": 0, "wins": 0})
+        for counts in (entry, by_role, by_team):
+            counts["games"] += 1
+            counts["wins"] += won
+        return entry
+
+    def apply(self, entries: dict, totals: dict):
+        """Takes in new entries (from recorded()) and totals once they are saved."""
+        for user_id, entry in entries.items():
+            if user_id in self.players:
+                old_key = self._rank_key(user_id)
+                del self.ranking[bisect.bisect_left(self.ranking, old_key)]
+            self.players[user_id] = entry
+            bisect.insort(self.ranking, self._rank_key(user_id))
+        self.totals = totals
+
+    def leaderboard(self) -> list:
+        """[(user_id, entry), ...] for the best players, best first."""
+        return [(user_id, self.players[user_id]) for _, _, user_id in self.ranking[:LEADERBOARD_SIZE]]
+
+
+_guilds = {} # guild_id -> task loading its GuildStats; awaiting a finished one is instant
+
+def cached_guild_stats(guild_id: int):
+    """A guild's stats if this process has already loaded them, else None."""
+    task = _guilds.get(guild_id)
+    return task.result() if task is not None and task.done() and not task.exception() else None
+
+async def guild_stats(guild_id: int) -> GuildStats:
+    task = _guilds.get(guild_id)
+    if task is None or (task.done() and task.exception()):
+        task = _guilds[guild_id] = asyncio.ensure_future(_load_guild_stats(guild_id))
+    return await task
+
+async def _load_guild_stats(guild_id: int) -> GuildStats:
+    store = get_store()
+    if not store:
+        return GuildStats({}, {})
+    players, totals = await asyncio.gather(store.get(f"player_stats/{guild_id}"), store.get(f"guild_stats/{guild_id}"))
+    return GuildStats(players or {}, totals or {})
+
+async def record_game_result(game, outcome: str):
+    """Adds a finished game to its guild's and players' stats."""
+    guild_id = game.get("guild_id")
+    if not guild_id:
+        return
+    stats = await guild_stats(guild_id)
+    winners = winners_of(game, outcome)
+    players = game.get("players", {})
+    async with stats.lock:
+        # Built on copies: the cached stats only change once the store has them
+        entries = {
+            pid: stats.recorded(pid, players.get(pid, {}).get("name", "Unknown"), pstate.get("role") or "Unknown", pid in winners)
+            for pid, pstate in game.get("player_states", {}).items()
+        }
+        totals = copy.deepcopy(stats.totals)
+        totals["games"] = totals.get("games", 0) + 1
+        outcomes = totals.setdefault("outcomes", {})
+        outcomes[outcome] = outcomes.get(outcome, 0) + 1
+
+        store = get_store()
+        if store:
+            updates = {f"player_stats/{guild_id}/{pid}": entry for pid, entry in entries.items()}
+            updates[f"guild_stats/{guild_id}"] = totals
+            await store.update("", updates)
+        stats.apply(entries, totals)
@@ -0,0 +1,132 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from firebase_config import get_db
+from .metrics import store_calls, store_seconds, path_family
+
+# The firebase_admin Realtime Database client is synchronous: every get/set is a
+# blocking HTTP round-trip. Running those on the discord.py event loop stalls
+# heartbeats and every other channel's interactions, so all database I/O goes
+# through a GameStore, which runs it on a small bounded thread pool instead.
+
+STORE_MAX_WORKERS = 8 # Upper bound on concurrent Firebase requests per process
+
+
+class GameStore:
+    """Async facade over a Firebase reference tree (get/set/update/delete/transaction)."""
+    def __init__(self, root, max_workers: int = STORE_MAX_WORKERS):
+        self.root = root
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ww-store")
+
+    def _ref(self, path: str):
+        return self.root.child(path) if path else self.root
+
+    async def _run(self, op: str, family: str, func, *args):
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        outcome = "error"
+        try:
+            result = await loop.run_in_executor(self._executor, func, *args)
+            outcome = "ok"
+            return result
+        finally:
+            store_seconds.observe(time.perf_counter() - started, op=op, path=family)
+            store_calls.inc(op=op, path=family, outcome=outcome)
+
+    async def get(self, path: str = "", shallow: bool = False):
+        """Reads a path; `shallow` returns only the child keys, not their subtrees."""
+        ref = self._ref(path)
+        return await self._run("get", path_family(path), lambda: ref.get(shallow=shallow))
+
+    async def set(self, path: str, value):
+        await self._run("set", path_family(path), self._ref(path).set, value)
+
+    async def update(self, path: str, values: dict, family: str = None):
+        """
+        Multi-path update: keys may be nested paths, a value of None deletes that path.
+        `family` labels the call in the metrics when its path doesn't say what it writes.
+        """
+        if values:
+            await self._run("update", family or path_family(path, values), self._ref(path).update, values)
+
+    async def delete(self, path: str):
+        await self._run("delete", path_family(path), self._ref(path).delete)
+
+    async def transaction(self, path: str, update_fn):
+        """Atomically read-modify-writes `path`; `update_fn` may be retried on contention."""
+        return await self._run("transaction", path_family(path), self._ref(path).transaction, update_fn)
+
+    async def listen(self, path: str, callback) -> "Subscription":
+        """
+        Streams `path`: `callback(event)` runs on the event loop with its current value (a
+        "put" at "/"), then with every change as Firebase sends it ("put" or "patch", with
+        `event.path` relative to `path`). Nothing is re-downloaded to learn about a change.
+        """
+        loop = asyncio.get_running_loop()
+
+        def deliver(event):
+            # Firebase calls back from its own thread
+            if not loop.is_closed():
+                loop.call_soon_threadsafe(callback, event)
+
+        registration = await self._run("listen", path_family(path), self._ref(path).listen, deliver)
+        return Subscription(self, registration)
+
+    def reference(self, path: str = "") -> "StoreRef":
+        return StoreRef(self, path)
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+
+
+class Subscription:
+    """A running listen(); close() ends the stream."""
+    def __init__(self, store: GameStore, registration):
+        self.store = store
+        self.registration = registration
+
+    async def close(self):
+        # Closing joins firebase_admin's streaming thread, so keep it off the event loop
+        await self.store._run("unlisten", "listeners", self.registration.close)
+
+
+class StoreRef:
+    """An awaitable stand-in for firebase_admin's db.Reference, bound to a GameStore."""
+    def __init__(self, store: GameStore, path: str = ""):
+        self.store = store
+        self.path = path.strip("/")
+
+    def child(self, path: str) -> "StoreRef":
+        path = str(path).strip("/")
+        return StoreRef(self.store, f"{self.path}/{path}" if self.path else path)
+
+    async def get(self, shallow: bool = False):
+        return await self.store.get(self.path, shallow)
+
+    async def set(self, value):
+        await self.store.set(self.path, value)
+
+    async def update(self, values: dict, family: str = None):
+        await self.store.update(self.path, values, family)
+
+    async def delete(self):
+        await self.store.delete(self.path)
+
+    async def transaction(self, update_fn):
+        return await self.store.transaction(self.path, update_fn)
+
+    async def listen(self, callback) -> Subscription:
+        return await self.store.listen(self.path, callback)
+
+
+_store = None
+
+def get_store():
+    """Returns the process-wide GameStore, or None if the database is not connected."""
+    global _store
+    if _store is None:
+        root = get_db()
+        if root is None:
+            return None
+        _store = GameStore(root)
+    return _store
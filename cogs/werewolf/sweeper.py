@@ -0,0 +1,145 @@
+import asyncio
+import time
+from .store import get_store
+from .eventlog import archive_game_log, archive_soon
+from .state import forget_game_state, cached_game_state
+from .actor import apply_to_game
+from .cluster import CLUSTERED, lease_is_free
+from .core import GamePhase, is_game_running, running_games
+
+# Nothing else removes a game that nobody finishes: a lobby nobody starts, or a game
+# whose loop died with its process and whose channel is gone. The sweeper finds them
+# through a small index, so of `games/` it only ever reads the keys:
+#
+#   game_activity/<channel_id>  unix time of the game's last save (see GameState.flush)
+#   ended_logs/<game_id>        unix time the game ended; its log is kept until LOG_TTL
+#
+# A log is only deleted once it is in the archive (see archive.py): games normally
+# archive themselves as they end, and the sweeper catches the ones that did not.
+#
+# Games that are still running are compacted instead: a per-phase subtree left behind
+# outside its phase (say, a loop resumed past the step that clears it) is deleted, so
+# it is not downloaded with the game until the game ends. Only the process running a
+# game does this, through the game's actor, so nothing is removed while in use.
+#
+# Every SWEEP_INTERVAL it expires at most SWEEP_BATCH_SIZE games and logs, oldest first,
+# so a backlog is worked off over a few passes instead of in one burst of deletes.
+# In a cluster, each process sweeps the channels it can see.
+
+LOBBY_TTL = 2 * 60 * 60      # Seconds a lobby may sit without anyone joining or changing settings
+GAME_TTL = 24 * 60 * 60      # Seconds a started game may go without a save before it counts as stuck
+LOG_TTL = 30 * 24 * 60 * 60  # Seconds the log of an ended game is kept, for disputes
+SWEEP_INTERVAL = 10 * 60     # Seconds between two sweeps
+SWEEP_BATCH_SIZE = 50        # Games (and, separately, logs and compacted games) per sweep at most
+
+# Subtrees only read during some phases -> those phases
+PHASE_SUBTREES = {
+    "night_actions": (GamePhase.NIGHT.value,),
+    "day_votes": (GamePhase.DAY.value, GamePhase.VOTING.value),
+}
+
+def leftover_subtrees(state) -> list:
+    """The per-phase subtrees a game still holds outside their phase."""
+    phase = state.get("phase")
+    return [path for path, phases in PHASE_SUBTREES.items() if phase not in phases and state.get(path)]
+
+def _compact(state):
+    for path in leftover_subtrees(state):
+        state.delete(path)
+
+
+async def sweep_stale_games(bot, now: float = None) -> dict:
+    """Runs one sweep. Returns how many lobbies, stuck games, orphaned entries and old logs it removed, and how many games it compacted."""
+    store = get_store()
+    if not store:
+        return {}
+    now = now or time.time()
+    removed = {"lobbies": 0, "games": 0, "orphans": 0, "logs": 0, "compacted": 0}
+
+    for channel_id in running_games():
+        if removed["compacted"] >= SWEEP_BATCH_SIZE:
+            break
+        state = cached_game_state(channel_id)
+        if state is None or not leftover_subtrees(state):
+            continue
+        # Re-checked on the actor, after whatever the game has queued; saved with flush_soon()
+        if await apply_to_game(state, _compact):
+            removed["compacted"] += 1
+
+    activity, leases, channel_ids = await asyncio.gather(
+        store.get("game_activity"), store.get("leases"), store.get("games", shallow=True)
+    )
+    activity, leases = activity or {}, leases or {}
+    deletes = {}
+    expired = [] # Game ids whose logs to archive once they are marked ended
+    # Games saved before the index existed start their clock now
+    for cid in channel_ids or {}:
+        if cid not in activity:
+            deletes[f"game_activity/{cid}"] = now
+    candidates = sorted(
+        (last_active, cid) for cid, last_active in activity.items()
+        if now - last_active > LOBBY_TTL # The shortest TTL: nothing newer can be stale
+    )
+    for last_active, cid in candidates:
+        if removed["lobbies"] + removed["games"] + removed["orphans"] >= SWEEP_BATCH_SIZE:
+            break
+        channel_id = int(cid)
+        if is_game_running(channel_id) or not lease_is_free(leases.get(cid), now):
+            continue # A live loop somewhere: it will end the game itself
+        if CLUSTERED and not bot.get_channel(channel_id):
+            continue # Another process's lobby, or a game it may still adopt
+
+        phase, game_id = await asyncio.gather(store.get(f"games/{cid}/phase"), store.get(f"games/{cid}/game_id"))
+        if phase is None:
+            deletes[f"game_activity/{cid}"] = None # The game is gone; only its index entry was left
+            removed["orphans"] += 1
+            continue
+        ttl = LOBBY_TTL if phase == "WAITING" else GAME_TTL
+        if now - last_active <= ttl:
+            continue
+
+        forget_game_state(channel_id) # Commands on a cached copy now find no game
+        deletes.update({f"games/{cid}": None, f"game_activity/{cid}": None, f"leases/{cid}": None, f"game_inbox/{cid}": None})
+        if game_id:
+            deletes[f"game_logs/{game_id}/ended_at"] = now
+            deletes[f"game_logs/{game_id}/outcome"] = "expired"
+            deletes[f"ended_logs/{game_id}"] = now
+            expired.append(game_id)
+        removed["lobbies" if phase == "WAITING" else "games"] += 1
+
+    # Logs of ended games, once nobody will ask about them anymore
+    ended = await store.get("ended_logs") or {}
+    for ended_at, game_id in sorted((ended_at, game_id) for game_id, ended_at in ended.items() if now - ended_at > LOG_TTL)[:SWEEP_BATCH_SIZE]:
+        if not await store.get(f"game_logs/{game_id}/archived_at"):
+            try:
+                await archive_game_log(game_id)
+            except Exception as e:
+                print(f"Could not archive game {game_id}, keeping its log: {e}")
+                continue
+        deletes[f"game_logs/{game_id}"] = None
+        deletes[f"ended_logs/{game_id}"] = None
+        removed["logs"] += 1
+
+    await store.update("", deletes)
+    for game_id in expired:
+        archive_soon(game_id)
+    if any(removed.values()):
+        print(f"Swept {removed['lobbies']} lobbies, {removed['games']} stuck games, {removed['orphans']} orphaned entries and {removed['logs']} old logs, and compacted {removed['compacted']} games.")
+    return removed
+
+
+_sweeper = None
+
+def start_sweeper(bot):
+    """Starts sweeping in the background, once per process."""
+    global _sweeper
+    if _sweeper is None or _sweeper.done():
+        _sweeper = asyncio.create_task(_sweep_forever(bot))
+
+async def _sweep_forever(bot):
+    while True:
+        try:
+            await sweep_stale_games(bot)
+        except Exception as e:
+            print(f"Could not sweep stale games: {e}")
+        await asyncio.sleep(SWEEP_INTERVAL)
@@ -1,218 +1,569 @@
 import discord
+import time
+import weakref
+from .core import GamePhase, Role
+from .engine import cast_vote
+from .state import load_game_state, mirror_game_state
+from .scheduler import DEFAULT_PHASE_TIMERS, mark_submitted, phase_timeout
+from .actor import apply_to_game
+from .cluster import owns_game
+from .metrics import observe_ack
 
 # This file will contain all the discord.ui.View classes for interactive components,
 # like night action selection menus and voting buttons.
-
-class ActionSelect(discord.ui.Select):
-    """A stylish select menu for choosing a player to perform an action on."""
-    def __init__(self, game_ref, acting_player_id, action_type: str, players: list, *args, **kwargs):
-        self.game_ref = game_ref
-        self.acting_player_id = acting_player_id
-        self.action_type = action_type # e.g., 'werewolf_vote', 'seer_pick'
-        
-        options = [
-            discord.SelectOption(label=player['name'], value=player['id'], description=f"Select {player['name']}")
-            for player in players
-        ]
-        super().__init__(placeholder="Choose your target, my dear...", min_values=1, max_values=1, options=options, *args, **kwargs)
+#
+# Every write goes through the game's actor (apply_to_game), so simultaneous clicks
+# are applied one after another and clicks on a finished game are turned away.
+#
+# Game prompts (night actions, votes, the witch, the veteran...) are built from
+# DynamicItems: everything a click needs is in its custom_id,
+#
+#   ww:<kind>:<game_id>:<round>:<actor_id>[:<args>...]
+#
+# and one registered handler per kind (see DYNAMIC_ITEMS) serves every game. No
+# view object stays in memory once a prompt is sent, ids can't collide between
+# games, and prompts keep working after a restart. <round> is the night number, so
+# a prompt from an earlier night or day is turned away instead of recorded.
+
+STALE_GAME_MESSAGE = "This game is already over, my dear... that moment has passed. 🍂"
+
+def game_key(state) -> str:
+    """What prompts call a game: its game_id, or the channel for games started before game ids."""
+    return state.get("game_id") or str(state.channel_id)
+
+def prompt_fields(state, actor_id) -> tuple:
+    """The (game, round, actor) every prompt custom_id starts with."""
+    return game_key(state), str(state.get("game_state/night_number", 0)), str(actor_id)
+
+def prompt_id(kind: str, fields: tuple, *args) -> str:
+    return ":".join(["ww", kind, *fields, *map(str, args)])
+
+def _template(kind: str, args: str = "") -> str:
+    return rf"ww:{kind}:(?P<game>[0-9-]+):(?P<round>\d+):(?P<actor>\d+){args}"
+
+
+async def respond(interaction: discord.Interaction, content: str, **kwargs):
+    """Replies privately to the player, whether or not the interaction was already acknowledged."""
+    if interaction.response.is_done():
+        await interaction.followup.send(content, ephemeral=True, **kwargs)
+    else:
+        await interaction.response.send_message(content, ephemeral=True, **kwargs)
+        observe_ack(interaction, "reply")
+
+async def reject(interaction: discord.Interaction, content: str):
+    """Tells only the player why their command failed, replacing the public "thinking..." of a deferred command."""
+    if interaction.response.is_done():
+        await interaction.delete_original_response()
+        await interaction.followup.send(content, ephemeral=True)
+    else:
+        await interaction.response.send_message(content, ephemeral=True)
+
+
+class PromptItem:
+    """What every game prompt item shares: its parsed custom_id and the checks before acting on it."""
+    def _bind(self, game: str, round: str, actor: str):
+        self.game = game
+        self.round = round
+        self.actor_id = actor
+
+    @classmethod
+    async def from_custom_id(cls, interaction: discord.Interaction, item, match):
+        return cls(item, **match.groupdict())
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        return str(interaction.user.id) == self.actor_id
+
+    async def load_game(self, interaction: discord.Interaction, phase: GamePhase):
+        """
+        Acknowledges the click, then finds the game this prompt belongs to. Returns None
+        (and tells the player) if its moment has passed.
+        """
+        # Discord wants an answer within 3 seconds, and loading a game after a restart or
+        # waiting behind other commands on its actor can take longer than that
+        if not interaction.response.is_done():
+            await interaction.response.defer()
+            observe_ack(interaction, "prompt")
+        channel_id = int(self.game.split('-')[0])
+        # Clicks in DMs can reach a process other than the game's owner, which forwards them
+        state = await (load_game_state(channel_id) if owns_game(channel_id) else mirror_game_state(channel_id))
+        if (
+            state is None or state.ended or game_key(state) != self.game
+            or state.get("phase") != phase.value
+            or str(state.get("game_state/night_number", 0)) != self.round
+        ):
+            await respond(interaction, STALE_GAME_MESSAGE)
+            return None
+        return state
+
+    async def close_prompt(self, interaction: discord.Interaction):
+        """Greys out the whole prompt once the player has made their choice."""
+        for item in self.view.children:
+            # The clicked item is one of ours, wrapping the actual component
+            (item.item if isinstance(item, discord.ui.DynamicItem) else item).disabled = True
+        self.view.stop() # Nothing to listen for, so discord.py doesn't keep the view around
+        await interaction.edit_original_response(view=self.view)
+
+
+class PromptView(discord.ui.View):
+    """A prompt made only of dynamic items: nothing of it is kept in memory once it is sent."""
+    def __init__(self, items: list):
+        super().__init__(timeout=None)
+        for item in items:
+            self.add_item(item)
+
+
+# --- Target pickers ---
+#
+# Discord caps a select menu at 25 options, so big lobbies get their targets one
+# page at a time, with buttons to turn the page and to search by name. The options
+# themselves are built once per phase (alive_targets) and shared by every prompt.
+
+OPTIONS_PER_PAGE = 25 # Discord's limit for one select menu
+
+class TargetList:
+    """The players a picker can choose from, with their SelectOptions built once per wording."""
+    def __init__(self, players: list):
+        self.players = players # [{"id": ..., "name": ...}]
+        self._options = {} # description template -> [SelectOption]
+        self._source = None # The TargetList this one was cut from, whose options we reuse
+        self._hidden = frozenset()
+        self._cuts = {} # frozenset of excluded ids -> TargetList, so e.g. every wolf shares one
+
+    def __len__(self):
+        return len(self.players)
+
+    def excluding(self, *player_ids) -> "TargetList":
+        """The same targets minus some players (e.g. the acting player), sharing the same options."""
+        hidden = frozenset(player_ids)
+        targets = self._cuts.get(hidden)
+        if targets is None:
+            targets = self._cuts[hidden] = TargetList([player for player in self.players if player['id'] not in hidden])
+            targets._source, targets._hidden = self, hidden
+        return targets
+
+    def options(self, describe: str) -> list:
+        """SelectOptions for every target, described with `describe.format(name=...)`."""
+        options = self._options.get(describe)
+        if options is None:
+            if self._source is not None:
+                options = [option for option in self._source.options(describe) if option.value not in self._hidden]
+            else:
+                options = [
+                    discord.SelectOption(label=player['name'], value=player['id'], description=describe.format(name=player['name']))
+                    for player in self.players
+                ]
+            self._options[describe] = options
+        return options
+
+
+_alive_targets = weakref.WeakKeyDictionary() # GameState -> (alive_version, TargetList)
+
+def alive_targets(state) -> TargetList:
+    """The living players, in join order. Built once and shared by every prompt until someone dies."""
+    key = state.index.alive_version
+    cached = _alive_targets.get(state)
+    if cached and cached[0] == key:
+        return cached[1]
+    alive = state.index.alive
+    targets = TargetList([
+        {"id": pid, "name": pdata["name"]}
+        for pid, pdata in state.get("players", {}).items()
+        if pid in alive
+    ])
+    _alive_targets[state] = (key, targets)
+    return targets
+
+
+class PickerAction:
+    """How one kind of pick reads and is recorded."""
+    def __init__(self, placeholder: str, describe: str, feedback: str, phase: GamePhase = GamePhase.NIGHT, picks: int = 1):
+        self.placeholder = placeholder
+        self.describe = describe # Option description, formatted with the target's name
+        self.feedback = feedback # Sent to the player once their pick is recorded
+        self.phase = phase
+        self.picks = picks
+
+_CHOSEN = "You have chosen your target... The spirits have heard your wish. ✨"
+
+PICKER_ACTIONS = {
+    'werewolf_vote': PickerAction("Choose your target, my dear...", "Select {name}", _CHOSEN),
+    'seer_pick': PickerAction("Choose your target, my dear...", "Select {name}", _CHOSEN),
+    'sorcerer_pick': PickerAction("Choose your target, my dear...", "Select {name}", _CHOSEN),
+    'doctor_save': PickerAction("Choose your target, my dear...", "Select {name}", _CHOSEN),
+    'bodyguard_protect': PickerAction("Choose your target, my dear...", "Select {name}", _CHOSEN),
+    'arsonist_douse': PickerAction("Choose your target, my dear...", "Select {name}", _CHOSEN),
+    'witch_kill': PickerAction("Choose your target, my dear...", "Select {name}", _CHOSEN),
+    'cupid': PickerAction(
+        "Choose two players to link with love's arrow...", "Select {name} as a lover.",
+        "Your arrow has struck true! A new love story begins... or ends? 💘", picks=2
+    ),
+    'day_vote': PickerAction(
+        "Choose who to vote for...", "Vote to lynch {name}",
+        "Your vote has been cast... The village is watching. 👀", phase=GamePhase.DAY
+    ),
+}
+
+def targets_for(state, actor_id: str, action: str) -> TargetList:
+    """Who `actor_id` may pick for `action`: the living, minus whoever the rules leave out."""
+    targets = alive_targets(state)
+    if action == 'werewolf_vote':
+        return targets.excluding(*state.index.with_role(Role.WEREWOLF.value, alive=True))
+    if action in ('arsonist_douse', 'day_vote'):
+        return targets.excluding(actor_id) # No dousing or voting for yourself
+    return targets
+
+def picker_items(state, actor_id: str, action: str, page: int = 0, query: str = "") -> list:
+    """
+    The items of a target picker showing one page of targets (or the first page of
+    those whose name contains `query`), with page and search buttons when it needs them.
+    """
+    spec = PICKER_ACTIONS[action]
+    options = targets_for(state, actor_id, action).options(spec.describe)
+    paged = len(options) > OPTIONS_PER_PAGE
+    if query:
+        options = [option for option in options if query.lower() in option.label.lower()]
+    page_count = max(1, -(-len(options) // OPTIONS_PER_PAGE))
+    page %= page_count
+    shown = options[page * OPTIONS_PER_PAGE:(page + 1) * OPTIONS_PER_PAGE]
+
+    placeholder = spec.placeholder
+    if query:
+        placeholder = f"{placeholder} (\"{query}\")"
+    elif page_count > 1:
+        placeholder = f"{placeholder} ({page + 1}/{page_count})"
+    # Two lovers on one page are one pick; across pages they may take two
+    min_values = spec.picks if not paged else 1
+    fields = prompt_fields(state, actor_id)
+    select = discord.ui.Select(
+        custom_id=prompt_id("pick", fields, action, page), placeholder=placeholder,
+        min_values=min(min_values, len(shown)), max_values=min(spec.picks, len(shown)), options=shown
+    )
+    items = [TargetSelect(select, *fields, action, str(page))]
+    if paged:
+        if not query:
+            items.append(PageButton.build(fields, action, (page - 1) % page_count, "p"))
+            items.append(PageButton.build(fields, action, (page + 1) % page_count, "n"))
+        items.append(SearchButton.build(fields, action))
+    return items
+
+
+class TargetSelect(PromptItem, discord.ui.DynamicItem[discord.ui.Select], template=_template("pick", r":(?P<action>[a-z_]+):(?P<page>\d+)")):
+    """A page of targets. Records the pick for its action and closes the prompt."""
+    def __init__(self, item: discord.ui.Select, game: str, round: str, actor: str, action: str, page: str):
+        super().__init__(item)
+        self._bind(game, round, actor)
+        self.action = action
 
     async def callback(self, interaction: discord.Interaction):
-        # The user has made their choice
-        chosen_player_id = self.values[0]
-        
-        # Store the action in firebase under a 'night_actions' key
-        self.game_ref.child('night_actions').child(self.action_type).child(self.acting_player_id).set(chosen_player_id)
-        
+        spec = PICKER_ACTIONS[self.action]
+        state = await self.load_game(interaction, spec.phase)
+        if not state:
+            return
+        chosen = list(self.item.values)
+        actor_id = self.actor_id
+        lovers = []
+
+        def record(state):
+            if self.action == 'day_vote':
+                # Store the vote in the game state under a 'day_votes' key
+                cast_vote(state, actor_id, chosen[0], time.time())
+            elif self.action == 'cupid':
+                # Lovers on different pages come in two picks; the first waits in the night's actions
+                first = state.get(f'night_actions/cupid_pick/{actor_id}')
+                lovers.extend(dict.fromkeys(([first] if first else []) + chosen))
+                del lovers[:-2]
+                if len(lovers) < 2:
+                    state.set(f'night_actions/cupid_pick/{actor_id}', lovers[0])
+                    return
+                # Store the lovers in a dedicated space in the game state
+                lover1_id, lover2_id = lovers
+                state.set('lovers', {lover1_id: lover2_id, lover2_id: lover1_id})
+                mark_submitted(state, actor_id)
+            else:
+                # Store the action in the game state under a 'night_actions' key
+                state.set(f'night_actions/{self.action}/{actor_id}', chosen[0])
+                mark_submitted(state, actor_id)
+
+        if not await apply_to_game(state, record):
+            await respond(interaction, STALE_GAME_MESSAGE)
+            return
+
+        if self.action == 'cupid' and len(lovers) < 2:
+            first_name = state.get(f"players/{lovers[0]}/name", "Someone")
+            await respond(interaction, f"**{first_name}** it is... now choose their other half. 💘")
+            return
+
         # Give some cute feedback and disable the view
-        await interaction.response.send_message(f"You have chosen your target... The spirits have heard your wish. ✨", ephemeral=True)
-        self.view.stop()
-        for item in self.view.children:
-            item.disabled = True
-        await interaction.message.edit(view=self.view)
+        await respond(interaction, spec.feedback)
+        await self.close_prompt(interaction)
+
+
+class PageButton(PromptItem, discord.ui.DynamicItem[discord.ui.Button], template=_template("page", r":(?P<action>[a-z_]+):(?P<page>\d+):(?P<direction>[pn])")):
+    """Turns a picker to another page. The direction keeps Previous and Next ids apart on two pages."""
+    def __init__(self, item: discord.ui.Button, game: str, round: str, actor: str, action: str, page: str, direction: str):
+        super().__init__(item)
+        self._bind(game, round, actor)
+        self.action = action
+        self.page = int(page)
+
+    @classmethod
+    def build(cls, fields: tuple, action: str, page: int, direction: str) -> "PageButton":
+        button = discord.ui.Button(
+            label="◀ Previous" if direction == "p" else "Next ▶", style=discord.ButtonStyle.secondary,
+            custom_id=prompt_id("page", fields, action, page, direction)
+        )
+        return cls(button, *fields, action, str(page), direction)
 
+    async def callback(self, interaction: discord.Interaction):
+        state = await self.load_game(interaction, PICKER_ACTIONS[self.action].phase)
+        if not state:
+            return
+        await interaction.edit_original_response(view=action_view(state, self.actor_id, self.action, self.page))
+
+
+class SearchButton(PromptItem, discord.ui.DynamicItem[discord.ui.Button], template=_template("find", r":(?P<action>[a-z_]+)")):
+    def __init__(self, item: discord.ui.Button, game: str, round: str, actor: str, action: str):
+        super().__init__(item)
+        self._bind(game, round, actor)
+        self.action = action
+
+    @classmethod
+    def build(cls, fields: tuple, action: str) -> "SearchButton":
+        button = discord.ui.Button(
+            label="Search", style=discord.ButtonStyle.secondary, emoji="🔎",
+            custom_id=prompt_id("find", fields, action)
+        )
+        return cls(button, *fields, action)
 
-class NightActionView(discord.ui.View):
-    """A generic view that holds a night action select menu."""
-    def __init__(self, game_ref, acting_player_id, action_type: str, players: list, *args, **kwargs):
-        super().__init__(timeout=60.0, *args, **kwargs) # 60 second timeout for night actions
-        self.add_item(ActionSelect(game_ref, acting_player_id, action_type, players))
-
-    async def on_timeout(self):
-        # Clean up the message after the timeout
-        for item in self.children:
-            item.disabled = True
-        # You might want to get the original message and edit it.
-        # This requires passing the message object to the view or fetching it. 
-
-class VoteSelect(discord.ui.Select):
-    """A select menu for choosing who to vote to lynch."""
-    def __init__(self, game_ref, acting_player_id, players: list):
-        self.game_ref = game_ref
-        self.acting_player_id = acting_player_id
-        
-        options = [
-            discord.SelectOption(label=player['name'], value=player['id'], description=f"Vote to lynch {player['name']}")
-            for player in players
+    async def callback(self, interaction: discord.Interaction):
+        # A modal has to be the very first answer, so the game is only looked up once it's submitted
+        await interaction.response.send_modal(TargetSearchModal(self))
+        observe_ack(interaction, "prompt")
+
+class TargetSearchModal(discord.ui.Modal, title="Find a player"):
+    query = discord.ui.TextInput(label="Name contains", placeholder="Leave empty to see everyone", required=False, max_length=32)
+
+    def __init__(self, button: SearchButton):
+        super().__init__(timeout=120.0)
+        self.button = button
+
+    async def on_submit(self, interaction: discord.Interaction):
+        button = self.button
+        state = await button.load_game(interaction, PICKER_ACTIONS[button.action].phase)
+        if not state:
+            return
+        query = (self.query.value or "").strip()
+        spec = PICKER_ACTIONS[button.action]
+        matches = [
+            option for option in targets_for(state, button.actor_id, button.action).options(spec.describe)
+            if query.lower() in option.label.lower()
         ]
-        super().__init__(placeholder="Choose who to vote for...", min_values=1, max_values=1, options=options)
+        if not matches:
+            await respond(interaction, "No one here goes by that name, my dear...")
+            return
+        await interaction.edit_original_response(view=action_view(state, button.actor_id, button.action, query=query))
 
-    async def callback(self, interaction: discord.Interaction):
-        chosen_player_id = self.values[0]
-        
-        # Store the vote in Firebase under a 'day_votes' key
-        self.game_ref.child('day_votes').child(self.acting_player_id).set(chosen_player_id)
-        
-        await interaction.response.send_message(f"Your vote has been cast... The village is watching. 👀", ephemeral=True)
-        self.view.stop()
-        for item in self.view.children:
-            item.disabled = True
-        await interaction.message.edit(view=self.view)
 
-class VotingView(discord.ui.View):
+def action_view(state, actor_id: str, action: str, page: int = 0, query: str = "") -> PromptView:
+    """A picker prompt, as first sent or turned to another page."""
+    if action == 'arsonist_douse':
+        return ArsonistActionView(state, actor_id, page, query)
+    return PromptView(picker_items(state, actor_id, action, page, query))
+
+
+# --- Night actions ---
+
+class NightActionView(PromptView):
+    """A generic view that holds a night action select menu."""
+    def __init__(self, state, acting_player_id, action_type: str):
+        super().__init__(picker_items(state, acting_player_id, action_type))
+
+class VotingView(PromptView):
     """A view that holds the voting select menu."""
-    def __init__(self, game_ref, acting_player_id, players: list):
-        super().__init__(timeout=30.0) # 30 second timeout to vote
-        self.add_item(VoteSelect(game_ref, acting_player_id, players))
+    def __init__(self, state, acting_player_id):
+        super().__init__(picker_items(state, acting_player_id, 'day_vote'))
+
+class CupidSelectionView(PromptView):
+    """A view that holds Cupid's unique selection menu."""
+    def __init__(self, state, cupid_id):
+        super().__init__(picker_items(state, cupid_id, 'cupid'))
 
 
-class WitchActionView(discord.ui.View):
+class WitchActionView(PromptView):
     """A highly interactive view for the Witch's night actions."""
-    def __init__(self, game_ref, witch_id, potions: dict, werewolf_target: dict, all_players: list):
-        super().__init__(timeout=30.0)
-        self.game_ref = game_ref
-        self.witch_id = witch_id
-        self.werewolf_target = werewolf_target
-        self.all_players = all_players
-        
+    def __init__(self, state, witch_id, potions: dict, werewolf_target: dict):
+        items = []
         # Add save button if potion is available and there's a target
-        if potions.get("save") and self.werewolf_target:
-            self.add_item(WitchSaveButton(target_name=self.werewolf_target['name']))
-        
+        if potions.get("save") and werewolf_target:
+            items.append(WitchButton.build(state, witch_id, "save", f"Use Save Potion on {werewolf_target['name']}", discord.ButtonStyle.green))
         # Add kill button if potion is available
         if potions.get("kill"):
-            self.add_item(WitchKillButton())
-
-    async def handle_kill_choice(self, interaction: discord.Interaction):
-        """Called by the kill button to show the player selection."""
-        # Clear existing buttons and add a dropdown to choose a kill target
-        self.clear_items()
-        self.add_item(ActionSelect(self.game_ref, self.witch_id, 'witch_kill', self.all_players))
-        await interaction.response.edit_message(content="Such a wicked choice... Who will you kill?", view=self)
-
-
-class WitchSaveButton(discord.ui.Button):
-    def __init__(self, target_name: str):
-        super().__init__(label=f"Use Save Potion on {target_name}", style=discord.ButtonStyle.green, custom_id="witch_save")
+            items.append(WitchButton.build(state, witch_id, "kill", "Use Kill Potion", discord.ButtonStyle.red))
+        # Let the witch end her turn early instead of waiting out the timer
+        items.append(WitchButton.build(state, witch_id, "sleep", "Go Back to Sleep", discord.ButtonStyle.secondary, emoji="🌙"))
+        super().__init__(items)
+
+class WitchButton(PromptItem, discord.ui.DynamicItem[discord.ui.Button], template=_template("witch", r":(?P<choice>save|kill|sleep)")):
+    def __init__(self, item: discord.ui.Button, game: str, round: str, actor: str, choice: str):
+        super().__init__(item)
+        self._bind(game, round, actor)
+        self.choice = choice
+
+    @classmethod
+    def build(cls, state, witch_id: str, choice: str, label: str, style: discord.ButtonStyle, emoji: str = None) -> "WitchButton":
+        fields = prompt_fields(state, witch_id)
+        button = discord.ui.Button(label=label, style=style, emoji=emoji, custom_id=prompt_id("witch", fields, choice))
+        return cls(button, *fields, choice)
 
     async def callback(self, interaction: discord.Interaction):
-        # Save the action to firebase
-        self.view.game_ref.child('night_actions').child('witch_save').set(True)
-        # Mark potion as used
-        self.view.game_ref.child('game_state/witch_potions/save').set(False)
-        
-        await interaction.response.send_message("You've used your save potion. A life is spared... for now.", ephemeral=True)
-        
-        # Disable this button
-        self.disabled = True
-        await interaction.message.edit(view=self.view)
-
-class WitchKillButton(discord.ui.Button):
-    def __init__(self):
-        super().__init__(label="Use Kill Potion", style=discord.ButtonStyle.red, custom_id="witch_kill")
+        state = await self.load_game(interaction, GamePhase.NIGHT)
+        if not state:
+            return
+        witch_id = self.actor_id
+
+        if self.choice == "kill":
+            # Replace the buttons with a dropdown to choose a kill target
+            await interaction.edit_original_response(content="Such a wicked choice... Who will you kill?", view=action_view(state, witch_id, 'witch_kill'))
+            return
+
+        if self.choice == "save":
+            # Without a kill potion left there is nothing more to do tonight
+            done = not state.get('game_state/witch_potions/kill')
+
+            def record(state):
+                # Save the action to the game state
+                state.set('night_actions/witch_save', True)
+                # Mark potion as used
+                state.set('game_state/witch_potions/save', False)
+                if done:
+                    mark_submitted(state, witch_id)
+
+            if not await apply_to_game(state, record):
+                await respond(interaction, STALE_GAME_MESSAGE)
+                return
+            await respond(interaction, "You've used your save potion. A life is spared... for now.")
+            # Disable this button
+            self.item.disabled = True
+            self.view.stop()
+            await interaction.edit_original_response(view=self.view)
+            return
+
+        if not await apply_to_game(state, lambda state: mark_submitted(state, witch_id)):
+            await respond(interaction, STALE_GAME_MESSAGE)
+            return
+        await respond(interaction, "You put your potions away for the night. Sweet dreams, Witch.")
+        await self.close_prompt(interaction)
+
+
+class ArsonistActionView(PromptView):
+    """A view for the Arsonist to choose to douse or ignite."""
+    def __init__(self, state, arsonist_id, page: int = 0, query: str = ""):
+        # The ignite button, then the douse dropdown (which leaves out the arsonist)
+        super().__init__([ArsonistIgniteButton.build(state, arsonist_id)] + picker_items(state, arsonist_id, 'arsonist_douse', page, query))
+
+class ArsonistIgniteButton(PromptItem, discord.ui.DynamicItem[discord.ui.Button], template=_template("ignite")):
+    def __init__(self, item: discord.ui.Button, game: str, round: str, actor: str):
+        super().__init__(item)
+        self._bind(game, round, actor)
+
+    @classmethod
+    def build(cls, state, arsonist_id: str) -> "ArsonistIgniteButton":
+        fields = prompt_fields(state, arsonist_id)
+        button = discord.ui.Button(
+            label="🔥 IGNITE ALL DOUSED TARGETS 🔥", style=discord.ButtonStyle.danger,
+            custom_id=prompt_id("ignite", fields)
+        )
+        return cls(button, *fields)
 
     async def callback(self, interaction: discord.Interaction):
-        # The view will handle replacing this button with a dropdown
-        await self.view.handle_kill_choice(interaction)
-
+        state = await self.load_game(interaction, GamePhase.NIGHT)
+        if not state:
+            return
+        arsonist_id = self.actor_id
 
-class CupidSelect(discord.ui.Select):
-    """A select menu for Cupid to choose two lovers."""
-    def __init__(self, game_ref, cupid_id, players: list):
-        self.game_ref = game_ref
-        self.cupid_id = cupid_id
-        
-        options = [
-            discord.SelectOption(label=player['name'], value=player['id'], description=f"Select {player['name']} as a lover.")
-            for player in players
-        ]
-        # Important: min_values and max_values are 2 for Cupid
-        super().__init__(placeholder="Choose two players to link with love's arrow...", min_values=2, max_values=2, options=options)
+        # The Arsonist has chosen to ignite.
+        def record(state):
+            state.set('night_actions/arsonist_ignite', True)
+            mark_submitted(state, arsonist_id)
 
-    async def callback(self, interaction: discord.Interaction):
-        lover1_id, lover2_id = self.values[0], self.values[1]
-        
-        # Store the lovers in a dedicated space in Firebase
-        self.game_ref.child('lovers').set({lover1_id: lover2_id, lover2_id: lover1_id})
-        
-        await interaction.response.send_message(f"Your arrow has struck true! A new love story begins... or ends? 💘", ephemeral=True)
-        self.view.stop()
-        for item in self.view.children:
-            item.disabled = True
-        await interaction.message.edit(view=self.view)
+        if not await apply_to_game(state, record):
+            await respond(interaction, STALE_GAME_MESSAGE)
+            return
 
-class CupidSelectionView(discord.ui.View):
-    """A view that holds Cupid's unique selection menu."""
-    def __init__(self, game_ref, cupid_id, players: list):
-        super().__init__(timeout=60.0) # Give Cupid a little more time
-        self.add_item(CupidSelect(game_ref, cupid_id, players))
+        await respond(interaction, "The world will burn... Your choice has been sealed.")
+        await self.close_prompt(interaction)
 
 
-class ArsonistActionView(discord.ui.View):
-    """A view for the Arsonist to choose to douse or ignite."""
-    def __init__(self, game_ref, arsonist_id, players: list):
-        super().__init__(timeout=60.0)
-        self.game_ref = game_ref
-        
-        # Add the ignite button
-        self.add_item(ArsonistIgniteButton())
+class VeteranAlertView(PromptView):
+    """A view for the Veteran to choose to go on alert."""
+    def __init__(self, state, veteran_id: str):
+        super().__init__([
+            VeteranButton.build(state, veteran_id, "alert", "Go on Alert", "🛡️"),
+            VeteranButton.build(state, veteran_id, "calm", "Stay Calm", "🌙"),
+        ])
+
+class VeteranButton(PromptItem, discord.ui.DynamicItem[discord.ui.Button], template=_template("vet", r":(?P<choice>alert|calm)")):
+    def __init__(self, item: discord.ui.Button, game: str, round: str, actor: str, choice: str):
+        super().__init__(item)
+        self._bind(game, round, actor)
+        self.choice = choice
+
+    @classmethod
+    def build(cls, state, veteran_id: str, choice: str, label: str, emoji: str) -> "VeteranButton":
+        fields = prompt_fields(state, veteran_id)
+        button = discord.ui.Button(
+            label=label, style=discord.ButtonStyle.secondary, emoji=emoji,
+            custom_id=prompt_id("vet", fields, choice)
+        )
+        return cls(button, *fields, choice)
 
-        # Add the douse dropdown, excluding self
-        douse_options = [p for p in players if p['id'] != arsonist_id]
-        self.add_item(ActionSelect(game_ref, arsonist_id, 'arsonist_douse', douse_options))
+    async def callback(self, interaction: discord.Interaction):
+        state = await self.load_game(interaction, GamePhase.NIGHT)
+        if not state:
+            return
+        veteran_id = self.actor_id
 
+        if self.choice == "alert":
+            def record(state):
+                # Record that the veteran is on alert for the night
+                state.set('night_actions/veteran_alert', veteran_id)
+                # Mark the alert as used
+                state.set('game_state/veteran_alerts_used', True)
+                mark_submitted(state, veteran_id)
+            message = "You have barricaded your house for the night. You will shoot anyone who visits."
+        else:
+            # A veteran who saves their alert for another night
+            def record(state):
+                mark_submitted(state, veteran_id)
+            message = "You decide the night is safe enough. Your alert is saved for another time."
 
-class ArsonistIgniteButton(discord.ui.Button):
-    def __init__(self):
-        super().__init__(label="🔥 IGNITE ALL DOUSED TARGETS 🔥", style=discord.ButtonStyle.danger, custom_id="arsonist_ignite")
+        if not await apply_to_game(state, record):
+            await respond(interaction, STALE_GAME_MESSAGE)
+            return
 
-    async def callback(self, interaction: discord.Interaction):
-        # The Arsonist has chosen to ignite.
-        self.view.game_ref.child('night_actions').child('arsonist_ignite').set(True)
-        
-        await interaction.response.send_message("The world will burn... Your choice has been sealed.", ephemeral=True)
-        self.view.stop()
-        for item in self.view.children:
-            item.disabled = True
-        await interaction.message.edit(view=self.view)
+        await respond(interaction, message)
+        await self.close_prompt(interaction)
 
 
-class VeteranAlertView(discord.ui.View):
-    """A view for the Veteran to choose to go on alert."""
-    def __init__(self, game_ref, veteran_id: str):
-        super().__init__(timeout=60.0)
-        self.game_ref = game_ref
-        self.veteran_id = veteran_id
+# Registered with the bot at startup (bot.add_dynamic_items) so clicks on any game's prompts reach us
+DYNAMIC_ITEMS = (TargetSelect, PageButton, SearchButton, WitchButton, ArsonistIgniteButton, VeteranButton)
 
-    @discord.ui.button(label="Go on Alert", style=discord.ButtonStyle.secondary, emoji="🛡️")
-    async def go_on_alert(self, interaction: discord.Interaction, button: discord.ui.Button):
-        """Callback for the veteran alert button."""
-        # Record that the veteran is on alert for the night
-        self.game_ref.child('night_actions').child('veteran_alert').set(self.veteran_id)
-        # Mark the alert as used
-        self.game_ref.child('game_state').child('veteran_alerts_used').set(True)
 
-        await interaction.response.send_message("You have barricaded your house for the night. You will shoot anyone who visits.", ephemeral=True)
-        self.view.stop()
-        button.disabled = True
-        await interaction.message.edit(view=self.view)
+# --- Settings Views ---
 
+SETTINGS_LOCKED_MESSAGE = "You can't change settings after the game has started!"
 
-# --- Settings Views ---
+def lobby_setting(path: str, value):
+    """A mutation for apply_to_game that changes a setting only while the game is still in the lobby."""
+    def mutate(state):
+        if state.get('phase') == GamePhase.WAITING.value: # Settings messages can be left open past the start
+            state.set(path, value)
+    return mutate
 
 class RoleSelect(discord.ui.Select):
     """A multi-select dropdown for enabling/disabling roles."""
-    def __init__(self, game_ref, all_possible_roles, enabled_roles):
-        self.game_ref = game_ref
+    def __init__(self, state, all_possible_roles, enabled_roles):
+        self.state = state
         
         options = []
         for role in all_possible_roles:
@@ -240,9 +591,14 @@ class RoleSelect(discord.ui.Select):
         # We always include Villager and Werewolf.
         enabled_roles = self.values
         enabled_roles.extend([Role.VILLAGER.value, Role.WEREWOLF.value])
+        if self.state.get('phase') != GamePhase.WAITING.value:
+            await interaction.response.send_message(SETTINGS_LOCKED_MESSAGE, ephemeral=True)
+            return
         
-        self.game_ref.child('settings').child('roles').set(enabled_roles)
-        
+        if not await apply_to_game(self.state, lobby_setting('settings/roles', enabled_roles)):
+            await interaction.response.send_message(STALE_GAME_MESSAGE, ephemeral=True)
+            return
+        # apply_to_game saved it with flush_soon(); answering first keeps us inside Discord's 3 seconds
         await interaction.response.send_message("The prophecy has been written! I have updated the roles for this game. ✨", ephemeral=True)
         
         # We need to refresh the main settings view
@@ -250,23 +606,83 @@ class RoleSelect(discord.ui.Select):
 
 class RoleSettingsView(discord.ui.View):
     """A view for managing role settings."""
-    def __init__(self, game_ref, all_possible_roles, enabled_roles):
+    def __init__(self, state, all_possible_roles, enabled_roles):
         super().__init__(timeout=180.0)
-        self.add_item(RoleSelect(game_ref, all_possible_roles, enabled_roles))
+        self.add_item(RoleSelect(state, all_possible_roles, enabled_roles))
 
 
 class SettingsView(discord.ui.View):
     """The main view for game settings, shown with the /ww settings command."""
-    def __init__(self, game_ref, game_data):
+    def __init__(self, state):
         super().__init__(timeout=180.0)
-        self.game_ref = game_ref
-        self.game_data = game_data
+        self.state = state
 
     @discord.ui.button(label="Configure Roles", style=discord.ButtonStyle.primary, emoji="🎭")
     async def configure_roles(self, interaction: discord.Interaction, button: discord.ui.Button):
         """Opens the role selection view."""
         all_roles = [role for role in Role]
-        enabled_roles = self.game_data.get('settings', {}).get('roles', [])
+        enabled_roles = self.state.get('settings/roles', [])
+        
+        view = RoleSettingsView(self.state, all_roles, enabled_roles)
+        await interaction.response.send_message("Choose the roles you wish to include in this game, master.", view=view, ephemeral=True)
+
+    @discord.ui.button(label="Live Vote Tally", style=discord.ButtonStyle.secondary, emoji="🗳️")
+    async def toggle_live_tally(self, interaction: discord.Interaction, button: discord.ui.Button):
+        """Turns the running vote count shown in the channel during the day on or off."""
+        enabled = not self.state.get('settings/live_tally', True)
+        if self.state.get('phase') != GamePhase.WAITING.value:
+            await interaction.response.send_message(SETTINGS_LOCKED_MESSAGE, ephemeral=True)
+            return
+        if not await apply_to_game(self.state, lobby_setting('settings/live_tally', enabled)):
+            await interaction.response.send_message(STALE_GAME_MESSAGE, ephemeral=True)
+            return
+
+        if enabled:
+            await interaction.response.send_message("The village will see the votes pile up as they are cast! 🗳️", ephemeral=True)
+        else:
+            await interaction.response.send_message("The votes will stay secret until the verdict... how mysterious! 🤫", ephemeral=True)
+
+
+async def open_settings(interaction: discord.Interaction):
+    """Shows the game creator the settings of the channel's lobby (/ww settings, /ww-settings)."""
+    state = await load_game_state(interaction.channel_id)
+
+    if not state:
+        await interaction.response.send_message("There's no game to configure, silly!", ephemeral=True)
+        return
+        
+    game_data = state.data
+    if game_data["creator_id"] != interaction.user.id:
+        await interaction.response.send_message("Only the person who created the game can change the settings!", ephemeral=True)
+        return
         
-        view = RoleSettingsView(self.game_ref, all_roles, enabled_roles)
-        await interaction.response.send_message("Choose the roles you wish to include in this game, master.", view=view, ephemeral=True)
\ No newline at end of file
+    if game_data["phase"] != GamePhase.WAITING.value:
+        await interaction.response.send_message("You can't change settings after the game has started!", ephemeral=True)
+        return
+
+    # Create a beautiful embed to show current settings
+    enabled_roles = game_data.get('settings', {}).get('roles', [])
+    
+    embed = discord.Embed(
+        title="✨ Game Settings ✨",
+        description="Here are the current settings for your game. Use the buttons below to make changes, master!",
+        color=discord.Color.from_rgb(255, 209, 220) # A nice pastel pink
+    )
+    embed.add_field(
+        name="🎭 Enabled Roles",
+        value=" ".join([f"`{role}`" for role in enabled_roles]),
+        inline=False
+    )
+    embed.add_field(
+        name="⏱️ Phase Timers",
+        value="\n".join([f"`{phase}`: {phase_timeout(state, phase)}s" for phase in DEFAULT_PHASE_TIMERS]),
+        inline=False
+    )
+    embed.add_field(
+        name="🗳️ Live Vote Tally",
+        value="On" if game_data.get('settings', {}).get('live_tally', True) else "Off",
+        inline=False
+    )
+
+    view = SettingsView(state)
+    await interaction.response.send_message(embed=embed, view=view, ephemeral=True)
@@ -1,20 +1,39 @@
-import firebase_admin
-from firebase_admin import credentials, db
 import os
 
-try:
-    # IMPORTANT: Create a `firebase-creds.json` file in your project root.
-    cred = credentials.Certificate('firebase-creds.json')
-    # IMPORTANT: Go to your Firebase project -> Realtime Database -> Rules and set them to true for read and write.
-    # In production, you'll want more secure rules.
-    firebase_admin.initialize_app(cred, {
-        'databaseURL': os.environ.get('FIREBASE_DATABASE_URL') # Set this as an environment variable
-    })
-    print("Firebase connected successfully!")
-except Exception as e:
-    print(f"Error connecting to Firebase: {e}")
-    print("Please ensure 'firebase-creds.json' is present and you have set the FIREBASE_DATABASE_URL environment variable.")
-    db = None
+# Where games are stored, chosen with the WEREWOLF_DB_BACKEND environment variable:
+#   firebase (default) - the Firebase Realtime Database, see below
+#   sqlite             - a local SQLite file (WEREWOLF_DB_PATH, default `werewolf.db`), for single-node bots
+#   memory             - an in-process tree, lost on restart; for tests and benchmarks
+DB_BACKEND = os.environ.get('WEREWOLF_DB_BACKEND', 'firebase').lower()
+
+db = None
+
+if DB_BACKEND == 'memory':
+    from local_db import MemoryDatabase
+    db = MemoryDatabase()
+    print("Using the in-memory database. Games will not survive a restart!")
+elif DB_BACKEND == 'sqlite':
+    from local_db import SQLiteDatabase
+    db_path = os.environ.get('WEREWOLF_DB_PATH', 'werewolf.db')
+    db = SQLiteDatabase(db_path)
+    print(f"Using the local SQLite database at {db_path}.")
+else:
+    try:
+        import firebase_admin
+        from firebase_admin import credentials, db
+        # IMPORTANT: Create a `firebase-creds.json` file in your project root.
+        cred = credentials.Certificate('firebase-creds.json')
+        # IMPORTANT: Go to your Firebase project -> Realtime Database -> Rules and set them to true for read and write.
+        # In production, you'll want more secure rules.
+        firebase_admin.initialize_app(cred, {
+            'databaseURL': os.environ.get('FIREBASE_DATABASE_URL') # Set this as an environment variable
+        })
+        print("Firebase connected successfully!")
+    except Exception as e:
+        print(f"Error connecting to Firebase: {e}")
+        print("Please ensure 'firebase-creds.json' is present and you have set the FIREBASE_DATABASE_URL environment variable.")
+        print("(Or set WEREWOLF_DB_BACKEND=sqlite to run without Firebase.)")
+        db = None
 
 def get_db():
     if db is not None:
@@ -25,4 +44,4 @@ def get_db():
 # from firebase_config import get_db
 # db = get_db()
 # if db:
-#   db.child('games').set({'example': 'data'}) 
\ No newline at end of file
+#   db.child('games').set({'example': 'data'})
@@ -0,0 +1,85 @@
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import time
+
+# Runs the bot as several processes, each connected to its own slice of the shards
+# and owning the games of the guilds on them (see cogs/werewolf/cluster.py):
+#
+#   python launcher.py --processes 4 --shards 16
+#
+# Shards are dealt round-robin, so process i runs shards i, i + N, i + 2N...
+# A process that exits is started again, with the same shards and cluster id, so it
+# picks its games back up at once. To spread processes over several machines, run
+# the launcher on each with the same --shards and --processes and a different --only.
+
+RESTART_DELAY = 5.0   # Seconds before restarting a process that exited
+MAX_RESTART_DELAY = 120.0 # Upper bound for the delay when a process keeps crashing
+STABLE_AFTER = 300.0  # Seconds a process must stay up for its restart delay to reset
+
+
+def shard_slices(shards: int, processes: int) -> list:
+    """The shard ids of each process."""
+    return [list(range(i, shards, processes)) for i in range(processes)]
+
+def start(cluster: int, shards: int, shard_ids: list) -> subprocess.Popen:
+    env = dict(
+        os.environ,
+        WEREWOLF_SHARD_COUNT=str(shards),
+        WEREWOLF_SHARD_IDS=",".join(map(str, shard_ids)),
+        WEREWOLF_CLUSTER_ID=f"cluster-{cluster}",
+        # One metrics endpoint per process, on consecutive ports
+        WEREWOLF_METRICS_PORT=str(int(os.environ.get("WEREWOLF_METRICS_PORT", "9108")) + cluster),
+    )
+    print(f"Starting cluster-{cluster} with shards {shard_ids}")
+    return subprocess.Popen([sys.executable, "main.py"], env=env)
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the bot as several sharded processes.")
+    parser.add_argument("--processes", type=int, default=2, help="processes to run")
+    parser.add_argument("--shards", type=int, default=None, help="total shards (default: one per process)")
+    parser.add_argument("--only", type=str, default=None, help="comma-separated process numbers to run on this machine")
+    args = parser.parse_args()
+
+    shards = args.shards or args.processes
+    if shards < args.processes:
+        parser.error("--shards must be at least --processes")
+    slices = shard_slices(shards, args.processes)
+    clusters = [int(i) for i in args.only.split(",")] if args.only else list(range(args.processes))
+
+    running = {} # cluster -> [process or None while waiting to restart, started or restart time, restart delay]
+    for cluster in clusters:
+        running[cluster] = [start(cluster, shards, slices[cluster]), time.monotonic(), RESTART_DELAY]
+
+    def stop(signum, frame):
+        processes = [entry[0] for entry in running.values() if entry[0] is not None]
+        for process in processes:
+            process.send_signal(signal.SIGINT) # Lets each bot release its game leases
+        for process in processes:
+            process.wait()
+        sys.exit(0)
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    while True:
+        time.sleep(1)
+        now = time.monotonic()
+        for cluster, entry in running.items():
+            process, since, delay = entry
+            if process is None:
+                if now >= since:
+                    entry[:] = [start(cluster, shards, slices[cluster]), now, min(delay * 2, MAX_RESTART_DELAY)]
+                continue
+            if process.poll() is None:
+                continue
+            if now - since > STABLE_AFTER:
+                delay = RESTART_DELAY
+            print(f"cluster-{cluster} exited with code {process.returncode}; restarting in {delay:.0f}s")
+            entry[:] = [None, now + delay, delay]
+
+
+if __name__ == "__main__":
+    main()
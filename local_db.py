@@ -0,0 +1,270 @@
+import copy
+import json
+import sqlite3
+import threading
+from collections import Counter
+
+# Local stand-ins for the Firebase Realtime Database, for tests, benchmarks and
+# small single-node deployments. Both expose `reference(path)`, returning a
+# reference with the same child/get/set/update/delete/transaction interface as
+# firebase_admin.db.Reference, so nothing above firebase_config.py can tell the
+# difference. Like Firebase, a None value deletes and empty nodes disappear, and
+# listen() streams changes the way firebase_admin's does: a first "put" of the whole
+# node at "/", then a "put" or "patch" per write, relative to the listened path.
+
+
+def _split(path: str) -> list:
+    return [key for key in str(path).strip("/").split("/") if key]
+
+def _prune(value):
+    """Drops None values and empty dicts, the way Firebase never stores them."""
+    if not isinstance(value, dict):
+        return value
+    pruned = {}
+    for key, child in value.items():
+        child = _prune(child)
+        if child is not None and child != {}:
+            pruned[str(key)] = child
+    return pruned or None
+
+
+class Event:
+    """A change delivered to a listener, like firebase_admin.db.Event."""
+    def __init__(self, event_type: str, path: str, data):
+        self.event_type = event_type # "put" replaces the node at `path`, "patch" updates its children
+        self.path = path
+        self.data = data
+
+
+class ListenerRegistration:
+    """One listen() call; close() stops it. Callbacks run on the thread that made the write."""
+    def __init__(self, database, keys: list, callback):
+        self.database = database
+        self.keys = keys
+        self.callback = callback
+
+    def close(self):
+        with self.database.lock:
+            if self in self.database.listeners:
+                self.database.listeners.remove(self)
+
+    def deliver(self, base: list, writes: list, patch: bool):
+        """Passes on the writes (made relative to `base`) that touch the listened node."""
+        depth = len(self.keys)
+        if patch and base[:depth] == self.keys:
+            relative = "/" + "/".join(base[depth:])
+            self.callback(Event("patch", relative, {
+                "/".join(keys[len(base):]): _prune(copy.deepcopy(value)) for keys, value in writes
+            }))
+            return
+        for keys, value in writes:
+            if keys[:depth] == self.keys:
+                self.callback(Event("put", "/" + "/".join(keys[depth:]), _prune(copy.deepcopy(value))))
+            elif self.keys[:len(keys)] == keys:
+                # An ancestor was replaced: send our node as it is now
+                self.callback(Event("put", "/", self.database.read(self.keys)))
+
+
+def _notify(database, base: list, writes: list, patch: bool = False):
+    for registration in list(database.listeners):
+        registration.deliver(base, writes, patch)
+
+
+class LocalReference:
+    """A firebase_admin.db.Reference look-alike over a MemoryDatabase or SQLiteDatabase."""
+    def __init__(self, database, path: str = "/"):
+        self.database = database
+        self.path = "/" + "/".join(_split(path))
+
+    @property
+    def key(self):
+        keys = _split(self.path)
+        return keys[-1] if keys else None
+
+    def child(self, path: str) -> "LocalReference":
+        return LocalReference(self.database, f"{self.path}/{path}")
+
+    def get(self, etag: bool = False, shallow: bool = False):
+        self.database.ops["get"] += 1
+        value = self.database.read(_split(self.path), shallow)
+        return (value, "") if etag else value
+
+    def set(self, value):
+        self.database.ops["set"] += 1
+        writes = [(_split(self.path), value)]
+        with self.database.lock: # Listeners see writes in the order they were made
+            self.database.write_many(writes)
+            _notify(self.database, writes[0][0], writes)
+
+    def update(self, value: dict):
+        """Multi-path update, applied atomically: keys may be nested paths."""
+        self.database.ops["update"] += 1
+        base = _split(self.path)
+        writes = [(base + _split(path), child) for path, child in value.items()]
+        with self.database.lock:
+            self.database.write_many(writes)
+            _notify(self.database, base, writes, patch=True)
+
+    def delete(self):
+        self.database.ops["delete"] += 1
+        writes = [(_split(self.path), None)]
+        with self.database.lock:
+            self.database.write_many(writes)
+            _notify(self.database, writes[0][0], writes)
+
+    def transaction(self, transaction_update):
+        self.database.ops["transaction"] += 1
+        keys = _split(self.path)
+        with self.database.lock:
+            new_value = transaction_update(self.database.read(keys))
+            self.database.write_many([(keys, new_value)])
+            _notify(self.database, keys, [(keys, new_value)])
+        return new_value
+
+    def listen(self, callback) -> ListenerRegistration:
+        """Calls `callback(event)` with this node's current value, then with every change to it."""
+        self.database.ops["listen"] += 1
+        registration = ListenerRegistration(self.database, _split(self.path), callback)
+        with self.database.lock:
+            self.database.listeners.append(registration)
+            current = self.database.read(registration.keys)
+        callback(Event("put", "/", current))
+        return registration
+
+
+class MemoryDatabase:
+    """The whole database as one nested dict. Fast, but gone when the process exits."""
+    def __init__(self):
+        self.tree = {}
+        self.ops = Counter() # Operation name -> count, for benchmarks and metrics
+        self.lock = threading.RLock() # The GameStore calls in from a thread pool
+        self.listeners = [] # ListenerRegistration for every open listen()
+
+    def reference(self, path: str = "/") -> LocalReference:
+        return LocalReference(self, path)
+
+    def read(self, keys: list, shallow: bool = False):
+        with self.lock:
+            node = self.tree
+            for key in keys:
+                if not isinstance(node, dict) or key not in node:
+                    return None
+                node = node[key]
+            if shallow and isinstance(node, dict):
+                return {key: True for key in node}
+            return copy.deepcopy(node) if node != {} else None
+
+    def write_many(self, writes: list):
+        with self.lock:
+            for keys, value in writes:
+                self._write(keys, _prune(copy.deepcopy(value)))
+
+    def _write(self, keys: list, value):
+        if not keys:
+            self.tree = value if isinstance(value, dict) else {}
+            return
+        parents = [self.tree]
+        for key in keys[:-1]:
+            child = parents[-1].get(key)
+            if not isinstance(child, dict):
+                if value is None:
+                    return # Nothing there to delete
+                child = parents[-1][key] = {}
+            parents.append(child)
+        if value is None:
+            parents[-1].pop(keys[-1], None)
+            # Remove ancestors left empty, as Firebase does
+            for depth in range(len(parents) - 1, 0, -1):
+                if parents[depth]:
+                    break
+                parents[depth - 1].pop(keys[depth - 1], None)
+        else:
+            parents[-1][keys[-1]] = value
+
+
+class SQLiteDatabase:
+    """
+    The database in a local SQLite file, one row per leaf value keyed by its full path.
+    A subtree is a contiguous range of keys, so reading or replacing a whole game is
+    one indexed range query.
+    """
+    def __init__(self, filename: str):
+        self.ops = Counter()
+        self.lock = threading.RLock()
+        self.listeners = []
+        self.connection = sqlite3.connect(filename, check_same_thread=False, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS nodes (path TEXT PRIMARY KEY, value TEXT NOT NULL) WITHOUT ROWID")
+
+    def reference(self, path: str = "/") -> LocalReference:
+        return LocalReference(self, path)
+
+    @staticmethod
+    def _subtree(keys: list):
+        """The WHERE clause matching every leaf under `keys` ('/' sorts just before '0')."""
+        prefix = "/".join(keys)
+        if not prefix:
+            return "1", ()
+        return "path >= ? AND path < ?", (prefix + "/", prefix + "0")
+
+    def read(self, keys: list, shallow: bool = False):
+        path = "/".join(keys)
+        with self.lock:
+            if path:
+                row = self.connection.execute("SELECT value FROM nodes WHERE path = ?", (path,)).fetchone()
+                if row:
+                    return json.loads(row[0])
+            where, params = self._subtree(keys)
+            rows = self.connection.execute(f"SELECT path, value FROM nodes WHERE {where} ORDER BY path", params).fetchall()
+        if not rows:
+            return None
+
+        skip = len(keys)
+        tree = {}
+        for row_path, value in rows:
+            row_keys = row_path.split("/")[skip:]
+            if shallow:
+                tree[row_keys[0]] = True
+                continue
+            node = tree
+            for key in row_keys[:-1]:
+                node = node.setdefault(key, {})
+            node[row_keys[-1]] = json.loads(value)
+        return tree
+
+    def write_many(self, writes: list):
+        with self.lock:
+            cursor = self.connection.cursor()
+            cursor.execute("BEGIN")
+            try:
+                for keys, value in writes:
+                    self._write(cursor, keys, _prune(value))
+                cursor.execute("COMMIT")
+            except BaseException:
+                cursor.execute("ROLLBACK")
+                raise
+
+    def _write(self, cursor, keys: list, value):
+        # Replace whatever was at the path: the subtree below it, and any leaf above it
+        where, params = self._subtree(keys)
+        cursor.execute(f"DELETE FROM nodes WHERE {where}", params)
+        if keys:
+            cursor.execute("DELETE FROM nodes WHERE path = ?", ("/".join(keys),))
+        if value is None:
+            return
+        for depth in range(1, len(keys)):
+            cursor.execute("DELETE FROM nodes WHERE path = ?", ("/".join(keys[:depth]),))
+
+        leaves = []
+        def flatten(node_keys, node):
+            if isinstance(node, dict):
+                for key, child in node.items():
+                    flatten(node_keys + [key], child)
+            else:
+                leaves.append(("/".join(node_keys), json.dumps(node)))
+        flatten(keys, value)
+        cursor.executemany("INSERT INTO nodes (path, value) VALUES (?, ?)", leaves)
+
+    def close(self):
+        self.connection.close()
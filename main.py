@@ -2,16 +2,33 @@ import discord
 from discord.ext import commands
 import os
 import asyncio
+import importlib
+import signal
 import firebase_config # This will initialize firebase
+from cogs.werewolf.core import resume_games
+from cogs.werewolf.cluster import PROCESS_ID, release_all_leases
+from cogs.werewolf.metrics import start_metrics, dump_metrics
+from cogs.werewolf.sweeper import start_sweeper
+from cogs.werewolf.eventlog import wait_for_archives
+from cogs.werewolf.balance import shutdown_balance_pool
 
 intents = discord.Intents.default()
 intents.message_content = True
-bot = commands.Bot(command_prefix='!', intents=intents)
+
+# Run on its own, the bot connects every shard Discord recommends. launcher.py starts
+# several copies instead, telling each one the total and which shards are its own.
+shard_count = int(os.environ['WEREWOLF_SHARD_COUNT']) if os.environ.get('WEREWOLF_SHARD_COUNT') else None
+shard_ids = [int(shard_id) for shard_id in os.environ['WEREWOLF_SHARD_IDS'].split(',')] if os.environ.get('WEREWOLF_SHARD_IDS') else None
+bot = commands.AutoShardedBot(command_prefix='!', intents=intents, shard_count=shard_count, shard_ids=shard_ids)
 
 @bot.event
 async def on_ready():
-    print(f'Logged in as {bot.user.name}')
+    print(f'Logged in as {bot.user.name} ({PROCESS_ID}, shards {sorted(bot.shards)})')
     print(f'Anime-style commands at your service, master!')
+    await start_metrics() # Safe to call on every reconnect too
+    # Pick up games that were running before the restart (safe to call on every reconnect)
+    asyncio.create_task(resume_games(bot))
+    start_sweeper(bot) # Expires abandoned lobbies and stuck games
 
 @bot.command()
 async def hello(ctx):
@@ -38,9 +55,13 @@ async def load_cogs():
         for filename in files:
             if filename.endswith('.py') and not filename.startswith('__init__'):
                 # Construct the extension path like: cogs.werewolf.game
-                path = os.path.join(root, filename)
+                path = os.path.relpath(os.path.join(root, filename))
                 # make it a python module path
                 extension_path = path.replace(os.path.sep, '.')[:-3]
+                # Helper modules (core, state, views...) hold shared state and have no setup();
+                # loading them as extensions would re-execute them, so just import them once.
+                if not hasattr(importlib.import_module(extension_path), 'setup'):
+                    continue
                 print(f"Attempting to load extension: {extension_path}")
                 try:
                     await bot.load_extension(extension_path)
@@ -48,6 +69,14 @@ async def load_cogs():
                 except Exception as e:
                     print(f'Failed to load extension {extension_path}: {e}')
 
+_closing = None # The bot.close() started by SIGTERM
+
+def shut_down():
+    """Closes the bot on SIGTERM (docker stop, systemd...) the way Ctrl+C does, so main()'s cleanup still runs."""
+    global _closing
+    if _closing is None:
+        _closing = asyncio.create_task(bot.close())
+
 async def main():
     async with bot:
         await load_cogs()
@@ -55,7 +84,19 @@ async def main():
         if not token or token == 'YOUR_BOT_TOKEN':
             print('ERROR: DISCORD_BOT_TOKEN environment variable not set!')
             return
-        await bot.start(token)
+        try:
+            asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, shut_down)
+        except NotImplementedError:
+            pass # Windows has no signal handlers; only Ctrl+C releases the leases there
+        try:
+            await bot.start(token)
+        finally:
+            await wait_for_archives() # Games that just ended; the sweeper would otherwise archive them later
+            # Let other processes (or our own restart) take our games over right away
+            await release_all_leases()
+            shutdown_balance_pool()
+            if os.environ.get('WEREWOLF_METRICS_DUMP'):
+                dump_metrics(os.environ['WEREWOLF_METRICS_DUMP'])
 
 if __name__ == "__main__":
     # Ensure you have a .env file with DISCORD_BOT_TOKEN='your_token'